@@ -1,6 +1,16 @@
+from functools import lru_cache
+import numpy as np
+import shapely
+from shapely import GeometryType
+from shapely.geometry import Polygon
 from rasterio.crs import CRS
 from rasterio.warp import transform
 
+@lru_cache(maxsize=None)
+def getCrs(crsString):
+  """Returns CRS object for epsg string, cached so repeat calls don't re-parse it"""
+  return CRS.from_string(crsString)
+
 def reprojectPolygon(polygon, inCrs='epsg:4326', outCrs='epsg:3857'):
   """Reproject Polygon/MultiPolygon to a different coordinate system.
 
@@ -10,8 +20,8 @@ def reprojectPolygon(polygon, inCrs='epsg:4326', outCrs='epsg:3857'):
   """
   # Ref: https://gist.github.com/dnomadb/5cbc116aacc352c7126e779c29ab7abe
 
-  src_crs = CRS.from_string(inCrs)
-  dst_crs = CRS.from_string(outCrs)
+  src_crs = getCrs(inCrs)
+  dst_crs = getCrs(outCrs)
 
   if "geometry" in polygon:
     geometry = polygon["geometry"]
@@ -29,4 +39,96 @@ def reprojectPolygon(polygon, inCrs='epsg:4326', outCrs='epsg:3857'):
           xys = (zip(*part) for part in component)
           xys = (list(zip(*transform(src_crs, dst_crs, *xy))) for xy in xys)
 
-          yield {"coordinates": list(xys), "type": "Polygon"}
\ No newline at end of file
+          yield {"coordinates": list(xys), "type": "Polygon"}
+
+def reprojectPolygons(geometries, inCrs='epsg:4326', outCrs='epsg:3857'):
+  """Reproject many Polygon/MultiPolygon geometries to a different coordinate system in bulk.
+
+  The coordinates of all geometries are concatenated into one contiguous array and reprojected
+  with a single transform call, then split back into rings, polygons and multipolygons by offset.
+
+  Args:
+    geometries: sequence of GeoJSON-like features or geometries, Polygon or MultiPolygon
+    inCrs: coordinate system of the geometries, as epsg string.  Defaults to 'epsg:4326'
+    outCrs: coordinate system to reproject to, as epsg string.  Defaults to 'epsg:3857'
+  Returns:
+    numpy array of shapely geometries, same length and order as geometries.  Polygons stay Polygons, MultiPolygons stay MultiPolygons
+  """
+  coords = []
+  ringOffsets = [0]
+  polygonOffsets = [0]
+  partOffsets = [0]
+  isMulti = []
+
+  for geometry in geometries:
+    if "geometry" in geometry:
+      geometry = geometry["geometry"]
+    if geometry["type"] == "Polygon":
+      polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+      polygons = geometry["coordinates"]
+    else:
+      raise ValueError('Unsupported geometry type {0}, expected Polygon or MultiPolygon'.format(geometry["type"]))
+
+    for polygon in polygons:
+      # Polygons without coordinates are left out, yielding an empty geometry
+      if len(polygon) == 0 or len(polygon[0]) == 0:
+        continue
+      for ring in polygon:
+        # Empty interior rings are dropped, keeping the rest of the polygon
+        if len(ring) == 0:
+          continue
+        ringCoords = np.asarray(ring, dtype='float64')
+        coords.append(ringCoords[:, :2])
+        ringOffsets.append(ringOffsets[-1] + len(ringCoords))
+      polygonOffsets.append(len(ringOffsets) - 1)
+    partOffsets.append(len(polygonOffsets) - 1)
+    isMulti.append(geometry["type"] == "MultiPolygon")
+
+  if len(isMulti) == 0:
+    return np.empty(0, dtype=object)
+
+  xy = np.concatenate(coords) if len(coords) > 0 else np.empty((0, 2))
+  if len(xy) > 0:
+    xs, ys = transform(getCrs(inCrs), getCrs(outCrs), xy[:, 0], xy[:, 1])
+    xy = np.column_stack([xs, ys])
+
+  result = shapely.from_ragged_array(
+    GeometryType.MULTIPOLYGON,
+    xy,
+    (
+      np.array(ringOffsets, dtype='int64'),
+      np.array(polygonOffsets, dtype='int64'),
+      np.array(partOffsets, dtype='int64')
+    )
+  )
+
+  # Unwrap Polygon inputs, from_ragged_array yields a single type
+  isPolygon = ~np.array(isMulti)
+  polygons = shapely.get_geometry(result[isPolygon], 0)
+  polygons[shapely.is_missing(polygons)] = Polygon()
+  result[isPolygon] = polygons
+  return result
+
+def reprojectGeometries(geometries, inCrs='epsg:4326', outCrs='epsg:3857'):
+  """Reproject an array of shapely geometries to a different coordinate system in bulk.
+
+  The coordinates of all geometries are reprojected with a single transform call.
+
+  Args:
+    geometries: array of shapely geometries
+    inCrs: coordinate system of the geometries, as epsg string.  Defaults to 'epsg:4326'
+    outCrs: coordinate system to reproject to, as epsg string.  Defaults to 'epsg:3857'
+  Returns:
+    numpy array of shapely geometries, same length and order as geometries
+  """
+  src_crs = getCrs(inCrs)
+  dst_crs = getCrs(outCrs)
+
+  def transformCoords(xy):
+    if len(xy) == 0:
+      return xy
+    xs, ys = transform(src_crs, dst_crs, xy[:, 0], xy[:, 1])
+    return np.column_stack([xs, ys])
+
+  return shapely.transform(np.asarray(geometries, dtype=object), transformCoords)
@@ -1,7 +1,23 @@
 # -*- coding: utf-8 -*-
-from .gen_sap_map import genSapMap, calcSap
+from .gen_sap_map import genSapMap, calcSap, LoadedShapes
+from .batch import genSapMaps
+from .calc_sap import calcSapArray
+from .shape_index import ShapeIndex
+from .columnar import convertToGeoParquet
+from .zonal import ZonalIndex
+from .manifest import readManifest
+from .resample import genUncertaintyMaps, FootprintMatrix
 
 __all__ = [
   'genSapMap',
-  'calcSap'
+  'genSapMaps',
+  'LoadedShapes',
+  'calcSap',
+  'calcSapArray',
+  'ShapeIndex',
+  'convertToGeoParquet',
+  'ZonalIndex',
+  'readManifest',
+  'genUncertaintyMaps',
+  'FootprintMatrix'
 ]
\ No newline at end of file
@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import fiona
+from sapmap.gen_sap_map import genSapMap, LoadedShapes, getBasename
+
+# LoadedShapes of the group being run, set once per pool process
+sharedShapes = None
+
+def initSharedShapes(loadedShapes):
+  global sharedShapes
+  sharedShapes = loadedShapes
+
+def genSapMapShared(run):
+  return genSapMap(**run, loadedShapes=sharedShapes)
+
+def calcLoadKey(run):
+  """Returns the options that determine how a run's features are loaded, runs with the same key can share them"""
+  return (run['infile'], run.get('outCrsString', 'epsg:3857'), run.get('fixGeom', False))
+
+def isSkipped(run):
+  """Returns whether genSapMap will skip a run because its outfile exists and overwrite is off"""
+  return not run.get('overwrite', False) and os.path.exists("{}.tif".format(getBasename(run['infile'], run.get('outPath'))))
+
+def isMemoryBounded(run):
+  """Returns whether a run bounds its memory by not holding all features at once, which sharing loaded features would undo"""
+  return run.get('streaming', False) or run.get('accumulator', 'dense') == 'memmap'
+
+def genSapMaps(runs, default={}, workers=None):
+  """Generates Spatial Access Priority (SAP) raster maps for multiple run configurations
+
+  Runs are grouped by the options that determine how features are loaded (infile, outCrsString,
+  fixGeom).  Each group's infile is loaded, reprojected and validated once, then shared by all
+  of its runs, which can differ in any other option (importanceField, areaFactor, bounds,
+  outResolution, etc.).  Loading uses the ingestWorkers of the group's first run.  Runs using
+  incrementalFrom, streaming or the memmap accumulator, runs whose outfile exists and will be skipped,
+  and groups of a single run are run on their own, without loading all features up front.
+
+  Arguments:
+    runs: list of dicts of genSapMap arguments, one per run
+    default: dict of genSapMap arguments shared by all runs, overridden by run arguments
+    workers: (integer) number of processes to generate a group's heatmaps with.  Defaults to None, running one at a time
+
+  Returns:
+    List of manifests, one per run in the same order.  None for runs that were skipped
+  """
+  runs = [{**default, **run} for run in runs]
+  manifests = [None] * len(runs)
+
+  groups = {}
+  for runIndex, run in enumerate(runs):
+    if run.get('incrementalFrom') or isMemoryBounded(run) or isSkipped(run):
+      manifests[runIndex] = genSapMap(**run)
+    else:
+      groups.setdefault(calcLoadKey(run), []).append(runIndex)
+
+  for (infile, outCrsString, fixGeom), runIndexes in groups.items():
+    if len(runIndexes) == 1:
+      manifests[runIndexes[0]] = genSapMap(**runs[runIndexes[0]])
+      continue
+    try:
+      loadedShapes = LoadedShapes(infile, outCrsString, fixGeom, runs[runIndexes[0]].get('ingestWorkers'))
+    except (fiona.errors.DriverError, FileNotFoundError):
+      print('Warning: infile not found, skipping {0}'.format(infile))
+      continue
+    print('Loaded {0} in {1}s, generating {2} heatmaps'.format(infile, loadedShapes.loadTime, len(runIndexes)))
+
+    if workers is not None and workers > 1 and len(runIndexes) > 1:
+      with ProcessPoolExecutor(max_workers=workers, initializer=initSharedShapes, initargs=(loadedShapes,)) as executor:
+        groupManifests = executor.map(genSapMapShared, [runs[runIndex] for runIndex in runIndexes])
+        for runIndex, manifest in zip(runIndexes, groupManifests):
+          manifests[runIndex] = manifest
+    else:
+      for runIndex in runIndexes:
+        manifests[runIndex] = genSapMap(**runs[runIndex], loadedShapes=loadedShapes)
+
+  return manifests
@@ -0,0 +1,174 @@
+import os
+import time
+import datetime
+import subprocess
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import fiona
+from fiona.crs import CRS
+from sapmap.gen_sap_map import genSapMap, LoadedShapes
+from sapmap.timings import getPeakRss, startTracing, getTracedPeak
+
+# Metrics compared against the baseline, lower is better
+REGRESSION_METRICS = ['loadTime', 'generateTime', 'totalTime', 'peakTraced', 'peakRss']
+# Default allowed increase of a metric over the baseline before it counts as a regression, 0.25 = 25%
+DEFAULT_THRESHOLD = 0.25
+
+def genRadii(sizeDistribution, numShapes, rng):
+  """Returns array of polygon radii drawn from sizeDistribution, in units of the survey CRS
+
+  Parameters:
+    sizeDistribution: dict with type 'uniform' (min, max), or 'lognormal' (mean, sigma) where mean is the median radius
+    numShapes: number of radii to draw
+    rng: numpy random Generator
+  """
+  if sizeDistribution['type'] == 'uniform':
+    return rng.uniform(sizeDistribution['min'], sizeDistribution['max'], numShapes)
+  elif sizeDistribution['type'] == 'lognormal':
+    return sizeDistribution['mean'] * rng.lognormal(0, sizeDistribution['sigma'], numShapes)
+  raise ValueError("sizeDistribution type must be 'uniform' or 'lognormal', got {0}".format(sizeDistribution['type']))
+
+def genSyntheticSurvey(
+  outfile,
+  numShapes=1000,
+  numVertices=16,
+  sizeDistribution={'type': 'uniform', 'min': 1000, 'max': 10000},
+  bounds=[-1000000, -1000000, 1000000, 1000000],
+  crsString='epsg:3857',
+  seed=0
+):
+  """Writes a reproducible survey of random polygons to a GeoJSON file, for benchmarking and load testing
+
+  Each polygon is star-shaped around a random center within bounds, with vertices at random angles and
+  radii between half and all of its size, so it is always valid.  Features have an id field and an
+  importance field with a random integer from 1 to 100.  The same arguments always produce the same file.
+
+  Parameters:
+    outfile: path to GeoJSON file to write, overwritten if it exists
+    numShapes: number of polygons
+    numVertices: number of vertices of each polygon
+    sizeDistribution: distribution of polygon radius, see genRadii
+    bounds: [w, s, e, n] to place polygon centers within, in crsString
+    crsString: coordinate system of the survey
+    seed: random seed
+  Returns:
+    outfile
+  """
+  rng = np.random.default_rng(seed)
+  centerX = rng.uniform(bounds[0], bounds[2], numShapes)
+  centerY = rng.uniform(bounds[1], bounds[3], numShapes)
+  radii = genRadii(sizeDistribution, numShapes, rng)
+  angles = np.sort(rng.uniform(0, 2 * np.pi, (numShapes, numVertices)), axis=1)
+  vertexRadii = radii[:, None] * rng.uniform(0.5, 1, (numShapes, numVertices))
+  xs = centerX[:, None] + vertexRadii * np.cos(angles)
+  ys = centerY[:, None] + vertexRadii * np.sin(angles)
+  importances = rng.integers(1, 101, numShapes)
+
+  if os.path.exists(outfile):
+    os.remove(outfile)
+  schema = {'geometry': 'Polygon', 'properties': {'id': 'int', 'importance': 'int'}}
+  with fiona.open(outfile, 'w', driver='GeoJSON', crs=CRS.from_string(crsString), schema=schema) as dst:
+    dst.writerecords({
+      'geometry': {
+        'type': 'Polygon',
+        'coordinates': [list(zip(xs[i], ys[i])) + [(xs[i][0], ys[i][0])]]
+      },
+      'properties': {'id': i, 'importance': int(importances[i])}
+    } for i in range(numShapes))
+  return outfile
+
+def runBenchmarkCase(infile, outPath, run, traceMemory=False):
+  """Generates a heatmap for a benchmark case, timing loading features and generating the heatmap separately
+
+  Run in its own process by runBenchmarks so peak memory is the case's alone
+
+  Parameters:
+    infile: path to the case's survey
+    outPath: path to write the heatmap to
+    run: genSapMap arguments
+    traceMemory: also record peak allocations with tracemalloc, which slows the run down
+  Returns:
+    dict of metrics.  Times in seconds, with the time of each phase of loading and generating in timings, see genSapMap.  peakTraced (peak allocations by tracemalloc, if traceMemory) and peakRss (None on Windows) in bytes
+  """
+  if traceMemory:
+    startTracing()
+  startTime = time.perf_counter()
+  loadedShapes = LoadedShapes(infile, run.get('outCrsString', 'epsg:3857'), run.get('fixGeom', False))
+  loadTime = time.perf_counter() - startTime
+  manifest = genSapMap(infile, **{**run, 'outPath': outPath, 'overwrite': True, 'loadedShapes': loadedShapes})
+  totalTime = time.perf_counter() - startTime
+  peakTraced = None
+  if traceMemory:
+    peakTraced = getTracedPeak()
+    tracemalloc.stop()
+  return {
+    'loadTime': round(loadTime, 3),
+    'generateTime': round(totalTime - loadTime, 3),
+    'totalTime': round(totalTime, 3),
+    'featuresPerSecond': round(len(loadedShapes) / totalTime, 1),
+    'includedCount': manifest['includedCount'],
+    'width': manifest['width'],
+    'height': manifest['height'],
+    'peakTraced': peakTraced,
+    'peakRss': getPeakRss(),
+    'timings': {**loadedShapes.timings, **manifest['timings']}
+  }
+
+def getCommit():
+  """Returns the current git commit hash, or None if not in a git repository"""
+  try:
+    return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def runBenchmarks(cases, outPath, repeat=1):
+  """Runs benchmark cases, each generating a synthetic survey and a heatmap from it
+
+  Each run of a case is in a fresh process, and the fastest of repeat runs is kept.  Peak traced
+  memory is measured in one more run, since tracemalloc slows down the runs it's active in
+
+  Parameters:
+    cases: list of dicts with name, survey (genSyntheticSurvey arguments) and run (genSapMap arguments)
+    outPath: path to write surveys and heatmaps to
+    repeat: number of times to run each case
+  Returns:
+    dict of results with timestamp, commit and metrics of each case by name
+  """
+  results = {
+    'timestamp': datetime.datetime.now().astimezone().isoformat(),
+    'commit': getCommit(),
+    'cases': {}
+  }
+  for case in cases:
+    infile = genSyntheticSurvey(os.path.join(outPath, '{0}.geojson'.format(case['name'])), **case['survey'])
+    caseRuns = []
+    for traceMemory in [False] * repeat + [True]:
+      with ProcessPoolExecutor(max_workers=1) as executor:
+        caseRuns.append(executor.submit(runBenchmarkCase, infile, outPath, case.get('run', {}), traceMemory).result())
+    metrics = min(caseRuns[:-1], key=lambda caseRun: caseRun['totalTime'])
+    metrics['peakTraced'] = caseRuns[-1]['peakTraced']
+    results['cases'][case['name']] = metrics
+    print('Benchmark {0}: {1}'.format(case['name'], results['cases'][case['name']]))
+  return results
+
+def compareResults(results, baseline, threshold=DEFAULT_THRESHOLD):
+  """Compares benchmark results against a baseline
+
+  Parameters:
+    results: benchmark results, see runBenchmarks
+    baseline: benchmark results to compare against
+    threshold: allowed increase of each metric over the baseline, 0.25 = 25%
+  Returns:
+    list of regression messages, empty if none.  Cases not in the baseline are not compared
+  """
+  regressions = []
+  for name, metrics in results['cases'].items():
+    if name not in baseline['cases']:
+      continue
+    for metric in REGRESSION_METRICS:
+      baseValue = baseline['cases'][name].get(metric)
+      if baseValue and metrics.get(metric) is not None and metrics[metric] > baseValue * (1 + threshold):
+        regressions.append('{0} {1} regressed from {2} to {3} (+{4}%)'.format(
+          name, metric, baseValue, metrics[metric], round((metrics[metric] / baseValue - 1) * 100, 1)))
+  return regressions
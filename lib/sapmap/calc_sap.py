@@ -1,3 +1,5 @@
+import numpy as np
+
 def calcSap(geometry, importance=1, areaFactor=1, importanceFactor=1, maxArea=None, maxSap=None):
   """Core algorithm, calculates the spatial access priority (SAP) value for a single area
 
@@ -30,4 +32,32 @@ def calcSap(geometry, importance=1, areaFactor=1, importanceFactor=1, maxArea=No
   if (maxSap):
     sap = min(sap, maxSap)
   
-  return sap
\ No newline at end of file
+  return sap
+
+def calcSapArray(areas, importances=1, areaFactor=1, importanceFactors=1, maxArea=None, maxSap=None):
+  """Batch version of calcSap, calculates the SAP value for many areas at once
+
+  Takes areas rather than geometries, for example the output of vectorized shapely.area(),
+  and applies the same calculation as calcSap element-wise.
+
+  Parameters:
+    areas: sequence or array of shape areas in coordinate system units
+    importances: sequence or array of importance values, or a single value for all
+    areaFactor: factor to change the area by dividing, see calcSap
+    importanceFactors: sequence or array of values to multiply importance by, or a single value for all
+    maxArea: limits the area of a shape in SAP calculation, see calcSap
+    maxSap: limits the SAP value, see calcSap
+  Returns:
+    float64 numpy array of SAP values, one per area
+  """
+  area = np.asarray(areas, dtype='float64') / areaFactor
+
+  if (maxArea):
+    area = np.minimum(area, maxArea)
+
+  sap = np.asarray(importanceFactors, dtype='float64') * np.asarray(importances, dtype='float64') / area
+
+  if (maxSap):
+    sap = np.minimum(sap, maxSap)
+
+  return np.broadcast_to(sap, area.shape).astype('float64')
@@ -0,0 +1,227 @@
+import os
+import json
+import itertools
+from collections.abc import Mapping
+import numpy as np
+import shapely
+from shapely.geometry import shape
+import fiona
+from rasterio.crs import CRS
+from reprojectFeature import reprojectGeometries
+from sapmap.timings import PhaseTimer
+
+try:
+  import pyarrow
+  import pyarrow.parquet
+  import pyarrow.feather
+  import pyarrow.ipc
+except ImportError:
+  pyarrow = None
+
+# File extensions read as GeoParquet and Feather (Arrow IPC) instead of with fiona
+PARQUET_EXTENSIONS = ['.parquet', '.geoparquet']
+FEATHER_EXTENSIONS = ['.feather', '.arrow']
+
+# Arrow types for fiona property types, anything else is written as a string
+FIONA_TYPES = {
+  'int': 'int64',
+  'int32': 'int64',
+  'int64': 'int64',
+  'float': 'float64',
+  'bool': 'bool',
+  'str': 'string'
+}
+
+def isColumnarFile(infile):
+  """Returns whether infile is read as a GeoParquet or Feather file, by its extension"""
+  return os.path.splitext(infile)[1].lower() in PARQUET_EXTENSIONS + FEATHER_EXTENSIONS
+
+def requirePyarrow():
+  if pyarrow is None:
+    raise ImportError('pyarrow is required to read and write GeoParquet and Feather files, install it with pip install pyarrow')
+
+def crsToString(crs):
+  """Returns epsg string for a GeoParquet column crs, PROJJSON or None for OGC:CRS84"""
+  if crs is None:
+    return 'epsg:4326'
+  rasterioCrs = CRS.from_user_input(crs)
+  epsg = rasterioCrs.to_epsg()
+  return 'epsg:{0}'.format(epsg) if epsg else rasterioCrs.to_string()
+
+def toPython(value):
+  """Returns numpy scalar as the equivalent Python value, so it can be serialized"""
+  return value.item() if isinstance(value, np.generic) else value
+
+class ColumnarProperties(Mapping):
+  """Properties of a ColumnarFeature, looked up in the columns of its ColumnarFeatures when accessed"""
+  __slots__ = ('columns', 'index')
+
+  def __init__(self, columns, index):
+    self.columns = columns
+    self.index = index
+
+  def __getitem__(self, name):
+    return toPython(self.columns[name][self.index])
+
+  def __iter__(self):
+    return iter(self.columns)
+
+  def __len__(self):
+    return len(self.columns)
+
+class ColumnarFeature:
+  """A feature of ColumnarFeatures, with the same feature['properties'] and __geo_interface__ access as a fiona feature
+
+  Only references the row, geometry and properties are not built until accessed
+  """
+  __slots__ = ('features', 'index')
+
+  def __init__(self, features, index):
+    self.features = features
+    self.index = index
+
+  def __getitem__(self, key):
+    if key == 'properties':
+      return ColumnarProperties(self.features.columns, self.index)
+    elif key == 'geometry':
+      return shapely.from_wkb(self.features.wkb[self.index]).__geo_interface__
+    raise KeyError(key)
+
+  @property
+  def __geo_interface__(self):
+    return {
+      'type': 'Feature',
+      'properties': dict(self['properties']),
+      'geometry': self['geometry']
+    }
+
+class ColumnarFeatures:
+  """Features of a GeoParquet or Feather file, read straight into an array of WKB geometries and NumPy attribute columns
+
+  Stands in for an open fiona collection in genSapMap, with the same crs, bounds and len, without
+  parsing each feature into a dict.  Geometries are decoded and reprojected in bulk, see genShapeChunks.
+  Files are expected to follow the GeoParquet metadata spec, with WKB encoded geometry, see convertToGeoParquet
+
+  Parameters:
+    infile: path to .parquet/.geoparquet or .feather/.arrow file
+    columns: names of attribute columns to read.  Defaults to None, reading all of them
+  """
+  def __init__(self, infile, columns=None):
+    requirePyarrow()
+    if os.path.splitext(infile)[1].lower() in PARQUET_EXTENSIONS:
+      schema = pyarrow.parquet.read_schema(infile)
+    else:
+      schema = pyarrow.ipc.open_file(infile).schema
+    if schema.metadata is None or b'geo' not in schema.metadata:
+      raise ValueError('{0} has no GeoParquet geo metadata, convert it with convertToGeoParquet'.format(infile))
+    geo = json.loads(schema.metadata[b'geo'])
+    geometryColumn = geo['primary_column']
+    geometryMeta = geo['columns'][geometryColumn]
+    if geometryMeta.get('encoding', 'WKB') != 'WKB':
+      raise ValueError('Only WKB geometry encoding is supported, {0} uses {1}'.format(infile, geometryMeta['encoding']))
+
+    if columns is None:
+      columns = [name for name in schema.names if name != geometryColumn]
+    # Drop duplicates and unset fields, keeping order
+    columns = list(dict.fromkeys(name for name in columns if name))
+    readColumns = [geometryColumn] + columns
+    if os.path.splitext(infile)[1].lower() in PARQUET_EXTENSIONS:
+      table = pyarrow.parquet.read_table(infile, columns=readColumns)
+    else:
+      table = pyarrow.feather.read_table(infile, columns=readColumns)
+
+    self.infile = infile
+    self.crs = {'init': crsToString(geometryMeta.get('crs'))}
+    self.wkb = table.column(geometryColumn).to_numpy(zero_copy_only=False)
+    self.columns = {name: table.column(name).to_numpy(zero_copy_only=False) for name in columns}
+    if geometryMeta.get('bbox'):
+      self.bounds = tuple(geometryMeta['bbox'])
+    else:
+      self.bounds = tuple(shapely.total_bounds(shapely.from_wkb(self.wkb)))
+
+  def __len__(self):
+    return len(self.wkb)
+
+  def __iter__(self):
+    return (ColumnarFeature(self, index) for index in range(len(self)))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    pass
+
+  def genShapeChunks(self, inCrsString, outCrsString, chunkSize, skip=None, timer=None):
+    """Generates (startIndex, features, keep, shapeGeoms) for each chunk of features, see gen_sap_map.genShapeChunks
+
+    WKB is decoded and reprojected for a whole chunk at a time, timed as the read and reproject phases
+    """
+    if timer is None:
+      timer = PhaseTimer()
+    for startIndex in range(0, len(self), chunkSize):
+      timer.start('read')
+      chunk = [ColumnarFeature(self, index) for index in range(startIndex, min(startIndex + chunkSize, len(self)))]
+      keep = np.array([not (skip and skip(feature)) for feature in chunk], dtype=bool)
+      shapeGeoms = shapely.from_wkb(self.wkb[startIndex:startIndex + len(chunk)][keep])
+      timer.stop('read')
+      timer.start('reproject')
+      if inCrsString != outCrsString:
+        shapeGeoms = reprojectGeometries(shapeGeoms, inCrsString, outCrsString)
+      timer.stop('reproject')
+      yield (startIndex, chunk, keep, shapeGeoms)
+
+def getArrowType(fionaType):
+  """Returns arrow type for a fiona schema property type, such as 'int:64' or 'str:80'"""
+  return pyarrow.type_for_alias(FIONA_TYPES.get(fionaType.split(':')[0], 'string'))
+
+def convertToGeoParquet(infile, outfile, chunkSize=10000):
+  """Converts a vector dataset readable by fiona, such as GeoJSON, to GeoParquet, or Feather if outfile ends in .feather/.arrow
+
+  Geometry is stored WKB encoded in a geometry column, with GeoParquet metadata giving its CRS and bounds,
+  and properties as typed columns.  Features are converted chunkSize at a time.
+
+  Parameters:
+    infile: path+filename of vector dataset to convert
+    outfile: path+filename of .parquet/.geoparquet or .feather/.arrow file to write
+    chunkSize: number of features to convert at a time
+  Returns:
+    number of features converted
+  """
+  requirePyarrow()
+  isFeather = os.path.splitext(outfile)[1].lower() in FEATHER_EXTENSIONS
+  with fiona.open(infile) as src:
+    properties = src.schema['properties']
+    fields = [pyarrow.field(name, getArrowType(fionaType)) for name, fionaType in properties.items()]
+    fields.append(pyarrow.field('geometry', pyarrow.binary()))
+    geo = {
+      'version': '1.0.0',
+      'primary_column': 'geometry',
+      'columns': {
+        'geometry': {
+          'encoding': 'WKB',
+          'geometry_types': ['Polygon', 'MultiPolygon'],
+          'crs': CRS.from_user_input(src.crs).to_dict(projjson=True),
+          'bbox': list(src.bounds)
+        }
+      }
+    }
+    schema = pyarrow.schema(fields, metadata={b'geo': json.dumps(geo).encode('utf-8')})
+
+    # Feather is the Arrow IPC file format
+    writer = pyarrow.ipc.new_file(outfile, schema) if isFeather else pyarrow.parquet.ParquetWriter(outfile, schema)
+    numFeatures = 0
+    features = iter(src)
+    while True:
+      chunk = list(itertools.islice(features, chunkSize))
+      if len(chunk) == 0:
+        break
+      writer.write_batch(featuresToBatch(chunk, properties, schema))
+      numFeatures += len(chunk)
+    writer.close()
+  return numFeatures
+
+def featuresToBatch(features, properties, schema):
+  """Returns arrow RecordBatch of fiona features, with a column for each property and WKB geometry"""
+  columns = [[feature['properties'][name] for feature in features] for name in properties]
+  columns.append(list(shapely.to_wkb(np.array([shape(feature['geometry']) for feature in features], dtype=object))))
+  return pyarrow.RecordBatch.from_arrays([pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
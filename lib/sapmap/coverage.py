@@ -0,0 +1,184 @@
+import numpy as np
+import shapely
+from rasterio import windows
+from rasterio.windows import Window
+
+# Number of edges split and accumulated at a time, bounds memory and keeps sort keys precise
+EDGE_CHUNK_SIZE = 1000000
+# Maximum size of the coverage of a band of rows calculated at a time by burnCoverage, in bytes
+COVERAGE_CHUNK_BYTES = 64 * 1024 * 1024
+
+def genRingEdges(geometries):
+  """Returns the edges of every ring of the polygon geometries, along with the geometry and ring type of each
+
+  Returns:
+    (x0, y0, x1, y1, geomIndex, isExterior, ringIndex) - arrays with one entry per edge
+  """
+  parts, partGeomIndex = shapely.get_parts(np.array(geometries, dtype=object), return_index=True)
+  rings, ringPartIndex = shapely.get_rings(parts, return_index=True)
+  # First ring of each polygon part is its exterior, the rest are holes
+  isExteriorRing = np.ones(len(rings), dtype=bool)
+  isExteriorRing[1:] = ringPartIndex[1:] != ringPartIndex[:-1]
+  coords, coordRingIndex = shapely.get_coordinates(rings, return_index=True)
+  # Rings are closed, so every coordinate but the last of each ring starts an edge
+  isEdgeStart = np.zeros(len(coords), dtype=bool)
+  isEdgeStart[:-1] = coordRingIndex[:-1] == coordRingIndex[1:]
+  starts = np.nonzero(isEdgeStart)[0]
+  edgeRingIndex = coordRingIndex[starts]
+  return (
+    coords[starts, 0],
+    coords[starts, 1],
+    coords[starts + 1, 0],
+    coords[starts + 1, 1],
+    partGeomIndex[ringPartIndex[edgeRingIndex]],
+    isExteriorRing[edgeRingIndex],
+    edgeRingIndex
+  )
+
+def calcGridCrossings(start, end, limit):
+  """Returns (first, count) of the integer grid lines in [0, limit] that each edge strictly crosses"""
+  low = np.minimum(start, end)
+  high = np.maximum(start, end)
+  first = np.maximum(np.floor(low) + 1, 0)
+  last = np.minimum(np.ceil(high) - 1, limit)
+  return (first, np.maximum(last - first + 1, 0).astype('int64'))
+
+def genCrossingParams(start, end, first, count):
+  """Returns (edge index, t) of each grid line crossing, t being the fraction of the way along the edge it's crossed at"""
+  edgeIndex = np.repeat(np.arange(len(count)), count)
+  # Position of each crossing within its edge's run of crossings
+  offsets = np.arange(len(edgeIndex)) - np.repeat(np.cumsum(count) - count, count)
+  lines = np.where(end[edgeIndex] > start[edgeIndex], first[edgeIndex] + offsets, first[edgeIndex] + count[edgeIndex] - 1 - offsets)
+  return (edgeIndex, (lines - start[edgeIndex]) / (end[edgeIndex] - start[edgeIndex]))
+
+def splitEdges(x0, y0, x1, y1, width, height):
+  """Splits edges in pixel coordinates into pieces within one cell, where they cross the grid lines
+
+  Pieces left or right of the grid are clamped to its edge, and those above or below it are dropped.
+
+  Returns:
+    (pieceEdges, rows, midX, pieceHeight) - arrays with the edge index, row, x midpoint and signed height of each piece
+  """
+  (xFirst, xCount) = calcGridCrossings(x0, x1, width)
+  (yFirst, yCount) = calcGridCrossings(y0, y1, height)
+  (xEdges, xParams) = genCrossingParams(x0, x1, xFirst, xCount)
+  (yEdges, yParams) = genCrossingParams(y0, y1, yFirst, yCount)
+  numEdges = len(x0)
+  pointEdges = np.concatenate([np.arange(numEdges), np.arange(numEdges), xEdges, yEdges])
+  pointParams = np.concatenate([np.zeros(numEdges), np.ones(numEdges), xParams, yParams])
+  # Sort by edge then position along it.  t is in [0, 1], so edge + t / 2 orders both at once
+  order = np.argsort(pointEdges + pointParams / 2)
+  pointEdges = pointEdges[order]
+  pointParams = pointParams[order]
+
+  # Consecutive points along the same edge bound a piece within one cell
+  pieceStart = np.nonzero(pointEdges[:-1] == pointEdges[1:])[0]
+  pieceEdges = pointEdges[pieceStart]
+  tStart = pointParams[pieceStart]
+  tEnd = pointParams[pieceStart + 1]
+  dx = (x1 - x0)[pieceEdges]
+  dy = (y1 - y0)[pieceEdges]
+  pieceY0 = y0[pieceEdges] + tStart * dy
+  pieceY1 = y0[pieceEdges] + tEnd * dy
+  midX = np.clip(x0[pieceEdges] + (tStart + tEnd) / 2 * dx, 0, width)
+  rows = np.floor((pieceY0 + pieceY1) / 2).astype('int64')
+  inGrid = (rows >= 0) & (rows < height)
+  return (pieceEdges[inGrid], rows[inGrid], midX[inGrid], (pieceY1 - pieceY0)[inGrid])
+
+def accumulateEdges(acc, x0, y0, x1, y1, weights, width, height):
+  """Splits edges in pixel coordinates into pieces within one cell and adds their signed coverage into acc, see calcCoverage"""
+  (pieceEdges, rows, midX, pieceHeight) = splitEdges(x0, y0, x1, y1, width, height)
+  # Pieces clamped to the left edge of the grid cover everything to their right in the row
+  cols = np.minimum(np.floor(midX), width).astype('int64')
+  pieceHeight = pieceHeight * weights[pieceEdges]
+  fracRight = midX - cols
+
+  cells = rows * (width + 2) + cols
+  acc += np.bincount(
+    np.concatenate([cells, cells + 1]),
+    weights=np.concatenate([pieceHeight * (1 - fracRight), pieceHeight * fracRight]),
+    minlength=len(acc)
+  )
+
+def toPixelEdges(geometries, outTransform, height):
+  """Returns the ring edges of polygon geometries in pixel coordinates of a grid, see calcCoverage
+
+  Edges are signed so that each geometry's coverage comes out positive whichever way its rings are wound,
+  and horizontal edges and edges entirely above or below the grid, which contribute nothing, are dropped.
+
+  Returns:
+    (x0, y0, x1, y1, edgeSign, geomIndex) - arrays with one entry per edge
+  """
+  (x0, y0, x1, y1, geomIndex, isExterior, ringIndex) = genRingEdges(geometries)
+
+  # To pixel coordinates, rows increasing down
+  x0 = (x0 - outTransform.c) / outTransform.a
+  x1 = (x1 - outTransform.c) / outTransform.a
+  y0 = (y0 - outTransform.f) / outTransform.e
+  y1 = (y1 - outTransform.f) / outTransform.e
+
+  # Coverage comes out negative for rings wound counter-clockwise in pixel coordinates, flip them, and holes
+  ringArea = np.bincount(ringIndex, weights=x0 * y1 - x1 * y0)
+  edgeSign = -np.sign(ringArea[ringIndex]) * np.where(isExterior, 1, -1)
+
+  keep = (y0 != y1) & (np.maximum(y0, y1) > 0) & (np.minimum(y0, y1) < height)
+  return (x0[keep], y0[keep], x1[keep], y1[keep], edgeSign[keep], geomIndex[keep])
+
+def calcCoverage(shapes, outTransform, width, height, dtype='float64'):
+  """Returns the sum of each shape's value times the exact fraction of each cell it covers
+
+  Each ring edge is split where it crosses the grid lines, so every piece falls within a single cell.
+  A piece adds its signed height times the fraction of its cell to its right, and its full signed
+  height to every cell further right along the row, which a cumulative sum along each row fills in.
+  Cost is proportional to the number of edge pieces rather than the number of cells covered, and the
+  total heat burned in equals the sum of value * area for the parts of shapes within the grid.
+
+  Parameters:
+    shapes: list of (geometry, value) tuples, geometry must be a shapely Polygon or MultiPolygon
+    outTransform: affine transform of the output grid, without rotation
+    width: width of the output grid in pixels
+    height: height of the output grid in pixels
+    dtype: data type of the result
+  Returns:
+    (height, width) array
+  """
+  if len(shapes) == 0 or width == 0 or height == 0:
+    return np.zeros((height, width), dtype=dtype)
+
+  (x0, y0, x1, y1, edgeSign, geomIndex) = toPixelEdges([geometry for geometry, value in shapes], outTransform, height)
+  values = np.array([value for geometry, value in shapes], dtype='float64')
+  weights = values[geomIndex] * edgeSign
+
+  # Two extra columns, for pieces clamped to the right edge of the grid
+  acc = np.zeros(height * (width + 2), dtype='float64')
+  for start in range(0, len(x0), EDGE_CHUNK_SIZE):
+    end = start + EDGE_CHUNK_SIZE
+    accumulateEdges(acc, x0[start:end], y0[start:end], x1[start:end], y1[start:end], weights[start:end], width, height)
+  coverage = np.cumsum(acc.reshape(height, width + 2), axis=1)[:, :width]
+  return coverage.astype(dtype, copy=False)
+
+def burnCoverage(result, shapes, outTransform):
+  """Adds the exact coverage of shapes into the (height, width) result array in place, see calcCoverage
+
+  Coverage is calculated for bands of rows under COVERAGE_CHUNK_BYTES at a time, each with only the shapes
+  whose bounds overlap it, so memory use stays bounded for grids larger than memory, see ScratchArray
+  """
+  if len(shapes) == 0:
+    return result
+  (height, width) = result.shape
+  numRows = max(1, COVERAGE_CHUNK_BYTES // ((width + 2) * 8))
+  if numRows >= height:
+    result += calcCoverage(shapes, outTransform, width, height, result.dtype)
+    return result
+
+  shapeBounds = shapely.bounds(np.array([geometry for geometry, value in shapes], dtype=object))
+  bottoms = (shapeBounds[:, 1] - outTransform.f) / outTransform.e
+  tops = (shapeBounds[:, 3] - outTransform.f) / outTransform.e
+  (firstRows, lastRows) = (np.minimum(tops, bottoms), np.maximum(tops, bottoms))
+  for rowOff in range(0, height, numRows):
+    bandHeight = min(numRows, height - rowOff)
+    inBand = np.nonzero((lastRows > rowOff) & (firstRows < rowOff + bandHeight))[0]
+    if len(inBand) > 0:
+      bandTransform = windows.transform(Window(0, rowOff, width, bandHeight), outTransform)
+      result[rowOff:rowOff + bandHeight] += calcCoverage([shapes[i] for i in inBand], bandTransform, width, bandHeight, result.dtype)
+  return result
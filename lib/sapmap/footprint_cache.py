@@ -0,0 +1,145 @@
+import math
+import time
+import hashlib
+import sqlite3
+import numpy as np
+from rasterio import windows
+from rasterio.windows import Window
+from rasterio.features import rasterize
+from rasterio.enums import MergeAlg
+
+# Default maximum size of cached footprint data, in bytes
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+def calcFootprint(geometry, outTransform, width, height, allTouched=False):
+  """Rasterizes a single geometry and returns its sparse pixel footprint on the output grid
+
+  Only the window of the grid covering the geometry's bounds is rasterized.
+
+  Parameters:
+    geometry: shapely geometry in the coordinate system of the output grid
+    outTransform: affine transform of the output grid
+    width: width of the output grid in pixels
+    height: height of the output grid in pixels
+    allTouched: rasterize using the allTouched option
+  Returns:
+    (indices, coverage) - int64 array of flat pixel indices into the (height, width) grid, and float64 array of the amount burned into each
+  """
+  (minx, miny, maxx, maxy) = geometry.bounds
+  # Pad by a pixel so allTouched picks up pixels the geometry only touches along an edge
+  colOff = max(math.floor((minx - outTransform.c) / outTransform.a) - 1, 0)
+  colEnd = min(math.ceil((maxx - outTransform.c) / outTransform.a) + 1, width)
+  rowOff = max(math.floor((maxy - outTransform.f) / outTransform.e) - 1, 0)
+  rowEnd = min(math.ceil((miny - outTransform.f) / outTransform.e) + 1, height)
+  if colEnd <= colOff or rowEnd <= rowOff:
+    return (np.empty(0, dtype='int64'), np.empty(0, dtype='float64'))
+
+  window = Window(colOff, rowOff, colEnd - colOff, rowEnd - rowOff)
+  block = rasterize(
+    [(geometry, 1)],
+    out_shape=(rowEnd - rowOff, colEnd - colOff),
+    transform=windows.transform(window, outTransform),
+    merge_alg=MergeAlg.add,
+    fill=0,
+    all_touched=allTouched,
+    dtype='float64'
+  )
+  rows, cols = np.nonzero(block)
+  indices = (rows.astype('int64') + rowOff) * width + (cols.astype('int64') + colOff)
+  return (indices, block[rows, cols])
+
+class FootprintCache:
+  """On-disk cache of per-feature rasterized footprints, with size-bounded LRU eviction
+
+  Footprints are keyed by a hash of the geometry, the output grid (transform, width, height)
+  and the allTouched flag, so runs that only change how features are weighted (importanceField,
+  method, maxSap, etc.) can reuse them and burn in with a weighted scatter-add instead of rasterizing.
+
+  Parameters:
+    path: path to the sqlite cache file, created if it doesn't exist
+    maxBytes: maximum size of footprint data to keep, least recently used footprints are evicted past it
+  """
+  def __init__(self, path, maxBytes=DEFAULT_CACHE_SIZE):
+    self.path = path
+    self.maxBytes = maxBytes
+    self.hits = 0
+    self.misses = 0
+    self.db = sqlite3.connect(path)
+    self.db.execute('''CREATE TABLE IF NOT EXISTS footprints (
+      key TEXT PRIMARY KEY,
+      indices BLOB,
+      coverage BLOB,
+      size INTEGER,
+      lastUsed REAL
+    )''')
+    self.db.commit()
+
+  def close(self):
+    self.db.close()
+
+  def calcKey(self, geometry, outTransform, width, height, allTouched):
+    gridKey = '{0}|{1}|{2}|{3}'.format(tuple(outTransform), width, height, bool(allTouched))
+    return hashlib.sha1(geometry.wkb + gridKey.encode('utf-8')).hexdigest()
+
+  def getFootprints(self, geometries, outTransform, width, height, allTouched=False):
+    """Returns list of (indices, coverage) footprints for geometries, rasterizing and caching any not found
+
+    Parameters:
+      geometries: list of shapely geometries in the coordinate system of the output grid
+      outTransform: affine transform of the output grid
+      width: width of the output grid in pixels
+      height: height of the output grid in pixels
+      allTouched: rasterize using the allTouched option
+    """
+    now = time.time()
+    footprints = []
+    used = []
+    added = []
+    for geometry in geometries:
+      key = self.calcKey(geometry, outTransform, width, height, allTouched)
+      row = self.db.execute('SELECT indices, coverage FROM footprints WHERE key = ?', (key,)).fetchone()
+      if row:
+        self.hits += 1
+        footprints.append((np.frombuffer(row[0], dtype='int64'), np.frombuffer(row[1], dtype='float64')))
+        used.append((now, key))
+      else:
+        self.misses += 1
+        (indices, coverage) = calcFootprint(geometry, outTransform, width, height, allTouched)
+        footprints.append((indices, coverage))
+        added.append((key, indices.tobytes(), coverage.tobytes(), indices.nbytes + coverage.nbytes, now))
+
+    self.db.executemany('UPDATE footprints SET lastUsed = ? WHERE key = ?', used)
+    self.db.executemany('INSERT OR REPLACE INTO footprints VALUES (?, ?, ?, ?, ?)', added)
+    self.db.commit()
+    if len(added) > 0:
+      self.evict()
+    return footprints
+
+  def evict(self):
+    """Deletes least recently used footprints until total size is under maxBytes"""
+    total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM footprints').fetchone()[0]
+    if total <= self.maxBytes:
+      return
+    evictKeys = []
+    for key, size in self.db.execute('SELECT key, size FROM footprints ORDER BY lastUsed ASC, rowid ASC'):
+      if total <= self.maxBytes:
+        break
+      evictKeys.append((key,))
+      total -= size
+    self.db.executemany('DELETE FROM footprints WHERE key = ?', evictKeys)
+    self.db.commit()
+
+def burnFootprints(result, footprints, heatValues):
+  """Adds weighted footprints into the result array in place
+
+  Parameters:
+    result: (height, width) array to add into
+    footprints: list of (indices, coverage) as returned by FootprintCache.getFootprints
+    heatValues: heat value to weight each footprint by
+  """
+  if len(footprints) == 0:
+    return result
+  indices = np.concatenate([indices for indices, coverage in footprints])
+  weights = np.concatenate([coverage * heatValue for (indices, coverage), heatValue in zip(footprints, heatValues)])
+  np.add.at(result.reshape(-1), indices, weights)
+  return result
@@ -1,19 +1,336 @@
 import math
 import os
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shapely
 from numpy import Infinity
 import rasterio
 from rasterio.features import bounds, rasterize
-from rasterio.enums import MergeAlg
+from rasterio.enums import MergeAlg, Resampling
 from rasterio.crs import CRS
 import rasterio.shutil
-from reprojectFeature import reprojectPolygon
+from reprojectFeature import reprojectPolygons, reprojectGeometries
 from shapely.geometry import shape, box, Polygon
 import fiona
 import simplejson
 import time
 import datetime
 from sapmap.calc_raster_props import calcRasterProps
-from sapmap.calc_sap import calcSap
+from sapmap.calc_sap import calcSap, calcSapArray
+from sapmap.tiled import rasterizeTiles
+from sapmap.shape_index import ShapeIndex
+from sapmap.streaming import LogWriter, FeatureCollectionWriter, featureToDict
+from sapmap.incremental import readIncrementalBase, checkIncrementalParams, getAccumulatorPath, snapResidues
+from sapmap.footprint_cache import FootprintCache, burnFootprints, DEFAULT_CACHE_SIZE
+from sapmap.output_profiles import OUTPUT_PROFILES, OVERVIEW_PROFILES, DEFAULT_BLOCK_SIZE, getCreationOptions, calcOverviewFactors, writeCog
+from sapmap.sparse_accumulator import SparseAccumulator
+from sapmap.scratch import ScratchArray, writeRows
+from sapmap.pyramid import calcPyramidLevels, aggregateBlocks, writeLevel
+from sapmap.manifest import ID_LISTS, IdsWriter, getIdsPath
+from sapmap.coverage import burnCoverage
+from sapmap.simplify import ShapeSimplifier
+from sapmap.timings import PhaseTimer
+from sapmap.columnar import ColumnarFeatures, isColumnarFile
+
+# Tile size used when workers is set without a tileSize
+DEFAULT_TILE_SIZE = 512
+# Number of features read and reprojected at a time
+CHUNK_SIZE = 10000
+# Number of features sent to an ingest worker process at a time, see genIngestedChunks
+INGEST_CHUNK_SIZE = 2000
+
+def genFeatureChunks(src_shapes, chunkSize=CHUNK_SIZE):
+  """Generates (startIndex, features) tuples, reading features from collection chunkSize at a time"""
+  features = iter(src_shapes)
+  startIndex = 0
+  while True:
+    chunk = list(itertools.islice(features, chunkSize))
+    if len(chunk) == 0:
+      return
+    yield (startIndex, chunk)
+    startIndex += len(chunk)
+
+# Reasons features are excluded, see validateShapes
+ERROR_INVALID = "Geometry is invalid"
+ERROR_FIX_FAILED = "Geometry is invalid or area is 0, attempted fix failed"
+ERROR_ZERO_AREA = "Area of geometry is zero"
+ERROR_NO_COORDINATES = "Geometry has no coordinates"
+
+def openShapes(infile, columns=None):
+  """Opens vector dataset with fiona, or as ColumnarFeatures if it's a GeoParquet or Feather file, reading only the given attribute columns"""
+  if isColumnarFile(infile):
+    return ColumnarFeatures(infile, columns)
+  return fiona.open(infile)
+
+def genShapeChunks(src_shapes, inCrsString, outCrsString, chunkSize=CHUNK_SIZE, skip=None, timer=None):
+  """Generates (startIndex, features, keep, shapeGeoms) for each chunk of features, reprojected to outCrsString
+
+  Reprojection is done in bulk, one chunk of features at a time.  Features for which the optional
+  skip(feature) function returns True are not converted, keep is a boolean array of those that are, and
+  shapeGeoms an array of shapely geometries for them.  Reading and reprojecting are timed as the read
+  and reproject phases of the optional PhaseTimer
+  """
+  if timer is None:
+    timer = PhaseTimer()
+  for startIndex, chunk in timer.genTimed('read', genFeatureChunks(src_shapes, chunkSize)):
+    timer.start('reproject')
+    keep = np.array([not (skip and skip(feature)) for feature in chunk], dtype=bool)
+    shapeGeoms = toShapeGeoms([feature['geometry'] for feature, isKept in zip(chunk, keep) if isKept], inCrsString, outCrsString)
+    timer.stop('reproject')
+    yield (startIndex, chunk, keep, shapeGeoms)
+
+def toShapeGeoms(geometries, inCrsString, outCrsString):
+  """Returns array of shapely geometries for GeoJSON-like geometries, reprojected to outCrsString"""
+  shapeGeoms = np.empty(len(geometries), dtype=object)
+  if inCrsString == outCrsString:
+    shapeGeoms[:] = [shape(geometry) for geometry in geometries]
+  else:
+    shapeGeoms[:] = list(reprojectPolygons(geometries, inCrsString, outCrsString))
+  return shapeGeoms
+
+def calcExteriorLengths(shapeGeoms):
+  """Returns array with the length of the exterior ring of each Polygon, or the sum of them for a MultiPolygon"""
+  parts, partIndex = shapely.get_parts(shapeGeoms, return_index=True)
+  return np.bincount(partIndex, weights=shapely.length(shapely.get_exterior_ring(parts)), minlength=len(shapeGeoms))
+
+def toPolygonal(geometries):
+  """Returns array with only the polygonal parts of each geometry, a Polygon if it has one, a MultiPolygon if more, or an empty Polygon if none
+
+  Lines and points are dropped from the GeometryCollections make_valid returns where parts collapse
+  """
+  parts, index = shapely.get_parts(geometries, return_index=True)
+  # A second level splits MultiPolygons nested in a GeometryCollection
+  parts, subIndex = shapely.get_parts(parts, return_index=True)
+  index = index[subIndex]
+  isPolygon = shapely.get_type_id(parts) == shapely.GeometryType.POLYGON
+  (parts, index) = (parts[isPolygon], index[isPolygon])
+
+  counts = np.bincount(index, minlength=len(geometries))
+  result = np.full(len(geometries), Polygon(), dtype=object)
+  single = counts[index] == 1
+  result[index[single]] = parts[single]
+  multiIndexes = np.nonzero(counts > 1)[0]
+  if len(multiIndexes) > 0:
+    result[multiIndexes] = shapely.multipolygons(parts[~single], indices=np.searchsorted(multiIndexes, index[~single]))
+  return result
+
+def validateShapes(shapeGeoms, fixGeom=False):
+  """Checks shapes are valid and have area in bulk, if fixGeom is True invalid shapes are repaired with make_valid
+
+  Repair keeps the polygonal parts of a shape, dropping any parts collapsed to lines or points, and is
+  successful if the result is valid and has area.  Shapes with no coordinates, including MultiPolygons
+  with no parts, are excluded first.
+
+  Parameters:
+    shapeGeoms: array of shapely geometries in output coordinate system
+    fixGeom: whether to attempt to fix invalid geometry
+  Returns:
+    (shapeGeoms, errors, fixed, areas, exteriorLengths) - arrays with the geometry to use, error message or False,
+    whether the geometry was fixed, area and exterior ring length (see calcExteriorLengths) of each shape
+  """
+  shapeGeoms = np.array(shapeGeoms, dtype=object)
+  noCoordinates = shapely.get_num_coordinates(shapeGeoms) == 0
+  invalid = ~shapely.is_valid(shapeGeoms) & ~noCoordinates
+  fixed = np.zeros(len(shapeGeoms), dtype=bool)
+  if fixGeom and invalid.any():
+    repaired = toPolygonal(shapely.make_valid(shapeGeoms[invalid]))
+    repairedOk = shapely.is_valid(repaired) & (shapely.area(repaired) > 0)
+    fixed[np.nonzero(invalid)[0][repairedOk]] = True
+    shapeGeoms[fixed] = repaired[repairedOk]
+    invalid &= ~fixed
+  areas = shapely.area(shapeGeoms)
+
+  # Later assignments take precedence
+  errors = np.full(len(shapeGeoms), False, dtype=object)
+  errors[areas == 0] = ERROR_ZERO_AREA
+  errors[invalid] = ERROR_FIX_FAILED if fixGeom else ERROR_INVALID
+  errors[noCoordinates] = ERROR_NO_COORDINATES
+  return (shapeGeoms, errors, fixed, areas, calcExteriorLengths(shapeGeoms))
+
+def genValidatedChunks(src_shapes, inCrsString, outCrsString, fixGeom=False, skip=None, timer=None):
+  """Generates (startIndex, features, keep, validated) for each chunk of features, see genShapeChunks
+
+  validated is the output of validateShapes for the kept features of the chunk, timed as the validate phase
+  of the optional PhaseTimer
+  """
+  if timer is None:
+    timer = PhaseTimer()
+  if isinstance(src_shapes, ColumnarFeatures):
+    chunks = src_shapes.genShapeChunks(inCrsString, outCrsString, CHUNK_SIZE, skip, timer)
+  else:
+    chunks = genShapeChunks(src_shapes, inCrsString, outCrsString, skip=skip, timer=timer)
+  for startIndex, chunk, keep, shapeGeoms in chunks:
+    timer.start('validate')
+    validated = validateShapes(shapeGeoms, fixGeom)
+    timer.stop('validate')
+    yield (startIndex, chunk, keep, validated)
+
+def ingestChunk(geometries, inCrsString, outCrsString, fixGeom=False):
+  """Converts, reprojects and validates a chunk of geometries in an ingest worker process, see genIngestedChunks
+
+  Parameters:
+    geometries: list of GeoJSON-like geometries, or array of WKB geometries from ColumnarFeatures
+    inCrsString: epsg code of the geometries coordinate system
+    outCrsString: epsg code of the coordinate system to reproject to
+    fixGeom: whether to attempt to fix invalid geometry, see validateShapes
+  Returns:
+    (wkb, errors, fixed, areas, exteriorLengths) arrays, see validateShapes.  Geometries are WKB encoded, much
+    more compact to send back to the main process than shapely geometries
+  """
+  if isinstance(geometries, np.ndarray):
+    shapeGeoms = shapely.from_wkb(geometries)
+    if inCrsString != outCrsString:
+      shapeGeoms = reprojectGeometries(shapeGeoms, inCrsString, outCrsString)
+  else:
+    shapeGeoms = toShapeGeoms(geometries, inCrsString, outCrsString)
+  (shapeGeoms, errors, fixed, areas, exteriorLengths) = validateShapes(shapeGeoms, fixGeom)
+  return (shapely.to_wkb(shapeGeoms), errors, fixed, areas, exteriorLengths)
+
+def genIngestedChunks(src_shapes, inCrsString, outCrsString, fixGeom=False, skip=None, workers=2, timer=None):
+  """Generates (startIndex, features, keep, validated) for each chunk of features, see genValidatedChunks, with
+  geometries converted, reprojected and validated in a pool of worker processes
+
+  Features are read in the main process INGEST_CHUNK_SIZE at a time, and each chunk's kept geometries dispatched
+  to the pool, keeping at most two chunks per worker in flight.  Chunks are yielded back in input order, so
+  results are the same as genValidatedChunks.  Reading is timed as the read phase, and waiting on and decoding
+  worker results as the ingest phase of the optional PhaseTimer
+  """
+  if timer is None:
+    timer = PhaseTimer()
+
+  def collect(startIndex, chunk, keep, future):
+    timer.start('ingest')
+    (wkb, errors, fixed, areas, exteriorLengths) = future.result()
+    validated = (shapely.from_wkb(wkb), errors, fixed, areas, exteriorLengths)
+    timer.stop('ingest')
+    return (startIndex, chunk, keep, validated)
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    pending = deque()
+    for startIndex, chunk in timer.genTimed('read', genFeatureChunks(src_shapes, INGEST_CHUNK_SIZE)):
+      timer.start('read')
+      keep = np.array([not (skip and skip(feature)) for feature in chunk], dtype=bool)
+      if isinstance(src_shapes, ColumnarFeatures):
+        geometries = src_shapes.wkb[startIndex:startIndex + len(chunk)][keep]
+      else:
+        geometries = [feature['geometry'] for feature, isKept in zip(chunk, keep) if isKept]
+      timer.stop('read')
+      pending.append((startIndex, chunk, keep, executor.submit(ingestChunk, geometries, inCrsString, outCrsString, fixGeom)))
+      if len(pending) >= workers * 2:
+        yield collect(*pending.popleft())
+    while pending:
+      yield collect(*pending.popleft())
+
+def genValidatedShapes(src_shapes, inCrsString, outCrsString, fixGeom=False, skip=None, timer=None, workers=None):
+  """Generates (index, feature, shapely geometry, error, fixed, area, exteriorLength) for each feature, reprojected and validated
+
+  Each chunk of features is validated in bulk, see validateShapes, in a pool of worker processes if workers > 1,
+  see genIngestedChunks.  Features skipped by the optional skip(feature) function are yielded with geometry None,
+  see genShapeChunks.  Phases are timed with the optional PhaseTimer
+  """
+  if workers is not None and workers > 1:
+    chunks = genIngestedChunks(src_shapes, inCrsString, outCrsString, fixGeom, skip, workers, timer)
+  else:
+    chunks = genValidatedChunks(src_shapes, inCrsString, outCrsString, fixGeom, skip, timer)
+  for startIndex, chunk, keep, validated in chunks:
+    validated = zip(*validated)
+    for offset, (feature, isKept) in enumerate(zip(chunk, keep)):
+      if isKept:
+        (shapeGeom, error, fixed, area, exteriorLength) = next(validated)
+        yield (startIndex + offset, feature, shapeGeom, error, bool(fixed), float(area), float(exteriorLength))
+      else:
+        yield (startIndex + offset, feature, None, False, False, 0, 0)
+
+class LoadedShapes:
+  """Features of a vector dataset loaded, reprojected and validated once, for generating multiple heatmaps
+
+  Pass to genSapMap as loadedShapes to skip reading infile.  Heat values, small shapes and the output
+  grid are still calculated per run, so runs can differ in everything but outCrsString and fixGeom.
+
+  Parameters:
+    infile: path+filename of vector dataset containing features, format must be supported by fiona/gdal, or GeoParquet/Feather, see genSapMap
+    outCrsString: the epsg code of the coordinate system to reproject features to, defaults to epsg:3857
+    fixGeom: whether to attempt to fix invalid geometry using make_valid, see genSapMap
+    ingestWorkers: number of processes to reproject and validate features with, see genSapMap
+  """
+  def __init__(self, infile, outCrsString='epsg:3857', fixGeom=False, ingestWorkers=None):
+    startTime = time.perf_counter()
+    self.infile = infile
+    self.outCrsString = outCrsString
+    self.fixGeom = fixGeom
+    timer = PhaseTimer()
+    with openShapes(infile) as src_shapes:
+      self.crs = src_shapes.crs
+      self.bounds = src_shapes.bounds
+      self.records = list(genValidatedShapes(src_shapes, src_shapes.crs['init'], outCrsString, fixGeom, timer=timer, workers=ingestWorkers))
+    self.loadTime = round(time.perf_counter() - startTime, 2)
+    self.timings = timer.getTimings()
+
+  def __len__(self):
+    return len(self.records)
+
+def getBasename(infile, outPath=None):
+  """Returns path of genSapMap output files minus extension, they have the same name as infile, in outPath if given"""
+  inpath, inFullFilename = os.path.split(infile)
+  inFilename = inFullFilename.split('.')[0]
+  return os.path.join(inpath if outPath is None else outPath, inFilename)
+
+def calcHeatValues(method, areas, importances, importanceFactors, areaFactor=1, maxArea=None, maxSap=None):
+  """Returns float64 array with the heat value to burn in for each shape, given the calculation method (count, area, sap)"""
+  if method == 'area':
+    return calcSapArray(areas)
+  elif method == 'sap':
+    return calcSapArray(areas, importances, areaFactor, importanceFactors, maxArea, maxSap)
+  else: # count method
+    return calcSapArray(np.ones(len(areas)))
+
+def splitShapes(geometries, heatValues, smallFlags):
+  """Returns (shapes, smallShapes), lists of (geometry, heatValue) tuples as expected by rasterize"""
+  shapes = []
+  smallShapes = []
+  for geometry, heatValue, isSmall in zip(geometries, heatValues, smallFlags):
+    if isSmall:
+      smallShapes.append((geometry, heatValue))
+    else:
+      shapes.append((geometry, heatValue))
+  return (shapes, smallShapes)
+
+def burnShapes(result, shapes, smallShapes, outTransform, footprintCache=None, exactCoverage=False, timer=None):
+  """Rasterizes shapes and adds them into the result array or SparseAccumulator in place, small shapes with allTouched
+
+  If a FootprintCache is given, footprints are looked up or rasterized and cached, then burned in with a weighted scatter-add.
+  If exactCoverage is True, all shapes are instead burned in weighted by the exact fraction of each cell they cover.
+  Timed as the rasterize phases of the optional PhaseTimer
+  """
+  if timer is None:
+    timer = PhaseTimer()
+  if isinstance(result, SparseAccumulator) or exactCoverage:
+    timer.start('rasterize')
+    if isinstance(result, SparseAccumulator):
+      result.burnShapes(shapes, smallShapes, outTransform, exactCoverage)
+    else:
+      burnCoverage(result, shapes + smallShapes, outTransform)
+    timer.stop('rasterize')
+    return result
+  for curShapes, allTouched, phase in ((smallShapes, True, 'rasterizeSmall'), (shapes, False, 'rasterizeLarge')):
+    if len(curShapes) > 0:
+      timer.start(phase)
+      if footprintCache:
+        (height, width) = result.shape
+        footprints = footprintCache.getFootprints([geometry for geometry, value in curShapes], outTransform, width, height, allTouched)
+        burnFootprints(result, footprints, [value for geometry, value in curShapes])
+      else:
+        rasterize(
+          curShapes,
+          out=result,
+          transform=outTransform,
+          merge_alg=MergeAlg.add,
+          all_touched=allTouched
+        )
+      timer.stop(phase)
+  return result
 
 def genSapMap(
   infile,
@@ -34,11 +351,33 @@ def genSapMap(
   maxArea=None,
   maxSap=None,
   logToFile=False,
+  tileSize=None,
+  workers=None,
+  streaming=False,
+  incrementalFrom=None,
+  previousInfile=None,
+  footprintCache=None,
+  footprintCacheSize=DEFAULT_CACHE_SIZE,
+  loadedShapes=None,
+  groupByField=None,
+  outProfile='default',
+  accumulator='dense',
+  exactCoverage=False,
+  metricsHook=None,
+  scratchDir=None,
+  keepScratch=False,
+  accumulatorDtype='float64',
+  ingestWorkers=None,
+  pyramidResolutions=None,
+  compactManifest=False,
+  simplify=False,
+  simplifyFactor=0.1,
+  keepAccumulator=False,
 ):
   """Generates Spatial Access Priority (SAP) raster map given run configuration
 
   Arguments:
-    infile: path+filename of vector dataset containing features, format must be supported by fiona/gdal
+    infile: path+filename of vector dataset containing features, format must be supported by fiona/gdal.  GeoParquet (.parquet, .geoparquet) and Feather (.feather, .arrow) files with WKB geometry are read directly into arrays instead, only reading the importanceField, importanceFactorField, uniqueIdField and groupByField columns, which is much faster for large inputs.  Requires pyarrow, see convertToGeoParquet
     outpath: path to output heatmaps to.  Filename will be the same as the input, just with the .tif extension.  If not specified, heatmaps are output to the input folder
     overwrite: whether to overwrite existing heatmap output, defaults to false and skips
     method: method for calculating value: count, area, sap. Defaults to area
@@ -52,19 +391,84 @@ def genSapMap(
     boundsPrecision: number of digits to round the coordinates of bound calculation to. useful if don't snap to numbers as expected
     allTouchedSmall: (boolean) use allTouched rasterize option for shapes with smaller shape index than a raster cell (area/perimeter length).  Ensures small and narrow shapes are not lost and every shape contributes heat to at least one pixel in result. Larger shapes are still picked up using Bresenham’s line algorithm because allTouched creates some seemingly invalid output (double counting) along shape boundaries. Using allTouched only for smallest shapes that need it mitigates this, but also uses additional memory, and will also carry more weight than shapes just above the index threshold.
     allTouchedSmallFactor: (number) use to increase the shapeIndex threshold for identifying small shapes.  shapeIndex threshold is calculated as (shapeIndex of a raster cell * allTouchedSmallFactor).  Defaults to 1.25.  Increasing the factor will identify increasingly larger shapes as "small" and to be run with AllTouched option.  Useful when you have polygons that are mostly large but have small areas that are long and narrow and thus spotty in being picked up
-    fixGeom: if an invalid geometry is found, if fixGeom is True it attempts to fix using buffer(0), otherwise it fails.  Review the log to make sure the automated fix was acceptable
-    logToFile: (boolean) whether to output logs, errors, and manifest to file or stdout
+    fixGeom: if an invalid geometry is found, if fixGeom is True it attempts to fix using make_valid, keeping only its polygonal parts, otherwise it fails.  Review the log to make sure the automated fix was acceptable
+    logToFile: (boolean) whether to output logs, errors, and manifest to file or stdout.
+    tileSize: (integer) rasterize and write the output in tiles of tileSize x tileSize pixels, burning in only the shapes that intersect each tile.  Bounds peak memory to one tile instead of the whole grid, useful for large bounds and/or small outResolution.  Output GeoTIFF is internally tiled with the same block size, so must be a multiple of 16.  Defaults to None, rasterizing the whole grid at once
+    workers: (integer) number of processes to rasterize with.  The output grid is partitioned into tiles (see tileSize, defaults to 512 if not set) and each tile, along with the shapes that intersect it, is dispatched to a process pool.  Defaults to None, rasterizing in a single process
+    streaming: (boolean) burn in features in chunks of 10000 as they are read into a running accumulator, and write log lines and error features straight to their files, instead of keeping every feature in memory until the end.  Cannot be combined with tileSize or workers.  Defaults to False
+    incrementalFrom: path to an existing heatmap .tif, with its .manifest.json alongside it (see logToFile), to update instead of rebuilding.  Only features whose uniqueIdField value is not in the manifest's included or excluded lists are burned in, and the heat of features no longer in infile is subtracted, producing the same result as a full rebuild in time proportional to the change.  The existing heatmap is read from its full precision .accumulator.npy sidecar if it was run with keepAccumulator, otherwise from the float32 .tif, which may differ from a rebuild by float32 rounding.  Cells left with only floating point residue after subtracting are set to 0.  Requires uniqueIdField and the same parameters and output grid as the existing run.  Cannot be combined with tileSize or workers
+    previousInfile: vector dataset containing the features removed since the incrementalFrom run, for subtracting their heat.  Defaults to the infile recorded in the incrementalFrom manifest
+    footprintCache: path to an on-disk cache file of rasterized feature footprints, created if it doesn't exist.  Footprints are keyed by geometry and output grid, so re-runs over the same features and grid with different weighting (importanceField, method, maxSap, etc.) skip rasterizing and just do a weighted scatter-add.  Cannot be combined with tileSize or workers.  Defaults to None, no cache
+    footprintCacheSize: maximum size in bytes of the footprintCache, least recently used footprints are evicted past it.  Defaults to 1GB
+    loadedShapes: LoadedShapes for infile, already loaded with the same outCrsString and fixGeom, to use instead of reading infile.  Useful for generating multiple heatmaps from the same input, see genSapMaps.  Cannot be combined with incrementalFrom.  Defaults to None
+    groupByField: name of vector attribute to group features by.  Each group is burned into its own band of a single multi-band output raster, in one pass over the features.  Bands are ordered by group value and described with it, and the manifest lists the included feature count of each group.  Cannot be combined with streaming, incrementalFrom, tileSize or workers.  Defaults to None, a single band with all features
+    outProfile: GeoTIFF output profile.  'default' is striped and uncompressed.  'tiled' is internally tiled.  'deflate' and 'zstd' are tiled, compressed with a floating point predictor, and include average overview pyramids.  'cog' is a DEFLATE compressed Cloud-Optimized GeoTIFF with overviews, ready to range-read from a web map.  Tiles are tileSize if set, otherwise 256 pixels.  Defaults to 'default'
+    accumulator: how heat is accumulated before writing.  'dense' holds an array for the whole output grid.  'sparse' only allocates the 256x256 pixel blocks that shapes fall in, and leaves empty blocks out of the output GeoTIFF (read back as nodata), so memory and write time scale with the occupied area instead of the bounds.  'sparse' output is always tiled, and cannot be combined with tileSize, workers, incrementalFrom, footprintCache or groupByField.  'memmap' holds the whole grid in a memory-mapped scratch file (see scratchDir), paged in and out of memory by the OS, for dense grids larger than RAM.  'memmap' cannot be combined with tileSize, workers, incrementalFrom or groupByField.  Defaults to 'dense'
+    exactCoverage: (boolean) burn each shape into every cell it overlaps, weighted by the exact fraction of the cell it covers, instead of by cell center.  Small and narrow shapes are never lost and edges are not double counted, so the total heat burned in is conserved (sum of heat value * area / cell area), making allTouchedSmall unnecessary.  Cost is proportional to the number of shape edges crossing cell boundaries.  Cannot be combined with allTouchedSmall or footprintCache.  Defaults to False
+    metricsHook: function called with a dict of the run's infile, outfile, executionTime, timings and memory (see Returns) once it completes, for forwarding metrics to monitoring.  Must be picklable to use with genSapMaps workers.  Defaults to None
+    scratchDir: directory to create the 'memmap' accumulator's scratch file in, needs free disk space for the full float64 grid.  Defaults to None, the system temp directory
+    keepScratch: (boolean) keep the 'memmap' accumulator's scratch file after the run instead of removing it, its path is recorded in the manifest.  Defaults to False
+    accumulatorDtype: data type heat is accumulated in, 'float64' or 'float32'.  'float32' halves the memory of the accumulator, output is float32 either way, but sums of many overlapping shapes lose precision.  Defaults to 'float64'
+    pyramidResolutions: list of coarser resolutions to also output the heatmap at, each a whole multiple of outResolution, such as [500, 1000] with an outResolution of 100.  Features are rasterized once at outResolution, and each coarser level derived by summing blocks of cells, which conserves the total heat.  A level is equivalent to a run at its resolution with areaFactor multiplied by the number of cells in a block, so with areaFactor set to the cell area its values are the same as a direct run.  Each level is checked to align with the outResolution grid, and written with the same outProfile to the output path with the resolution appended to the filename, such as infile-500.tif.  Cannot be combined with tileSize, workers, groupByField or the sparse accumulator.  Defaults to None
+    compactManifest: (boolean) write the manifest's lists of included, includedSmall, excluded and fixed feature ids to a binary .manifest.ids.npz sidecar as they're added, a chunk of 100000 at a time, instead of keeping them in memory and writing them as JSON.  The manifest, returned and written, then only has the summary and the path of the sidecar as idsfile.  Use readManifest to read it back with the id lists.  Defaults to False
+    simplify: (boolean) simplify shapes before rasterizing them, with a tolerance of outResolution * simplifyFactor, so vertex detail finer than a cell isn't walked by rasterize.  Topology is preserved, a shape is never simplified to empty, and heat values are still calculated from the original area.  The manifest reports the vertex reduction and toleranceBound, the furthest a simplified boundary can be from its original, in map units and pixels.  Shapes that Douglas-Peucker simplification would drop holes or parts from, or leave invalid, are simplified preserving topology instead.  Defaults to False
+    simplifyFactor: fraction of outResolution that simplified boundaries may deviate by, see simplify.  Defaults to 0.1
+    keepAccumulator: (boolean) also save the accumulator at full precision to a .accumulator.npy sidecar, recorded in the manifest as accumulatorfile, so later runs updating this one with incrementalFrom match a full rebuild exactly.  Needs disk space for the full grid in accumulatorDtype.  Requires logToFile and the dense accumulator, and cannot be combined with tileSize, workers or groupByField.  Defaults to False
+    ingestWorkers: (integer) number of processes to convert, reproject and validate features with while they are read, in chunks of 2000.  Results are merged back in input order, so the output and manifest are the same as a serial run.  Not used with loadedShapes, pass it to LoadedShapes instead.  Defaults to None, ingesting in a single process
 
   Returns:
-    Manifest of run
+    Manifest of run.  Includes timings, the seconds spent in each phase of the run (open, read, reproject, validate, calcSap, rasterizeSmall, rasterizeLarge, write, etc.), and memory, the peak resident set size of the process over its lifetime in bytes (None on Windows).  If tracemalloc is tracing, memory also includes peakTraced, the most allocated at once during the run, and phases, the most allocated at once during each phase
   """
   startTime = time.perf_counter()
+  timer = PhaseTimer()
+
+  if outProfile not in OUTPUT_PROFILES:
+    raise ValueError('outProfile must be one of {0}, got {1}'.format(', '.join(OUTPUT_PROFILES.keys()), outProfile))
+  if accumulator not in ['dense', 'sparse', 'memmap']:
+    raise ValueError("accumulator must be 'dense', 'sparse' or 'memmap', got {0}".format(accumulator))
+  if pyramidResolutions and (tileSize is not None or (workers is not None and workers > 1) or groupByField or accumulator == 'sparse'):
+    raise ValueError('pyramidResolutions cannot be combined with tileSize, workers, groupByField or the sparse accumulator')
+  if keepAccumulator and (not logToFile or accumulator != 'dense' or tileSize is not None or (workers is not None and workers > 1) or groupByField):
+    raise ValueError('keepAccumulator requires logToFile and the dense accumulator, and cannot be combined with tileSize, workers or groupByField')
+  if simplify and simplifyFactor <= 0:
+    raise ValueError('simplifyFactor must be greater than 0, got {0}'.format(simplifyFactor))
+  if accumulatorDtype not in ['float64', 'float32']:
+    raise ValueError("accumulatorDtype must be 'float64' or 'float32', got {0}".format(accumulatorDtype))
+  if accumulator == 'sparse' and (tileSize is not None or (workers is not None and workers > 1) or incrementalFrom or footprintCache or groupByField):
+    raise ValueError('sparse accumulator cannot be combined with tileSize, workers, incrementalFrom, footprintCache or groupByField')
+  if accumulator == 'memmap' and (tileSize is not None or (workers is not None and workers > 1) or incrementalFrom or groupByField):
+    raise ValueError('memmap accumulator cannot be combined with tileSize, workers, incrementalFrom or groupByField')
+  if exactCoverage and (allTouchedSmall or footprintCache):
+    raise ValueError('exactCoverage cannot be combined with allTouchedSmall or footprintCache')
+  if tileSize is not None and (tileSize <= 0 or tileSize % 16 != 0):
+    raise ValueError('tileSize must be a positive multiple of 16, got {0}'.format(tileSize))
+  if streaming and (tileSize is not None or (workers is not None and workers > 1)):
+    raise ValueError('streaming cannot be combined with tileSize or workers')
+  if incrementalFrom and (tileSize is not None or (workers is not None and workers > 1)):
+    raise ValueError('incrementalFrom cannot be combined with tileSize or workers')
+  if footprintCache and (tileSize is not None or (workers is not None and workers > 1)):
+    raise ValueError('footprintCache cannot be combined with tileSize or workers')
+  if incrementalFrom and not uniqueIdField:
+    raise ValueError('incrementalFrom requires uniqueIdField')
+  if groupByField and (streaming or incrementalFrom or tileSize is not None or (workers is not None and workers > 1)):
+    raise ValueError('groupByField cannot be combined with streaming, incrementalFrom, tileSize or workers')
+  if loadedShapes is not None and incrementalFrom:
+    raise ValueError('loadedShapes cannot be combined with incrementalFrom')
+  if loadedShapes is not None and (loadedShapes.outCrsString != outCrsString or loadedShapes.fixGeom != fixGeom):
+    raise ValueError('loadedShapes was loaded with a different outCrsString or fixGeom')
+  if workers is not None and workers > 1 and tileSize is None:
+    tileSize = DEFAULT_TILE_SIZE
   
-  try:
-    src_shapes = fiona.open(infile)
-  except (fiona.errors.DriverError):
-    print('Warning: infile not found, skipping {0}'.format(infile))
-    return None
+  if loadedShapes is not None:
+    src_shapes = loadedShapes
+  else:
+    try:
+      timer.start('open')
+      src_shapes = openShapes(infile, [importanceField, importanceFactorField, uniqueIdField, groupByField])
+      timer.stop('open')
+    except (fiona.errors.DriverError, FileNotFoundError):
+      print('Warning: infile not found, skipping {0}'.format(infile))
+      return None
 
   if len(src_shapes) < 1:
     print('Warning: infile contains no features, skipping {0}'.format(infile))
@@ -73,17 +477,7 @@ def genSapMap(
   outCrs = CRS.from_string(outCrsString)
   error_shapes = []
 
-  # output files have the same name as infile
-  inpath, inFullFilename = os.path.split(infile)
-  inFilename = inFullFilename.split('.')[0]
-  # full path, minus extension
-  inBasename = ''
-
-  if outPath is None:
-    inBasename = os.path.join(inpath, inFilename)    
-  else:
-    inBasename = os.path.join(outPath, inFilename)
-
+  inBasename = getBasename(infile, outPath)
   outfile = "{}.tif".format(inBasename)
   outfileSmall = "{}_small.tif".format(inBasename)
   outfileLarge = "{}_large.tif".format(inBasename)
@@ -105,14 +499,37 @@ def genSapMap(
       'logfile': logfile,
       'manifestfile': manifestfile,
       'errorfile': errorfile,
+      'method': method,
       'importanceField': importanceField,
       'importanceFactorField': importanceFactorField,
+      'areaFactor': areaFactor,
       'uniqueIdField': uniqueIdField,
       'outCrsString': outCrsString,
       'outResolution': outResolution,
       'bounds': bounds,
       'boundsPrecision': boundsPrecision,
       'allTouchedSmall': allTouchedSmall,
+      'allTouchedSmallFactor': allTouchedSmallFactor,
+      'fixGeom': fixGeom,
+      'maxArea': maxArea,
+      'maxSap': maxSap,
+      'tileSize': tileSize,
+      'workers': workers,
+      'streaming': streaming,
+      'incrementalFrom': incrementalFrom,
+      'footprintCache': footprintCache,
+      'groupByField': groupByField,
+      'outProfile': outProfile,
+      'accumulator': accumulator,
+      'exactCoverage': exactCoverage,
+      'scratchDir': os.fspath(scratchDir) if scratchDir else None,
+      'accumulatorDtype': accumulatorDtype,
+      'ingestWorkers': ingestWorkers,
+      'pyramidResolutions': pyramidResolutions,
+      'compactManifest': compactManifest,
+      'simplify': simplify,
+      'simplifyFactor': simplifyFactor,
+      'keepAccumulator': keepAccumulator,
     },
     'included': [],
     'includedSmall': [],
@@ -122,7 +539,13 @@ def genSapMap(
     'excludedCount': 0,
     'includedSmallCount': 0
   }
-  log = []
+  if compactManifest:
+    # Id lists are written to the sidecar as they're added
+    idsWriter = IdsWriter(getIdsPath(inBasename))
+    manifest.update(idsWriter.columns)
+  log = LogWriter(logfile) if streaming else []
+  if streaming:
+    error_shapes = FeatureCollectionWriter(errorfile)
 
   inBounds = bounds if bounds else src_shapes.bounds
   (outBounds, width, height, outTransform) = calcRasterProps(inBounds, src_shapes.crs, outCrsString, outResolution, boundsPrecision)  
@@ -131,11 +554,44 @@ def genSapMap(
   manifest['width'] = width
   manifest['inBounds'] = inBounds
   manifest['outBounds'] = outBounds
+  # Checked before rasterizing, so misaligned levels fail fast
+  pyramidLevels = calcPyramidLevels(inBounds, src_shapes.crs, outCrsString, outResolution, boundsPrecision, width, height, outTransform, pyramidResolutions) if pyramidResolutions else []
 
-  # Generate a list of tuples, each consisting of the geometry and importance, as expected by rasterize
-  shapes = []
-  # Special handle shapes smaller than an output pixel
-  smallShapes = []
+  # Accumulator that shapes, or streamed chunks of them, are rasterized into in place.  Tiled output is
+  # rasterized a tile at a time instead, and groups into their own bands
+  result = None
+  numSmallShapes = 0
+  cache = FootprintCache(footprintCache, footprintCacheSize) if footprintCache else None
+  simplifier = ShapeSimplifier(outResolution * simplifyFactor) if simplify else None
+  if accumulator == 'sparse':
+    result = SparseAccumulator(width, height, DEFAULT_BLOCK_SIZE, accumulatorDtype)
+  elif accumulator == 'memmap':
+    scratch = ScratchArray(height, width, scratchDir, keepScratch, accumulatorDtype)
+    result = scratch.array
+  elif tileSize is None and not groupByField and not incrementalFrom:
+    result = np.zeros((height, width), dtype=accumulatorDtype)
+
+  # Ids already burned in or excluded by the incrementalFrom run
+  prevIncluded = set()
+  prevKnown = set()
+  seenIds = set()
+  if incrementalFrom:
+    timer.start('readIncrementalBase')
+    (prevManifest, result) = readIncrementalBase(incrementalFrom, accumulatorDtype)
+    timer.stop('readIncrementalBase')
+    checkIncrementalParams(prevManifest, manifest)
+    prevIncluded = set(prevManifest['included'])
+    prevSmall = set(prevManifest['includedSmall'])
+    prevFixed = set(prevManifest['fixed'])
+    prevKnown = prevIncluded | set(prevManifest['excluded'])
+
+  # Accepted features, in input order
+  geometries = []
+  areas = []
+  importances = []
+  importanceFactors = []
+  smallFlags = []
+  groupValues = []
 
   # Get shape index for one output raster cell
   (minx, miny, maxx, maxy) = inBounds
@@ -155,69 +611,61 @@ def genSapMap(
   if allTouchedSmall:
     shapeIndexThreshold = cellShapeIndex * allTouchedSmallFactor
 
-  for idx, feature in enumerate(src_shapes):
-      geometry = feature['geometry'] if src_shapes.crs['init'] == outCrsString else next(reprojectPolygon(feature))
-      shapeGeom = shape(geometry)
-      error = False
-      if not shapeGeom.is_valid:
-        if fixGeom:
-          fixedGeom = shapeGeom.buffer(0)
-          if fixedGeom.is_valid and fixedGeom.area > 0:
-            log.append("Fixed invalid feature geometry")
-            log.append(simplejson.dumps(feature))
-            log.append("With new geometry")
-            newGeom = next(reprojectPolygon(fixedGeom.__geo_interface__, "epsg:3857", "epsg:4326"))
-            log.append(simplejson.dumps({
-              **feature,
-              'geometry': newGeom
-            }))
-            log.append("")     
-            shapeGeom = fixedGeom
-            if uniqueIdField:
-              manifest['fixed'].append(feature['properties'][uniqueIdField])
-            else:
-              manifest['fixed'].append(idx + 1)
+  inCrsString = src_shapes.crs['init']
+  skip = (lambda feature: feature['properties'][uniqueIdField] in prevKnown) if incrementalFrom else None
+  if loadedShapes is not None:
+    shapeRecords = loadedShapes.records
+  else:
+    shapeRecords = genValidatedShapes(src_shapes, inCrsString, outCrsString, fixGeom, skip, timer, ingestWorkers)
+  for idx, feature, shapeGeom, error, fixed, area, extLength in shapeRecords:
+      if incrementalFrom:
+        featureId = feature['properties'][uniqueIdField]
+        seenIds.add(featureId)
+        if shapeGeom is None:
+          # Unchanged since the incrementalFrom run, already accounted for in its heatmap
+          if featureId in prevIncluded:
+            manifest['included'].append(featureId)
+            if featureId in prevSmall:
+              manifest['includedSmall'].append(featureId)
+              numSmallShapes += 1
+            if featureId in prevFixed:
+              manifest['fixed'].append(featureId)
           else:
-            error = "Geometry is invalid or area is 0, attempted fix failed" 
-            error_shapes.append(feature)
+            manifest['excluded'].append(featureId)
+          continue
+
+      if fixed:
+        log.append("Fixed invalid feature geometry")
+        log.append(simplejson.dumps(featureToDict(feature)))
+        log.append("With new geometry, in {0}".format(outCrsString))
+        log.append(simplejson.dumps({
+          **featureToDict(feature),
+          'geometry': shapeGeom.__geo_interface__
+        }))
+        log.append("")     
+        if uniqueIdField:
+          manifest['fixed'].append(feature['properties'][uniqueIdField])
         else:
-            error = "Geometry is invalid"
-            error_shapes.append(feature)
-      elif shapeGeom.area == 0:
-        error = "Area of geometry is zero" 
-      elif len(geometry['coordinates'][0]) == 0:
-        error = "Geometry has no coordinates"
+          manifest['fixed'].append(idx + 1)
+      elif error in (ERROR_INVALID, ERROR_FIX_FAILED):
+        error_shapes.append(feature)
 
       if not error:
-        heatValue = 1 # count method
-        if method == 'area':
-          heatValue = 1 / shapeGeom.area
-        elif method == 'sap':
-          heatValue = calcSap(
-              shapeGeom,
-              feature['properties'][importanceField] if importanceField else 1,
-              areaFactor,
-              feature['properties'][importanceFactorField] if importanceFactorField else 1,
-              maxArea,
-              maxSap
-            )
-
         curShapeIndex = 0
         if allTouchedSmall:
-          curShapeIndex = shapeGeom.area / shapeGeom.exterior.length
+          curShapeIndex = area / extLength
           minShapeIndex = min(minShapeIndex, curShapeIndex)
           maxShapeIndex = max(maxShapeIndex, curShapeIndex)
         isSmall = allTouchedSmall and curShapeIndex < shapeIndexThreshold
-        if (isSmall):
-          smallShapes.append((
-            geometry,
-            heatValue
-          ))
-        else:
-          shapes.append((
-            geometry,
-            heatValue
-          ))
+
+        # Heat values are calculated in one batch after the loop
+        geometries.append(shapeGeom)
+        areas.append(area)
+        importances.append(feature['properties'][importanceField] if importanceField else 1)
+        importanceFactors.append(feature['properties'][importanceFactorField] if importanceFactorField else 1)
+        smallFlags.append(isSmall)
+        if groupByField:
+          groupValues.append(feature['properties'][groupByField])
 
         if uniqueIdField:
           manifest['included'].append(feature['properties'][uniqueIdField])
@@ -227,75 +675,114 @@ def genSapMap(
           manifest['included'].append(idx)
       elif len(error) > 0:
         log.append("Skipping feature: {}".format(error))
-        log.append(simplejson.dumps(feature))
+        log.append(simplejson.dumps(featureToDict(feature)))
         log.append("")
         if uniqueIdField:
           manifest['excluded'].append(feature['properties'][uniqueIdField])
         else:
           manifest['excluded'].append(idx)
 
-  result = None
-  if allTouchedSmall and len(smallShapes) > 0:
-    result = rasterize(
-        smallShapes,
-        out_shape=(height, width),
-        transform=outTransform,
-        merge_alg=MergeAlg.add,
-        fill=0,
-        all_touched=True
-    )
-    # Debug - output small shape raster
-    # if result is not None:
-    #   with rasterio.open(
-    #     outfileLarge,
-    #     'w',
-    #     driver='GTiff',
-    #     height=height,
-    #     width=width,
-    #     count=1,
-    #     nodata=0,
-    #     dtype='float32',
-    #     crs=outCrs,
-    #     transform=outTransform
-    #   ) as out:
-    #     out.write(result, indexes=1)
-
-  if len(shapes) > 0:
-    if result is not None and result.size > 0:
-      result = result + rasterize(
-        shapes,
-        out_shape=(height, width),
-        transform=outTransform,
-        merge_alg=MergeAlg.add,
-        fill=0,
-        all_touched=False
-      )
-    else:
-      result = rasterize(
-        shapes,
-        out_shape=(height, width),
-        transform=outTransform,
-        merge_alg=MergeAlg.add,
-        fill=0,
-        all_touched=False
+      if streaming and len(geometries) >= CHUNK_SIZE:
+        if simplifier:
+          timer.start('simplify')
+          geometries = simplifier.simplify(geometries)
+          timer.stop('simplify')
+        timer.start('calcSap')
+        (shapes, smallShapes) = splitShapes(geometries, calcHeatValues(method, areas, importances, importanceFactors, areaFactor, maxArea, maxSap), smallFlags)
+        timer.stop('calcSap')
+        burnShapes(result, shapes, smallShapes, outTransform, cache, exactCoverage, timer)
+        numSmallShapes += len(smallShapes)
+        geometries, areas, importances, importanceFactors, smallFlags = [], [], [], [], []
+
+  # Generate a list of tuples, each consisting of the geometry and heat value, as expected by rasterize
+  # Special handle shapes smaller than an output pixel
+  if simplifier:
+    timer.start('simplify')
+    geometries = simplifier.simplify(geometries)
+    timer.stop('simplify')
+  timer.start('calcSap')
+  heatValues = calcHeatValues(method, areas, importances, importanceFactors, areaFactor, maxArea, maxSap)
+  (shapes, smallShapes) = splitShapes(geometries, heatValues, smallFlags)
+  timer.stop('calcSap')
+  numSmallShapes += len(smallShapes)
+
+  # Burn into the preallocated accumulator if there is one
+  if result is not None:
+    burnShapes(result, shapes, smallShapes, outTransform, cache, exactCoverage, timer)
+
+  if groupByField:
+    # Burn each group into its own band
+    groupIndexes = {}
+    for shapeIdx, groupValue in enumerate(groupValues):
+      groupIndexes.setdefault(groupValue, []).append(shapeIdx)
+    groupNames = sorted(groupIndexes.keys(), key=str)
+    result = np.zeros((max(len(groupNames), 1), height, width), dtype=accumulatorDtype)
+    manifest['groups'] = []
+    for band, groupValue in enumerate(groupNames):
+      (groupShapes, groupSmallShapes) = splitShapes(
+        [geometries[i] for i in groupIndexes[groupValue]],
+        heatValues[groupIndexes[groupValue]],
+        [smallFlags[i] for i in groupIndexes[groupValue]]
       )
-      # Debug - output small shape raster
-      # if result is not None:
-      #   with rasterio.open(
-      #     outfileLarge,
-      #     'w',
-      #     driver='GTiff',
-      #     height=height,
-      #     width=width,
-      #     count=1,
-      #     nodata=0,
-      #     dtype='float32',
-      #     crs=outCrs,
-      #     transform=outTransform
-      #   ) as out:
-      #     out.write(result, indexes=1)
-
-  if logfile:
+      burnShapes(result[band], groupShapes, groupSmallShapes, outTransform, cache, exactCoverage, timer)
+      manifest['groups'].append({
+        'band': band + 1,
+        'value': groupValue,
+        'includedCount': len(groupIndexes[groupValue])
+      })
+
+  if incrementalFrom:
+    # Subtract the heat of features removed since the incrementalFrom run
+    removedIds = prevIncluded - seenIds
+    removed = {
+      'geometries': [],
+      'areas': [],
+      'importances': [],
+      'importanceFactors': [],
+      'smallFlags': []
+    }
+    if len(removedIds) > 0:
+      timer.start('subtractRemoved')
+      prevInfile = previousInfile if previousInfile else prevManifest['params']['infile']
+      with openShapes(prevInfile, [importanceField, importanceFactorField, uniqueIdField]) as prev_shapes:
+        prevSkip = lambda feature: feature['properties'][uniqueIdField] not in removedIds
+        for idx, feature, shapeGeom, error, fixed, area, extLength in genValidatedShapes(prev_shapes, prev_shapes.crs['init'], outCrsString, fixGeom, prevSkip, workers=ingestWorkers):
+          if shapeGeom is None:
+            continue
+          removed['geometries'].append(shapeGeom)
+          removed['areas'].append(area)
+          removed['importances'].append(feature['properties'][importanceField] if importanceField else 1)
+          removed['importanceFactors'].append(feature['properties'][importanceFactorField] if importanceFactorField else 1)
+          removed['smallFlags'].append(allTouchedSmall and area / extLength < shapeIndexThreshold)
+      if len(removed['geometries']) != len(removedIds):
+        raise ValueError('{0} of {1} removed features not found in previousInfile {2}, a full rebuild is needed'.format(
+          len(removedIds) - len(removed['geometries']), len(removedIds), prevInfile))
+      if simplify:
+        # Simplified the same as when they were added, so their heat cancels out exactly
+        removed['geometries'] = ShapeSimplifier(outResolution * simplifyFactor).simplify(removed['geometries'])
+      removedHeat = calcHeatValues(method, removed['areas'], removed['importances'], removed['importanceFactors'], areaFactor, maxArea, maxSap)
+      (removedShapes, removedSmallShapes) = splitShapes(removed['geometries'], -removedHeat, removed['smallFlags'])
+      burnShapes(result, removedShapes, removedSmallShapes, outTransform, cache, exactCoverage)
+      snapResidues(result)
+      timer.stop('subtractRemoved')
+
+    manifest['incremental'] = {
+      'from': incrementalFrom,
+      'addedCount': len(manifest['included']) - len(prevIncluded & seenIds),
+      'removedCount': len(removedIds)
+    }
+
+  # Spatial index used to route shapes to the output tiles they intersect
+  if tileSize is not None:
+    timer.start('buildIndex')
+    shapeIndex = ShapeIndex(shapes)
+    smallShapeIndex = ShapeIndex(smallShapes)
+    timer.stop('buildIndex')
+
+  timer.start('writeLog')
+  if streaming:
+    log.close()
+  elif logfile:
     with open(logfile, 'w') as logFile:
       for item in log:
           logFile.write("%s\n" % item)
@@ -305,26 +792,125 @@ def genSapMap(
         print(item)
       print('')
   print('')
-
+  timer.stop('writeLog')
+
+  # COG is copied from an intermediate tiled GeoTIFF once written
+  writefile = "{}.tmp.tif".format(inBasename) if outProfile == 'cog' else outfile
+  creationOptions = getCreationOptions(outProfile, tileSize)
+  if accumulator == 'sparse':
+    # Blocks never written are left out of the file
+    creationOptions = {
+      **getCreationOptions('tiled' if outProfile == 'default' else outProfile, DEFAULT_BLOCK_SIZE),
+      'sparse_ok': True
+    }
+
+  timer.start('write')
   with rasterio.open(
-    outfile,
+    writefile,
     'w',
     driver='GTiff',
     height=height,
     width=width,
-    count=1,
+    count=result.shape[0] if groupByField else 1,
     nodata=0,
     dtype='float32',
     crs=outCrs,
-    transform=outTransform
+    transform=outTransform,
+    **creationOptions
   ) as out:
-    out.write(result, indexes=1)
+    if groupByField:
+      out.write(result)
+      for group in manifest['groups']:
+        out.set_band_description(group['band'], str(group['value']))
+    elif accumulator == 'sparse':
+      result.write(out)
+    elif accumulator == 'memmap':
+      scratch.write(out)
+    elif tileSize is None:
+      writeRows(out, result)
+    else:
+      # Tiles are rasterized as they're written, time each separately
+      timer.stop('write')
+      for window, block in timer.genTimed('rasterize', rasterizeTiles(shapeIndex, smallShapeIndex, width, height, outTransform, tileSize, workers, exactCoverage)):
+        timer.start('write')
+        out.write(block.astype('float32'), indexes=1, window=window)
+        timer.stop('write')
+      timer.start('write')
+    if outProfile in OVERVIEW_PROFILES:
+      out.build_overviews(calcOverviewFactors(width, height, creationOptions['blockxsize']), Resampling.average)
+      out.update_tags(ns='rio_overview', resampling='average')
+  timer.stop('write')
+
+  if outProfile == 'cog':
+    timer.start('writeCog')
+    writeCog(writefile, outfile, tileSize)
+    timer.stop('writeCog')
+
+  if pyramidLevels:
+    timer.start('writePyramid')
+    manifest['pyramid'] = []
+    for levelResolution, factor, levelBounds, levelWidth, levelHeight, levelTransform in pyramidLevels:
+      levelfile = "{0}-{1:g}.tif".format(inBasename, levelResolution)
+      writeLevel(levelfile, aggregateBlocks(result, factor), levelTransform, outCrs, outProfile)
+      manifest['pyramid'].append({
+        'outfile': levelfile,
+        'resolution': levelResolution,
+        'factor': factor,
+        'width': levelWidth,
+        'height': levelHeight,
+        'outBounds': levelBounds,
+        'areaFactor': areaFactor * factor * factor
+      })
+    timer.stop('writePyramid')
+
+  if keepAccumulator:
+    # Full precision copy of the accumulator, so this run can be updated incrementally without float32 rounding
+    timer.start('writeAccumulator')
+    accumulatorfile = getAccumulatorPath(inBasename)
+    np.save(accumulatorfile, result)
+    manifest['accumulatorfile'] = accumulatorfile
+    timer.stop('writeAccumulator')
+
+  if accumulator == 'sparse':
+    manifest['sparse'] = {
+      'blockSize': result.blockSize,
+      'occupiedBlocks': len(result.blocks),
+      'totalBlocks': result.numBlocks
+    }
+  elif accumulator == 'memmap':
+    manifest['scratch'] = {
+      'path': scratch.path if keepScratch else None,
+      'bytes': result.nbytes
+    }
+    result = None
+    scratch.close()
+
+  if simplifier:
+    manifest['simplify'] = simplifier.toManifest(outResolution)
+
+  if cache:
+    manifest['footprintCache'] = {
+      'hits': cache.hits,
+      'misses': cache.misses
+    }
+    cache.close()
 
   manifest['includedCount'] = len(manifest['included'])
   manifest['excludedCount'] = len(manifest['excluded'])
+  if compactManifest:
+    idsWriter.close()
+    for name in ID_LISTS:
+      del manifest[name]
+    manifest['idsfile'] = idsWriter.path
   manifest['executionTime'] = round(time.perf_counter() - startTime, 2)
+  manifest['timings'] = timer.getTimings()
+  manifest['memory'] = timer.getMemory()
+  if loadedShapes is not None:
+    # Shared across runs, not included in executionTime
+    manifest['loadTime'] = loadedShapes.loadTime
+    manifest['loadTimings'] = loadedShapes.timings
   if allTouchedSmall:
-    manifest['includedSmallCount'] = len(smallShapes)
+    manifest['includedSmallCount'] = numSmallShapes
     manifest['cellShapeIndex'] = cellShapeIndex
     manifest['allTouchedSmallFactor'] = allTouchedSmallFactor
     manifest['shapeIndexThreshold'] = shapeIndexThreshold
@@ -333,7 +919,7 @@ def genSapMap(
 
   print(' {} features burned in'.format(manifest['includedCount']))
   if (allTouchedSmall):
-    print(' allTouchedSmall enabled, numSmallShapes: {0}'.format(len(smallShapes)))
+    print(' allTouchedSmall enabled, numSmallShapes: {0}'.format(numSmallShapes))
     print('  cellShapeIndex: {0}, shapeIndexThreshold: {1} minShapeIndex: {2}, maxShapeIndex: {3}'.format(cellShapeIndex, shapeIndexThreshold, minShapeIndex, maxShapeIndex))
   if manifest['excludedCount'] > 0:
     print(' {} features excluded, see logfile for details'.format(manifest['excludedCount']))
@@ -349,13 +935,24 @@ def genSapMap(
 
 
 
-  if errorfile and len(error_shapes) > 0:
+  if streaming:
+    error_shapes.close()
+  elif errorfile and len(error_shapes) > 0:
     with open(errorfile, 'w') as errorFile:
       errorFile.write(simplejson.dumps({
         "type": "FeatureCollection",
-        "features": error_shapes
+        "features": [featureToDict(feature) for feature in error_shapes]
       }))
 
+  if metricsHook:
+    metricsHook({
+      'infile': infile,
+      'outfile': outfile,
+      'executionTime': manifest['executionTime'],
+      'timings': manifest['timings'],
+      'memory': manifest['memory']
+    })
+
   return manifest
   
 
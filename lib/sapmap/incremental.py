@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import rasterio
+from sapmap.manifest import readManifest
+
+# Run parameters that must match for an incremental update to equal a full rebuild
+INCREMENTAL_PARAMS = [
+  'method',
+  'importanceField',
+  'importanceFactorField',
+  'areaFactor',
+  'uniqueIdField',
+  'outCrsString',
+  'outResolution',
+  'allTouchedSmall',
+  'allTouchedSmallFactor',
+  'fixGeom',
+  'maxArea',
+  'maxSap',
+  'exactCoverage',
+  'simplify',
+  'simplifyFactor'
+]
+
+# Cells of an updated accumulator within this fraction of its largest magnitude are floating point residue of
+# subtracting removed features, and are snapped to 0 so they stay nodata as in a full rebuild
+RESIDUE_TOLERANCE = 1e-12
+# Number of rows of the accumulator checked for residue at a time
+RESIDUE_CHUNK_ROWS = 1024
+
+def getAccumulatorPath(basename):
+  """Returns path of the full precision accumulator genSapMap writes alongside a raster that can be updated incrementally"""
+  return "{}.accumulator.npy".format(basename)
+
+def getManifestPath(rasterPath):
+  """Returns path of the manifest genSapMap writes alongside a raster when logToFile is on"""
+  return "{}.manifest.json".format(os.path.splitext(rasterPath)[0])
+
+def readIncrementalBase(rasterPath, dtype='float64'):
+  """Reads an existing SAP raster and its manifest to update incrementally
+
+  The accumulator is read from the run's full precision sidecar (see getAccumulatorPath) if it has one, so
+  the update matches a full rebuild, otherwise from band 1 of the float32 raster.  The sidecar is looked
+  for at its recorded path, then next to the manifest
+
+  Parameters:
+    rasterPath: path to .tif output by genSapMap with logToFile on, its manifest.json must sit next to it
+    dtype: data type of the returned array, defaults to float64
+  Returns:
+    (manifest, accumulator array)
+  """
+  manifestPath = getManifestPath(rasterPath)
+  if not os.path.isfile(rasterPath):
+    raise ValueError('incrementalFrom raster not found: {0}'.format(rasterPath))
+  if not os.path.isfile(manifestPath):
+    raise ValueError('incrementalFrom manifest not found: {0}, re-run with logToFile'.format(manifestPath))
+
+  manifest = readManifest(manifestPath)
+  accumulatorPath = manifest.get('accumulatorfile')
+  if accumulatorPath and not os.path.isfile(accumulatorPath):
+    accumulatorPath = os.path.join(os.path.dirname(manifestPath), os.path.basename(accumulatorPath))
+  if accumulatorPath and os.path.isfile(accumulatorPath):
+    result = np.load(accumulatorPath).astype(dtype, copy=False)
+  else:
+    with rasterio.open(rasterPath) as reader:
+      result = reader.read(1).astype(dtype)
+  return (manifest, result)
+
+def snapResidues(result, tolerance=RESIDUE_TOLERANCE):
+  """Sets cells of a (height, width) accumulator with magnitude within tolerance of its largest to 0 in place, a chunk of rows at a time"""
+  if result.size == 0:
+    return result
+  threshold = tolerance * max(abs(float(result.max())), abs(float(result.min())))
+  for rowOff in range(0, result.shape[0], RESIDUE_CHUNK_ROWS):
+    rows = result[rowOff:rowOff + RESIDUE_CHUNK_ROWS]
+    rows[np.abs(rows) <= threshold] = 0
+  return result
+
+def checkIncrementalParams(prevManifest, manifest):
+  """Raises ValueError if the run parameters or output grid differ from the run being updated"""
+  # Manifests from before exactCoverage and simplification were added used neither
+  prevParams = {'exactCoverage': False, 'simplify': False, **prevManifest['params']}
+  for key in INCREMENTAL_PARAMS:
+    if key == 'simplifyFactor' and not manifest['params']['simplify']:
+      continue
+    if key not in prevParams or prevParams[key] != manifest['params'][key]:
+      raise ValueError('incrementalFrom was created with a different {0} ({1}), a full rebuild is needed'.format(
+        key, prevParams.get(key)))
+  if (prevManifest['width'], prevManifest['height'], list(prevManifest['outBounds'])) != (manifest['width'], manifest['height'], list(manifest['outBounds'])):
+    raise ValueError('incrementalFrom has a different output grid, pass the same bounds or do a full rebuild')
@@ -0,0 +1,101 @@
+import os
+import zipfile
+import numpy as np
+import simplejson
+
+# Manifest lists of feature ids, stored in the ids sidecar of a compact manifest
+ID_LISTS = ['included', 'includedSmall', 'excluded', 'fixed']
+# Number of ids buffered before they're written to the sidecar as a chunk
+ID_CHUNK_SIZE = 100000
+
+def getIdsPath(basename):
+  """Returns path of the ids sidecar genSapMap writes alongside a compact manifest"""
+  return "{}.manifest.ids.npz".format(basename)
+
+class IdColumn:
+  """Append-only list of feature ids, written to an IdsWriter sidecar a chunk at a time instead of kept in memory
+
+  Has the same append and len interface as the manifest id list it replaces
+  """
+  def __init__(self, writer, name, chunkSize=ID_CHUNK_SIZE):
+    self.writer = writer
+    self.name = name
+    self.chunkSize = chunkSize
+    self.buffer = []
+    self.count = 0
+    self.numChunks = 0
+
+  def __len__(self):
+    return self.count
+
+  def append(self, featureId):
+    self.buffer.append(featureId)
+    self.count += 1
+    if len(self.buffer) >= self.chunkSize:
+      self.flush()
+
+  def flush(self):
+    if len(self.buffer) > 0:
+      self.writer.writeChunk('{0}/{1:08d}'.format(self.name, self.numChunks), self.buffer)
+      self.numChunks += 1
+      self.buffer = []
+
+class IdsWriter:
+  """Writes the id lists of a compact manifest to an NPZ sidecar incrementally, one member per chunk of ids
+
+  Ids are stored as int64 or fixed-width unicode arrays, whichever numpy infers for the chunk, see readManifestIds.
+  The sidecar is written to a temporary file and moved into place on close, so an existing sidecar at path,
+  such as that of a run being updated in place with incrementalFrom, can still be read until then
+
+  Parameters:
+    path: path+filename of .npz file to write
+    chunkSize: number of ids of each list buffered before writing them
+  """
+  def __init__(self, path, chunkSize=ID_CHUNK_SIZE):
+    self.path = path
+    self.tmpPath = "{}.tmp".format(path)
+    self.zipFile = zipfile.ZipFile(self.tmpPath, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+    self.columns = {name: IdColumn(self, name, chunkSize) for name in ID_LISTS}
+
+  def writeChunk(self, member, ids):
+    array = np.array(ids)
+    if array.dtype == object:
+      array = array.astype(str)
+    with self.zipFile.open('{0}.npy'.format(member), 'w', force_zip64=True) as memberFile:
+      np.lib.format.write_array(memberFile, array, allow_pickle=False)
+
+  def close(self):
+    for column in self.columns.values():
+      column.flush()
+    self.zipFile.close()
+    os.replace(self.tmpPath, self.path)
+
+def readManifestIds(idsPath):
+  """Reads the id lists of a compact manifest from its NPZ sidecar
+
+  Returns:
+    dict of id list name (included, includedSmall, excluded, fixed) to array of ids in the order they were added
+  """
+  chunks = {name: [] for name in ID_LISTS}
+  with np.load(idsPath, allow_pickle=False) as ids:
+    # Chunk numbers are zero padded, so sort in order
+    for member in sorted(ids.files):
+      chunks[member.split('/')[0]].append(ids[member])
+  return {name: np.concatenate(nameChunks) if len(nameChunks) > 0 else np.empty(0, dtype='int64') for name, nameChunks in chunks.items()}
+
+def readManifest(manifestPath):
+  """Reads a manifest written by genSapMap with logToFile on, in either the default or compact format
+
+  The id lists of a compact manifest are read from its sidecar and added back as lists, so the result is the
+  same as for the default format, for incremental updates and auditing.  The sidecar is looked for at its
+  recorded path, then next to the manifest
+  """
+  with open(manifestPath) as manifestFile:
+    manifest = simplejson.load(manifestFile)
+  if manifest.get('idsfile'):
+    idsPath = manifest['idsfile']
+    if not os.path.isfile(idsPath):
+      idsPath = os.path.join(os.path.dirname(manifestPath), os.path.basename(idsPath))
+    for name, ids in readManifestIds(idsPath).items():
+      manifest[name] = ids.tolist()
+  return manifest
@@ -0,0 +1,69 @@
+import os
+import rasterio.shutil
+
+# Block size of tiled output profiles, when tileSize is not set
+DEFAULT_BLOCK_SIZE = 256
+
+# GTiff creation options for each output profile.  Compressed profiles use the floating point predictor
+OUTPUT_PROFILES = {
+  'default': {},
+  'tiled': {
+    'tiled': True
+  },
+  'deflate': {
+    'tiled': True,
+    'compress': 'deflate',
+    'predictor': 3
+  },
+  'zstd': {
+    'tiled': True,
+    'compress': 'zstd',
+    'predictor': 3
+  },
+  # Written as a tiled GTiff first, then copied to a Cloud-Optimized GeoTIFF
+  'cog': {
+    'tiled': True
+  }
+}
+
+# Profiles that get overview pyramids.  The COG driver builds its own
+OVERVIEW_PROFILES = ['deflate', 'zstd']
+
+def getCreationOptions(outProfile, blockSize=None):
+  """Returns GTiff creation options for writing the output with the given profile
+
+  Parameters:
+    outProfile: name of output profile, one of OUTPUT_PROFILES
+    blockSize: internal tile size in pixels for tiled profiles, defaults to DEFAULT_BLOCK_SIZE
+  """
+  if outProfile not in OUTPUT_PROFILES:
+    raise ValueError('outProfile must be one of {0}, got {1}'.format(', '.join(OUTPUT_PROFILES.keys()), outProfile))
+  options = dict(OUTPUT_PROFILES[outProfile])
+  if options.get('tiled'):
+    options['blockxsize'] = blockSize if blockSize else DEFAULT_BLOCK_SIZE
+    options['blockysize'] = blockSize if blockSize else DEFAULT_BLOCK_SIZE
+  elif blockSize:
+    options.update(tiled=True, blockxsize=blockSize, blockysize=blockSize)
+  return options
+
+def calcOverviewFactors(width, height, blockSize=DEFAULT_BLOCK_SIZE):
+  """Returns overview decimation factors (2, 4, 8...) until the overview fits within a single block"""
+  factors = []
+  factor = 2
+  while max(width, height) / (factor / 2) > blockSize:
+    factors.append(factor)
+    factor *= 2
+  return factors
+
+def writeCog(srcPath, outfile, blockSize=None):
+  """Copies a GeoTIFF to a DEFLATE compressed Cloud-Optimized GeoTIFF with average overviews, removing the source"""
+  rasterio.shutil.copy(
+    srcPath,
+    outfile,
+    driver='COG',
+    blocksize=blockSize if blockSize else DEFAULT_BLOCK_SIZE,
+    compress='deflate',
+    predictor='yes',
+    overview_resampling='average'
+  )
+  os.remove(srcPath)
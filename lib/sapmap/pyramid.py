@@ -0,0 +1,76 @@
+import math
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from sapmap.calc_raster_props import calcRasterProps
+from sapmap.output_profiles import OVERVIEW_PROFILES, getCreationOptions, calcOverviewFactors, writeCog
+from sapmap.scratch import writeRows
+
+# Relative tolerance for a pyramid resolution being a whole multiple of the base resolution
+FACTOR_TOLERANCE = 1e-9
+
+def calcLevelFactor(outResolution, levelResolution):
+  """Returns the whole number of base cells along each side of a pyramid level cell, raises ValueError if there isn't one"""
+  factor = round(levelResolution / outResolution)
+  if factor < 2 or abs(factor * outResolution - levelResolution) > FACTOR_TOLERANCE * levelResolution:
+    raise ValueError('pyramidResolutions must be whole multiples of outResolution {0} greater than it, got {1}'.format(outResolution, levelResolution))
+  return factor
+
+def aggregateBlocks(array, factor):
+  """Returns the sum of each factor x factor block of cells of a (height, width) array, with partial blocks at the bottom and right edges
+
+  Heat is additive, so the total is conserved
+  """
+  (height, width) = array.shape
+  rowSums = np.add.reduceat(array, np.arange(0, height, factor), axis=0)
+  return np.add.reduceat(rowSums, np.arange(0, width, factor), axis=1)
+
+def calcPyramidLevels(inBounds, inCrs, outCrsString, outResolution, boundsPrecision, width, height, outTransform, pyramidResolutions):
+  """Returns the grid of each pyramid level, checking it aligns with the base grid calculated by calcRasterProps
+
+  A level is aligned if calcRasterProps at its resolution snaps to the same top left corner, and its cells
+  cover whole blocks of base cells, with the base grid padded out to the level grid at the bottom and right.
+
+  Returns:
+    list of (resolution, factor, outBounds, width, height, outTransform) tuples, one per level in the same order
+  """
+  levels = []
+  for levelResolution in pyramidResolutions:
+    factor = calcLevelFactor(outResolution, levelResolution)
+    (levelBounds, levelWidth, levelHeight, levelTransform) = calcRasterProps(inBounds, inCrs, outCrsString, levelResolution, boundsPrecision)
+    originTolerance = FACTOR_TOLERANCE * max(abs(outTransform.c), abs(outTransform.f), levelResolution)
+    if (
+      abs(levelTransform.c - outTransform.c) > originTolerance or
+      abs(levelTransform.f - outTransform.f) > originTolerance or
+      (levelWidth, levelHeight) != (math.ceil(width / factor), math.ceil(height / factor))
+    ):
+      raise ValueError('pyramid level at resolution {0} does not align with the base grid, {1}x{2} pixels from {3} vs {4}x{5} expected from {6}'.format(
+        levelResolution, levelWidth, levelHeight, (levelTransform.c, levelTransform.f),
+        math.ceil(width / factor), math.ceil(height / factor), (outTransform.c, outTransform.f)))
+    levels.append((levelResolution, factor, levelBounds, levelWidth, levelHeight, levelTransform))
+  return levels
+
+def writeLevel(outfile, array, outTransform, outCrs, outProfile='default'):
+  """Writes a pyramid level to a single band float32 GeoTIFF with the given output profile, see genSapMap"""
+  (height, width) = array.shape
+  writefile = "{}.tmp.tif".format(outfile) if outProfile == 'cog' else outfile
+  creationOptions = getCreationOptions(outProfile)
+  with rasterio.open(
+    writefile,
+    'w',
+    driver='GTiff',
+    height=height,
+    width=width,
+    count=1,
+    nodata=0,
+    dtype='float32',
+    crs=outCrs,
+    transform=outTransform,
+    **creationOptions
+  ) as out:
+    writeRows(out, array)
+    if outProfile in OVERVIEW_PROFILES:
+      out.build_overviews(calcOverviewFactors(width, height, creationOptions['blockxsize']), Resampling.average)
+      out.update_tags(ns='rio_overview', resampling='average')
+  if outProfile == 'cog':
+    writeCog(writefile, outfile)
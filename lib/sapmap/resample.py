@@ -0,0 +1,288 @@
+import os
+import time
+import datetime
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from sapmap.calc_raster_props import calcRasterProps
+from sapmap.footprint_cache import calcFootprint
+from sapmap.gen_sap_map import LoadedShapes, calcHeatValues
+from sapmap.timings import PhaseTimer
+
+# Maximum number of matrix entries times replicates multiplied at a time, bounds the memory of each chunk
+PRODUCT_CHUNK_SIZE = 16 * 1024 * 1024
+
+class FootprintMatrix:
+  """Sparse (features x pixels) matrix of each feature's rasterized footprint on an output grid
+
+  Footprints are rasterized once, see calcFootprint, then any weighting of the features is burned in as a
+  matrix product instead of rasterizing again, and many weightings at once as a matrix-matrix product.
+  Stored as arrays of the nonzero entries sorted by pixel, so a product is a gather of the weights of each
+  entry's feature, a multiply by its coverage, and a sum over each occupied pixel's entries.
+
+  Parameters:
+    geometries: list of shapely geometries in the coordinate system of the output grid
+    outTransform: affine transform of the output grid
+    width: width of the output grid in pixels
+    height: height of the output grid in pixels
+    smallFlags: whether to rasterize each geometry with allTouched, defaults to None, none of them
+  """
+  def __init__(self, geometries, outTransform, width, height, smallFlags=None):
+    if smallFlags is None:
+      smallFlags = [False] * len(geometries)
+    footprints = [calcFootprint(geometry, outTransform, width, height, bool(isSmall)) for geometry, isSmall in zip(geometries, smallFlags)]
+    self.width = width
+    self.height = height
+    self.numFeatures = len(geometries)
+    counts = [len(indices) for indices, coverage in footprints]
+    features = np.repeat(np.arange(self.numFeatures), counts)
+    indices = np.concatenate([indices for indices, coverage in footprints] + [np.empty(0, dtype='int64')])
+    coverage = np.concatenate([coverage for indices, coverage in footprints] + [np.empty(0, dtype='float64')])
+    order = np.argsort(indices, kind='stable')
+    self.features = features[order]
+    self.coverage = coverage[order]
+    # Flat grid index of each occupied pixel, and the position of its first entry
+    (self.pixels, self.pixelStarts) = np.unique(indices[order], return_index=True)
+
+  @property
+  def numEntries(self):
+    return len(self.features)
+
+  def genPixelChunks(self, numColumns):
+    """Generates (pixelStart, pixelEnd) ranges of occupied pixels, each with entries times numColumns of at most PRODUCT_CHUNK_SIZE, or a single pixel"""
+    maxEntries = max(1, PRODUCT_CHUNK_SIZE // max(1, numColumns))
+    entryEnds = np.append(self.pixelStarts[1:], self.numEntries)
+    pixelStart = 0
+    while pixelStart < len(self.pixels):
+      pixelEnd = max(int(np.searchsorted(entryEnds, self.pixelStarts[pixelStart] + maxEntries, side='right')), pixelStart + 1)
+      yield (pixelStart, pixelEnd)
+      pixelStart = pixelEnd
+
+  def multiply(self, weights, pixelStart=0, pixelEnd=None):
+    """Returns the heat burned into occupied pixels pixelStart to pixelEnd for each weighting of the features
+
+    Parameters:
+      weights: (numFeatures, numColumns) array, each column a heat value per feature
+      pixelStart: index of first occupied pixel, see pixels
+      pixelEnd: index past the last occupied pixel, defaults to None, the last one
+    Returns:
+      (pixelEnd - pixelStart, numColumns) array
+    """
+    weights = np.asarray(weights, dtype='float64').reshape(self.numFeatures, -1)
+    if pixelEnd is None:
+      pixelEnd = len(self.pixels)
+    if pixelEnd <= pixelStart:
+      return np.zeros((0, weights.shape[1]), dtype='float64')
+    entryStart = self.pixelStarts[pixelStart]
+    entryEnd = self.pixelStarts[pixelEnd] if pixelEnd < len(self.pixels) else self.numEntries
+    values = self.coverage[entryStart:entryEnd, None] * weights[self.features[entryStart:entryEnd]]
+    return np.add.reduceat(values, self.pixelStarts[pixelStart:pixelEnd] - entryStart, axis=0)
+
+  def toArray(self, heatValues):
+    """Returns (height, width) array of the heat burned in with a single heat value per feature"""
+    result = np.zeros(self.height * self.width, dtype='float64')
+    for pixelStart, pixelEnd in self.genPixelChunks(1):
+      result[self.pixels[pixelStart:pixelEnd]] = self.multiply(heatValues, pixelStart, pixelEnd)[:, 0]
+    return result.reshape(self.height, self.width)
+
+def calcReplicateWeights(
+  rng,
+  numReplicates,
+  method,
+  areas,
+  importances,
+  importanceFactors,
+  respondents,
+  areaFactor=1,
+  maxArea=None,
+  maxSap=None,
+  bootstrap=True,
+  importanceJitter=0,
+  maxAreaOptions=None,
+  maxSapOptions=None
+):
+  """Returns (numFeatures, numReplicates) array with the heat value of each feature in each replicate, see genUncertaintyMaps
+
+  Each replicate draws maxArea and maxSap from their options, if given, jitters importance, then resamples
+  respondents with replacement, multiplying the heat of each feature by the number of times its respondent was drawn
+  """
+  (respondentIds, respondentCodes) = np.unique(np.asarray(respondents), return_inverse=True)
+  importances = np.asarray(importances, dtype='float64')
+  weights = np.zeros((len(areas), numReplicates), dtype='float64')
+  for replicate in range(numReplicates):
+    replicateMaxArea = maxAreaOptions[rng.integers(len(maxAreaOptions))] if maxAreaOptions else maxArea
+    replicateMaxSap = maxSapOptions[rng.integers(len(maxSapOptions))] if maxSapOptions else maxSap
+    replicateImportances = importances
+    if importanceJitter:
+      replicateImportances = np.maximum(importances * (1 + importanceJitter * rng.standard_normal(len(importances))), 0)
+    weights[:, replicate] = calcHeatValues(method, areas, replicateImportances, importanceFactors, areaFactor, replicateMaxArea, replicateMaxSap)
+    if bootstrap:
+      draws = np.bincount(rng.integers(len(respondentIds), size=len(respondentIds)), minlength=len(respondentIds))
+      weights[:, replicate] *= draws[respondentCodes]
+  return weights
+
+def genUncertaintyMaps(
+  infile,
+  outPath=None,
+  overwrite=False,
+  method='sap',
+  importanceField=None,
+  importanceFactorField=None,
+  areaFactor=1,
+  outCrsString='epsg:3857',
+  outResolution=1000,
+  bounds=None,
+  boundsPrecision=0,
+  allTouchedSmall=False,
+  allTouchedSmallFactor=1.25,
+  fixGeom=False,
+  maxArea=None,
+  maxSap=None,
+  replicates=100,
+  respondentField=None,
+  bootstrap=True,
+  importanceJitter=0,
+  maxAreaOptions=None,
+  maxSapOptions=None,
+  percentiles=[5, 50, 95],
+  seed=0,
+  loadedShapes=None,
+):
+  """Generates rasters of the uncertainty of a SAP map by Monte Carlo resampling
+
+  Each feature's footprint is rasterized once into a FootprintMatrix, then the heatmap of every replicate
+  is a product of it with that replicate's heat values, evaluated for all replicates at once in chunks of
+  pixels.  Replicates resample respondents with replacement (bootstrap), jitter importance, and draw
+  alternative maxArea and maxSap caps, in any combination.  Writes a float32 GeoTIFF with a band for the
+  mean, standard deviation and each percentile of the replicates, described with its name, to the output
+  path as infile.uncertainty.tif.  Memory is the heat value of every feature in every replicate plus one
+  chunk, so the number of replicates is limited only by memory.
+
+  Arguments:
+    infile: path+filename of vector dataset containing features, see genSapMap
+    outPath, overwrite, method, importanceField, importanceFactorField, areaFactor, outCrsString, outResolution, bounds, boundsPrecision, allTouchedSmall, allTouchedSmallFactor, fixGeom, maxArea, maxSap: same as genSapMap
+    replicates: (integer) number of replicates.  Defaults to 100
+    respondentField: name of vector attribute identifying the respondent of each feature, respondents are resampled with all their features.  Defaults to None, resampling features individually
+    bootstrap: (boolean) resample respondents with replacement in each replicate.  Defaults to True
+    importanceJitter: standard deviation of the normally distributed relative noise multiplied into each feature's importance in each replicate, clipped at 0 importance.  Defaults to 0, no jitter
+    maxAreaOptions: list of maxArea values, each replicate uses one drawn at random.  Defaults to None, always maxArea
+    maxSapOptions: list of maxSap values, each replicate uses one drawn at random.  Defaults to None, always maxSap
+    percentiles: list of percentiles of the replicates to output, each 0-100.  Defaults to [5, 50, 95]
+    seed: seed of the random number generator, the same seed gives the same output.  Defaults to 0
+    loadedShapes: LoadedShapes for infile, loaded with the same outCrsString and fixGeom, see genSapMap
+
+  Returns:
+    Manifest of run, with the output bands, the size of the footprint matrix, and timings
+  """
+  startTime = time.perf_counter()
+  timer = PhaseTimer()
+  if replicates < 1:
+    raise ValueError('replicates must be at least 1, got {0}'.format(replicates))
+  if any(percentile < 0 or percentile > 100 for percentile in percentiles):
+    raise ValueError('percentiles must be between 0 and 100, got {0}'.format(percentiles))
+
+  inpath, inFullFilename = os.path.split(infile)
+  inBasename = os.path.join(outPath if outPath is not None else inpath, inFullFilename.split('.')[0])
+  outfile = "{}.uncertainty.tif".format(inBasename)
+  if os.path.exists(outfile) and not overwrite:
+    print('Warning: outfile {0} already exists, skipping. Remove it and re-run or use overwrite option'.format(outfile))
+    return None
+
+  timer.start('load')
+  if loadedShapes is None:
+    loadedShapes = LoadedShapes(infile, outCrsString, fixGeom)
+  elif loadedShapes.outCrsString != outCrsString or loadedShapes.fixGeom != fixGeom:
+    raise ValueError('loadedShapes was loaded with a different outCrsString or fixGeom')
+  records = [record for record in loadedShapes.records if record[2] is not None and not record[3]]
+  timer.stop('load')
+
+  inBounds = bounds if bounds else loadedShapes.bounds
+  (outBounds, width, height, outTransform) = calcRasterProps(inBounds, loadedShapes.crs, outCrsString, outResolution, boundsPrecision)
+
+  # Same threshold as genSapMap, the shape index (area / exterior length) of a cell is outResolution / 4
+  shapeIndexThreshold = outResolution / 4 * allTouchedSmallFactor if allTouchedSmall else 0
+  areas = np.array([area for idx, feature, shapeGeom, error, fixed, area, extLength in records], dtype='float64')
+  smallFlags = [allTouchedSmall and area / extLength < shapeIndexThreshold for idx, feature, shapeGeom, error, fixed, area, extLength in records]
+  importances = [feature['properties'][importanceField] if importanceField else 1 for idx, feature, *rest in records]
+  importanceFactors = [feature['properties'][importanceFactorField] if importanceFactorField else 1 for idx, feature, *rest in records]
+  respondents = [feature['properties'][respondentField] if respondentField else idx for idx, feature, *rest in records]
+
+  timer.start('buildMatrix')
+  matrix = FootprintMatrix([record[2] for record in records], outTransform, width, height, smallFlags)
+  timer.stop('buildMatrix')
+
+  timer.start('weights')
+  weights = calcReplicateWeights(
+    np.random.default_rng(seed), replicates, method, areas, importances, importanceFactors, respondents,
+    areaFactor, maxArea, maxSap, bootstrap, importanceJitter, maxAreaOptions, maxSapOptions)
+  timer.stop('weights')
+
+  bandNames = ['mean', 'std'] + ['p{0:g}'.format(percentile) for percentile in percentiles]
+  result = np.zeros((len(bandNames), height * width), dtype='float32')
+  timer.start('multiply')
+  for pixelStart, pixelEnd in matrix.genPixelChunks(replicates):
+    values = matrix.multiply(weights, pixelStart, pixelEnd)
+    pixels = matrix.pixels[pixelStart:pixelEnd]
+    result[0, pixels] = values.mean(axis=1)
+    result[1, pixels] = values.std(axis=1)
+    if len(percentiles) > 0:
+      result[2:, pixels] = np.percentile(values, percentiles, axis=1)
+  timer.stop('multiply')
+
+  timer.start('write')
+  with rasterio.open(
+    outfile,
+    'w',
+    driver='GTiff',
+    height=height,
+    width=width,
+    count=len(bandNames),
+    nodata=0,
+    dtype='float32',
+    crs=CRS.from_string(outCrsString),
+    transform=outTransform
+  ) as out:
+    out.write(result.reshape(len(bandNames), height, width))
+    for band, bandName in enumerate(bandNames):
+      out.set_band_description(band + 1, bandName)
+  timer.stop('write')
+
+  manifest = {
+    'timestamp': datetime.datetime.now().astimezone().isoformat(),
+    'params': {
+      'infile': infile,
+      'outfile': outfile,
+      'method': method,
+      'importanceField': importanceField,
+      'importanceFactorField': importanceFactorField,
+      'areaFactor': areaFactor,
+      'outCrsString': outCrsString,
+      'outResolution': outResolution,
+      'allTouchedSmall': allTouchedSmall,
+      'allTouchedSmallFactor': allTouchedSmallFactor,
+      'fixGeom': fixGeom,
+      'maxArea': maxArea,
+      'maxSap': maxSap,
+      'replicates': replicates,
+      'respondentField': respondentField,
+      'bootstrap': bootstrap,
+      'importanceJitter': importanceJitter,
+      'maxAreaOptions': maxAreaOptions,
+      'maxSapOptions': maxSapOptions,
+      'percentiles': percentiles,
+      'seed': seed
+    },
+    'width': width,
+    'height': height,
+    'outBounds': outBounds,
+    'bands': bandNames,
+    'includedCount': len(records),
+    'matrix': {
+      'entries': matrix.numEntries,
+      'occupiedPixels': len(matrix.pixels)
+    },
+    'executionTime': round(time.perf_counter() - startTime, 2),
+    'timings': timer.getTimings()
+  }
+  print('Created uncertainty rasters {} from {} replicates in {}s'.format(outfile, replicates, manifest['executionTime']))
+  return manifest
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import numpy as np
+from rasterio.windows import Window
+
+# Maximum size of the rows of an accumulator array converted and written to the output at a time, in bytes
+WRITE_CHUNK_BYTES = 64 * 1024 * 1024
+
+def genRowWindows(height, width, itemsize):
+  """Generates windows of whole rows of a (height, width) array, each under WRITE_CHUNK_BYTES"""
+  numRows = max(1, WRITE_CHUNK_BYTES // max(1, width * itemsize))
+  for rowOff in range(0, height, numRows):
+    yield Window(0, rowOff, width, min(numRows, height - rowOff))
+
+def writeRows(out, array, band=1):
+  """Writes a (height, width) array to band of an open rasterio dataset a chunk of rows at a time, so
+  converting to the output data type only copies one chunk at a time instead of the whole grid"""
+  (height, width) = array.shape
+  for window in genRowWindows(height, width, array.itemsize):
+    rows = array[window.row_off:window.row_off + window.height]
+    out.write(rows.astype(out.dtypes[band - 1], copy=False), indexes=band, window=window)
+
+class ScratchArray:
+  """Zero-filled (height, width) array backed by a numpy.memmap scratch file, for grids larger than memory
+
+  Heat is added into it in place, and the OS pages it in and out of memory as needed.  The file is
+  sparse, so disk is only used for the parts written to.  If keep is False, on POSIX systems the
+  file is unlinked as soon as it's mapped, so it is cleaned up even if the run fails.
+
+  Parameters:
+    height: height of the grid in pixels
+    width: width of the grid in pixels
+    scratchDir: directory to create the scratch file in.  Defaults to None, the system temp directory
+    keep: whether to keep the scratch file after close, for inspection
+    dtype: data type of the array
+  """
+  def __init__(self, height, width, scratchDir=None, keep=False, dtype='float64'):
+    fd, self.path = tempfile.mkstemp(prefix='sapmap-', suffix='.scratch', dir=scratchDir)
+    os.close(fd)
+    self.keep = keep
+    self.array = np.memmap(self.path, dtype=dtype, mode='w+', shape=(height, width))
+    if not keep and os.name == 'posix':
+      os.remove(self.path)
+
+  def write(self, out, band=1):
+    """Writes the array to band of an open rasterio dataset, a chunk of rows at a time"""
+    writeRows(out, self.array, band)
+
+  def close(self):
+    """Releases the array, removing the scratch file unless keep is True.  Other references to the array should be dropped first"""
+    if self.keep:
+      self.array.flush()
+    self.array = None
+    if not self.keep and os.path.exists(self.path):
+      os.remove(self.path)
@@ -0,0 +1,42 @@
+import numpy as np
+from shapely.geometry import shape, box
+from shapely.geometry.base import BaseGeometry
+from shapely.strtree import STRtree
+
+class ShapeIndex:
+  """Packed R-tree (STR-tree) over a list of (geometry, value) shapes, for fast bounding box queries
+
+  Build it once over an already loaded dataset and query it repeatedly, for example
+  to route shapes to the output tiles they touch without scanning every geometry per tile.
+
+  Parameters:
+    shapes: list of (geometry, value) tuples, as expected by rasterize.  Geometry can be a shapely geometry or GeoJSON-like dict
+  """
+  def __init__(self, shapes):
+    self.shapes = list(shapes)
+    self.geometries = np.array([
+      geometry if isinstance(geometry, BaseGeometry) else shape(geometry)
+      for geometry, value in self.shapes
+    ], dtype=object)
+    self.tree = STRtree(self.geometries)
+
+  def __len__(self):
+    return len(self.shapes)
+
+  def query(self, bounds):
+    """Returns sorted array of positions of shapes whose bounding box intersects bounds
+
+    Parameters:
+      bounds: [w, s, e, n] in the coordinate system of the shapes
+    """
+    if len(self.shapes) == 0:
+      return np.empty(0, dtype='int64')
+    return np.sort(self.tree.query(box(*bounds)))
+
+  def shapesInBounds(self, bounds):
+    """Returns list of (geometry, value) shapes whose bounding box intersects bounds, in input order
+
+    Parameters:
+      bounds: [w, s, e, n] in the coordinate system of the shapes
+    """
+    return [self.shapes[i] for i in self.query(bounds)]
@@ -0,0 +1,70 @@
+import numpy as np
+import shapely
+
+def countRings(geometries):
+  """Returns (numParts, numHoles) arrays with the number of polygons and interior rings of each Polygon or MultiPolygon"""
+  parts, partIndex = shapely.get_parts(geometries, return_index=True)
+  numHoles = np.bincount(partIndex, weights=shapely.get_num_interior_rings(parts), minlength=len(geometries))
+  return (np.bincount(partIndex, minlength=len(geometries)), numHoles.astype('int64'))
+
+class ShapeSimplifier:
+  """Simplifies shapes before they're rasterized, dropping vertex detail finer than the output grid can resolve
+
+  Shapes are simplified in bulk with Douglas-Peucker, which is fast but can make rings self-intersect and
+  drops holes and parts smaller than the tolerance, so shapes left invalid or with a different number of
+  parts or holes are simplified again with shapely's topology preserving simplifier, which keeps them.  A
+  shape whose simplified form is still empty, invalid or has no area keeps its original geometry, so no
+  shape is ever lost.  Only the geometry burned in changes, the heat value of each shape is still
+  calculated from its original area.  Either simplifier moves a boundary by at most the tolerance, which
+  is reported as toleranceBound, it is not measured for each shape.  Totals of the vertex counts before
+  and after are kept for the manifest.
+
+  Parameters:
+    tolerance: maximum distance a simplified boundary may move, in output coordinate system units
+  """
+  def __init__(self, tolerance):
+    self.tolerance = tolerance
+    self.numShapes = 0
+    self.numSimplified = 0
+    self.verticesBefore = 0
+    self.verticesAfter = 0
+    self.numTopologyPreserved = 0
+
+  def simplify(self, geometries):
+    """Returns array of geometries simplified in the same order"""
+    geometries = np.array(geometries, dtype=object).reshape(-1)
+    if len(geometries) == 0:
+      return geometries
+    simplified = shapely.simplify(geometries, self.tolerance, preserve_topology=False)
+    invalid = shapely.is_empty(simplified) | ~shapely.is_valid(simplified) | (shapely.area(simplified) <= 0)
+    (numParts, numHoles) = countRings(geometries)
+    (simplifiedParts, simplifiedHoles) = countRings(simplified)
+    invalid |= (numParts != simplifiedParts) | (numHoles != simplifiedHoles)
+    if invalid.any():
+      simplified[invalid] = shapely.simplify(geometries[invalid], self.tolerance, preserve_topology=True)
+      self.numTopologyPreserved += int(invalid.sum())
+    keep = shapely.is_empty(simplified) | ~shapely.is_valid(simplified) | (shapely.area(simplified) <= 0)
+    simplified[keep] = geometries[keep]
+
+    before = shapely.get_num_coordinates(geometries)
+    after = shapely.get_num_coordinates(simplified)
+    changed = after < before
+    self.numShapes += len(geometries)
+    self.numSimplified += int(changed.sum())
+    self.verticesBefore += int(before.sum())
+    self.verticesAfter += int(after.sum())
+    return simplified
+
+  def toManifest(self, outResolution):
+    """Returns dict summarizing the simplification for the manifest, with the tolerance bound also in pixels of outResolution"""
+    return {
+      'tolerance': self.tolerance,
+      'shapeCount': self.numShapes,
+      'simplifiedCount': self.numSimplified,
+      'topologyPreservedCount': self.numTopologyPreserved,
+      'verticesBefore': self.verticesBefore,
+      'verticesAfter': self.verticesAfter,
+      'vertexReduction': 1 - self.verticesAfter / self.verticesBefore if self.verticesBefore > 0 else 0,
+      'toleranceBound': self.tolerance,
+      'toleranceBoundPixels': self.tolerance / outResolution
+    }
@@ -0,0 +1,106 @@
+import math
+import numpy as np
+import shapely
+from rasterio import windows
+from rasterio.windows import Window
+from rasterio.features import rasterize
+from rasterio.enums import MergeAlg
+from sapmap.coverage import burnCoverage
+
+class SparseAccumulator:
+  """Accumulates heat only in the blocks of the output grid that shapes fall in
+
+  Blocks are allocated the first time a shape touches them and kept in a dict keyed by
+  (blockRow, blockCol), so memory and write time scale with the occupied area rather than
+  the bounds of the grid.  Write to a tiled GeoTIFF with SPARSE_OK and the same block size,
+  and blocks never touched are left out of the file and read back as nodata.
+
+  Parameters:
+    width: width of the output grid in pixels
+    height: height of the output grid in pixels
+    blockSize: width and height of each block in pixels
+    dtype: data type of the blocks, defaults to float64
+  """
+  def __init__(self, width, height, blockSize, dtype='float64'):
+    self.width = width
+    self.height = height
+    self.blockSize = blockSize
+    self.dtype = dtype
+    self.blocks = {}
+
+  @property
+  def numBlocks(self):
+    return math.ceil(self.height / self.blockSize) * math.ceil(self.width / self.blockSize)
+
+  def getWindow(self, blockKey):
+    (blockRow, blockCol) = blockKey
+    rowOff = blockRow * self.blockSize
+    colOff = blockCol * self.blockSize
+    return Window(colOff, rowOff, min(self.blockSize, self.width - colOff), min(self.blockSize, self.height - rowOff))
+
+  def getBlock(self, blockKey):
+    """Returns block array, allocating it if this is the first time it's used"""
+    if blockKey not in self.blocks:
+      window = self.getWindow(blockKey)
+      self.blocks[blockKey] = np.zeros((int(window.height), int(window.width)), dtype=self.dtype)
+    return self.blocks[blockKey]
+
+  def genShapeBlocks(self, geometries, outTransform):
+    """Generates (shape position, blockKey) for each block each geometry's bounds fall in"""
+    if len(geometries) == 0:
+      return
+    shapeBounds = shapely.bounds(np.array(geometries, dtype=object))
+    # Pad by a pixel so allTouched picks up pixels a geometry only touches along an edge
+    colStart = np.floor((shapeBounds[:, 0] - outTransform.c) / outTransform.a) - 1
+    colEnd = np.ceil((shapeBounds[:, 2] - outTransform.c) / outTransform.a) + 1
+    rowStart = np.floor((shapeBounds[:, 3] - outTransform.f) / outTransform.e) - 1
+    rowEnd = np.ceil((shapeBounds[:, 1] - outTransform.f) / outTransform.e) + 1
+    blockColStart = (np.clip(colStart, 0, self.width - 1) // self.blockSize).astype('int64')
+    blockColEnd = (np.clip(colEnd - 1, 0, self.width - 1) // self.blockSize).astype('int64')
+    blockRowStart = (np.clip(rowStart, 0, self.height - 1) // self.blockSize).astype('int64')
+    blockRowEnd = (np.clip(rowEnd - 1, 0, self.height - 1) // self.blockSize).astype('int64')
+    outside = (colEnd <= 0) | (colStart >= self.width) | (rowEnd <= 0) | (rowStart >= self.height)
+    for shapeIdx in np.nonzero(~outside)[0]:
+      for blockRow in range(blockRowStart[shapeIdx], blockRowEnd[shapeIdx] + 1):
+        for blockCol in range(blockColStart[shapeIdx], blockColEnd[shapeIdx] + 1):
+          yield (shapeIdx, (blockRow, blockCol))
+
+  def burnShapes(self, shapes, smallShapes, outTransform, exactCoverage=False):
+    """Rasterizes shapes into the blocks they fall in, small shapes with allTouched
+
+    Parameters:
+      shapes: list of (geometry, value) tuples, geometry must be shapely
+      smallShapes: list of (geometry, value) tuples to rasterize with allTouched
+      outTransform: affine transform of the full output grid
+      exactCoverage: burn all shapes in weighted by the exact fraction of each cell they cover instead, see calcCoverage
+    """
+    for curShapes, allTouched in ((smallShapes, True), (shapes, False)):
+      blockShapes = {}
+      for shapeIdx, blockKey in self.genShapeBlocks([geometry for geometry, value in curShapes], outTransform):
+        blockShapes.setdefault(blockKey, []).append(curShapes[shapeIdx])
+      for blockKey, curBlockShapes in blockShapes.items():
+        blockTransform = windows.transform(self.getWindow(blockKey), outTransform)
+        if exactCoverage:
+          burnCoverage(self.getBlock(blockKey), curBlockShapes, blockTransform)
+        else:
+          rasterize(
+            curBlockShapes,
+            out=self.getBlock(blockKey),
+            transform=blockTransform,
+            merge_alg=MergeAlg.add,
+            all_touched=allTouched
+          )
+    return self
+
+  def write(self, out, band=1):
+    """Writes occupied blocks to band of an open rasterio dataset with windowed writes"""
+    for blockKey in sorted(self.blocks.keys()):
+      out.write(self.blocks[blockKey].astype(out.dtypes[band - 1]), indexes=band, window=self.getWindow(blockKey))
+
+  def toArray(self):
+    """Returns the accumulated heat as a dense (height, width) array"""
+    result = np.zeros((self.height, self.width), dtype=self.dtype)
+    for blockKey, block in self.blocks.items():
+      window = self.getWindow(blockKey)
+      result[window.row_off:window.row_off + block.shape[0], window.col_off:window.col_off + block.shape[1]] = block
+    return result
@@ -0,0 +1,64 @@
+import simplejson
+
+def featureToDict(feature):
+  """Returns GeoJSON-like dict for a feature, fiona Feature objects are not JSON serializable"""
+  return getattr(feature, '__geo_interface__', feature)
+
+class LogWriter:
+  """Writes log lines straight to a file, or stdout if no path given, instead of keeping them in memory
+
+  Has the same append and len interface as the list of log lines it replaces
+  """
+  def __init__(self, path=None):
+    self.path = path
+    self.file = open(path, 'w') if path else None
+    self.count = 0
+
+  def __len__(self):
+    return self.count
+
+  def append(self, line):
+    if self.file:
+      self.file.write("%s\n" % line)
+    else:
+      if self.count == 0:
+        print('Log:')
+      print(line)
+    self.count += 1
+
+  def close(self):
+    if self.file:
+      self.file.close()
+    elif self.count > 0:
+      print('')
+
+class FeatureCollectionWriter:
+  """Writes features to a GeoJSON FeatureCollection file one at a time, instead of keeping them in memory
+
+  The file is only created once the first feature is appended.  Has the same append and len
+  interface as the list of features it replaces
+  """
+  def __init__(self, path=None):
+    self.path = path
+    self.file = None
+    self.count = 0
+
+  def __len__(self):
+    return self.count
+
+  def append(self, feature):
+    if not self.path:
+      self.count += 1
+      return
+    if self.file is None:
+      self.file = open(self.path, 'w')
+      self.file.write('{"type": "FeatureCollection", "features": [\n')
+    else:
+      self.file.write(',\n')
+    self.file.write(simplejson.dumps(featureToDict(feature)))
+    self.count += 1
+
+  def close(self):
+    if self.file:
+      self.file.write('\n]}\n')
+      self.file.close()
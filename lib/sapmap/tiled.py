@@ -0,0 +1,103 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from rasterio import windows
+from rasterio.windows import Window
+from rasterio.features import rasterize
+from rasterio.enums import MergeAlg
+from sapmap.coverage import burnCoverage
+
+def genWindows(width, height, tileSize):
+  """Generates windows that split a width x height raster grid into tiles, row by row
+
+  Parameters:
+    width: width of the raster grid in pixels
+    height: height of the raster grid in pixels
+    tileSize: width and height of each tile in pixels.  Tiles along the right and bottom edge are clipped to the grid
+  Returns:
+    generator of rasterio Window
+  """
+  for rowOff in range(0, height, tileSize):
+    for colOff in range(0, width, tileSize):
+      yield Window(colOff, rowOff, min(tileSize, width - colOff), min(tileSize, height - rowOff))
+
+def rasterizeWindow(window, outTransform, shapes, smallShapes=[], exactCoverage=False):
+  """Rasterizes shapes into a single window of the output grid
+
+  Small shapes are burned in with the allTouched option, the rest with Bresenham's line algorithm,
+  and the two are summed, matching the result for the same pixels in a whole-grid rasterize
+
+  Parameters:
+    window: rasterio Window of the output grid to rasterize
+    outTransform: affine transform of the full output grid
+    shapes: list of (geometry, value) tuples to rasterize without allTouched
+    smallShapes: list of (geometry, value) tuples to rasterize with allTouched
+    exactCoverage: burn all shapes in weighted by the exact fraction of each cell they cover instead, see calcCoverage
+  Returns:
+    (height, width) float64 array for the window
+  """
+  winTransform = windows.transform(window, outTransform)
+  outShape = (int(window.height), int(window.width))
+  result = np.zeros(outShape, dtype='float64')
+  if exactCoverage:
+    return burnCoverage(result, shapes + smallShapes, winTransform)
+  for curShapes, allTouched in ((smallShapes, True), (shapes, False)):
+    if len(curShapes) > 0:
+      result += rasterize(
+        curShapes,
+        out_shape=outShape,
+        transform=winTransform,
+        merge_alg=MergeAlg.add,
+        fill=0,
+        all_touched=allTouched,
+        dtype='float64'
+      )
+  return result
+
+def genTileTasks(shapeIndex, smallShapeIndex, width, height, outTransform, tileSize, exactCoverage=False):
+  """Generates (window, outTransform, shapes, smallShapes, exactCoverage) arguments for rasterizeWindow, one per tile"""
+  for window in genWindows(width, height, tileSize):
+    winBounds = windows.bounds(window, outTransform)
+    yield (
+      window,
+      outTransform,
+      shapeIndex.shapesInBounds(winBounds),
+      smallShapeIndex.shapesInBounds(winBounds),
+      exactCoverage
+    )
+
+def rasterizeTiles(shapeIndex, smallShapeIndex, width, height, outTransform, tileSize, workers=None, exactCoverage=False):
+  """Rasterizes shapes tile by tile, only burning in the shapes that intersect each tile
+
+  Peak memory is one tile rather than the whole (height, width) grid.  With workers > 1
+  tiles are dispatched to a process pool, keeping at most two tiles per worker in flight,
+  and yielded back in order.
+
+  Parameters:
+    shapeIndex: ShapeIndex of shapes to rasterize without allTouched
+    smallShapeIndex: ShapeIndex of shapes to rasterize with allTouched
+    width: width of the output grid in pixels
+    height: height of the output grid in pixels
+    outTransform: affine transform of the output grid
+    tileSize: width and height of each tile in pixels
+    workers: number of processes to rasterize tiles with.  Defaults to None, rasterizing in the current process
+    exactCoverage: burn shapes in weighted by the exact fraction of each cell they cover, see calcCoverage
+  Returns:
+    generator of (window, array) tuples, suitable for windowed writes
+  """
+  tasks = genTileTasks(shapeIndex, smallShapeIndex, width, height, outTransform, tileSize, exactCoverage)
+  if workers is None or workers <= 1:
+    for task in tasks:
+      yield (task[0], rasterizeWindow(*task))
+    return
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    pending = deque()
+    for task in tasks:
+      pending.append((task[0], executor.submit(rasterizeWindow, *task)))
+      if len(pending) >= workers * 2:
+        window, future = pending.popleft()
+        yield (window, future.result())
+    while pending:
+      window, future = pending.popleft()
+      yield (window, future.result())
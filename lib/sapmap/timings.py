@@ -0,0 +1,96 @@
+import sys
+import time
+import tracemalloc
+try:
+  import resource
+except ImportError:
+  # Not available on Windows
+  resource = None
+
+# Highest peak traced by tracemalloc before a PhaseTimer reset it to measure a phase, see getTracedPeak
+tracedPeak = 0
+
+def getPeakRss():
+  """Returns peak resident set size of the current process in bytes over its lifetime, or None where it isn't available"""
+  if resource is None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Reported in kilobytes on Linux, bytes on macOS
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+def startTracing():
+  """Starts tracing memory allocations with tracemalloc, clearing any peak kept from earlier tracing"""
+  global tracedPeak
+  tracedPeak = 0
+  tracemalloc.start()
+
+def resetTracedPeak():
+  """Resets the tracemalloc peak, keeping the peak so far for getTracedPeak.  Returns the peak before reset"""
+  global tracedPeak
+  peak = tracemalloc.get_traced_memory()[1]
+  tracedPeak = max(tracedPeak, peak)
+  tracemalloc.reset_peak()
+  return peak
+
+def getTracedPeak():
+  """Returns peak memory traced by tracemalloc since startTracing, including peaks reset to measure phases"""
+  return max(tracedPeak, tracemalloc.get_traced_memory()[1])
+
+class PhaseTimer:
+  """Accumulates the time spent in named phases of a run, and the peak memory allocated during each
+
+  A phase can be started and stopped many times, for example once per chunk of features, and its
+  times are summed.  If tracemalloc is tracing, the tracemalloc peak is reset as each phase starts and
+  ends, so the peak memory of a phase is the most traced at once while it was running, the highest of
+  its repeats.  Phases running at the same time each include the peak of the other.
+  """
+  def __init__(self):
+    self.timings = {}
+    self.peakTraced = {}
+    self.starts = {}
+    self.runPeakTraced = 0
+
+  def samplePeak(self):
+    """Adds the tracemalloc peak since the last sample to the phases running and the run, then resets it"""
+    if not tracemalloc.is_tracing():
+      return
+    peak = resetTracedPeak()
+    self.runPeakTraced = max(self.runPeakTraced, peak)
+    for name in self.starts:
+      self.peakTraced[name] = max(self.peakTraced.get(name, 0), peak)
+
+  def start(self, name):
+    self.samplePeak()
+    self.starts[name] = time.perf_counter()
+
+  def stop(self, name):
+    self.samplePeak()
+    self.timings[name] = self.timings.get(name, 0) + time.perf_counter() - self.starts.pop(name)
+
+  def genTimed(self, name, items):
+    """Generates items from an iterable, timing the work done producing each under phase name"""
+    items = iter(items)
+    while True:
+      self.start(name)
+      item = next(items, StopIteration)
+      self.stop(name)
+      if item is StopIteration:
+        return
+      yield item
+
+  def getTimings(self):
+    """Returns dict of seconds spent in each phase"""
+    return {name: round(seconds, 3) for name, seconds in self.timings.items()}
+
+  def getMemory(self):
+    """Returns dict with peakRss, the process's peak resident set size over its lifetime in bytes (None on Windows).  If
+    tracemalloc is tracing, also peakTraced, the most traced at once since the timer was created, and phases, the peak of each phase
+    """
+    memory = {
+      'peakRss': getPeakRss()
+    }
+    if tracemalloc.is_tracing():
+      self.samplePeak()
+      memory['peakTraced'] = self.runPeakTraced
+      memory['phases'] = dict(self.peakTraced)
+    return memory
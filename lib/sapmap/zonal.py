@@ -0,0 +1,143 @@
+import numpy as np
+from shapely.geometry import shape
+import rasterio
+from sapmap.coverage import toPixelEdges, splitEdges, EDGE_CHUNK_SIZE
+from sapmap.gen_sap_map import openShapes, toShapeGeoms
+from sapmap.columnar import crsToString
+
+class ZonalIndex:
+  """Loads a SAP raster once to answer zonal queries, the total, mean and share of total SAP within zones
+
+  Builds a summed-area table (integral image) of the raster, so the total within any rectangle is found
+  from its four corners in constant time.  Cells cut by a zone's edge count in proportion to the fraction
+  of them inside it, as if SAP were spread evenly over each cell.  Polygon zones are integrated along
+  their boundary, see sumPolygons, in time proportional to the number of cells their edges cross.  Zones
+  are in the raster's coordinate system, queryZoneFile reprojects them.  Nodata cells count as 0.
+
+  Parameters:
+    rasterPath: path+filename of SAP raster, such as output by genSapMap
+    band: band of raster to query, defaults to 1
+  """
+  def __init__(self, rasterPath, band=1):
+    with rasterio.open(rasterPath) as reader:
+      values = reader.read(band, masked=True).filled(0).astype('float64')
+      self.transform = reader.transform
+      self.crs = reader.crs
+    (self.height, self.width) = values.shape
+    # table[row, col] is the sum of all cells above and left of the grid line intersection row, col
+    self.table = np.zeros((self.height + 1, self.width + 1), dtype='float64')
+    np.cumsum(np.cumsum(values, axis=0), axis=1, out=self.table[1:, 1:])
+    self.total = float(self.table[-1, -1])
+
+  def interpTable(self, rows, cols):
+    """Returns the sum of SAP above and left of fractional pixel coordinates, bilinearly interpolating the table
+
+    Interpolation is exact for SAP spread evenly over each cell.  Coordinates are clamped to the grid
+    """
+    rows = np.clip(rows, 0, self.height)
+    cols = np.clip(cols, 0, self.width)
+    row0 = np.minimum(np.floor(rows), max(self.height - 1, 0)).astype('int64')
+    col0 = np.minimum(np.floor(cols), max(self.width - 1, 0)).astype('int64')
+    row1 = np.minimum(row0 + 1, self.height)
+    col1 = np.minimum(col0 + 1, self.width)
+    fracRow = rows - row0
+    fracCol = cols - col0
+    return (
+      self.table[row0, col0] * (1 - fracRow) * (1 - fracCol) +
+      self.table[row1, col0] * fracRow * (1 - fracCol) +
+      self.table[row0, col1] * (1 - fracRow) * fracCol +
+      self.table[row1, col1] * fracRow * fracCol
+    )
+
+  def sumRectangles(self, bounds):
+    """Returns (totals, cellCounts) arrays of the SAP within and number of cells covered by each rectangle
+
+    Parameters:
+      bounds: sequence of [w, s, e, n] rectangles, in raster coordinate system
+    """
+    bounds = np.asarray(bounds, dtype='float64').reshape(-1, 4)
+    cols = (bounds[:, [0, 2]] - self.transform.c) / self.transform.a
+    rows = (bounds[:, [3, 1]] - self.transform.f) / self.transform.e
+    (col0, col1) = (np.clip(cols.min(axis=1), 0, self.width), np.clip(cols.max(axis=1), 0, self.width))
+    (row0, row1) = (np.clip(rows.min(axis=1), 0, self.height), np.clip(rows.max(axis=1), 0, self.height))
+    totals = self.interpTable(row1, col1) - self.interpTable(row0, col1) - self.interpTable(row1, col0) + self.interpTable(row0, col0)
+    return (totals, (row1 - row0) * (col1 - col0))
+
+  def sumPolygons(self, geometries):
+    """Returns (totals, cellCounts) arrays of the SAP within and number of cells covered by each polygon
+
+    By Green's theorem, the SAP within a polygon is the integral around its boundary of the SAP to the right
+    of each point, in its row.  Edges are split where they cross grid lines, see splitEdges, and each piece
+    multiplies its signed height by the SAP right of its midpoint, interpolated from the summed-area table.
+
+    Parameters:
+      geometries: sequence of shapely Polygon or MultiPolygon, in raster coordinate system
+    """
+    totals = np.zeros(len(geometries), dtype='float64')
+    cellCounts = np.zeros(len(geometries), dtype='float64')
+    if len(geometries) == 0 or self.width == 0 or self.height == 0:
+      return (totals, cellCounts)
+
+    (x0, y0, x1, y1, edgeSign, geomIndex) = toPixelEdges(geometries, self.transform, self.height)
+    for start in range(0, len(x0), EDGE_CHUNK_SIZE):
+      end = start + EDGE_CHUNK_SIZE
+      (pieceEdges, rows, midX, pieceHeight) = splitEdges(x0[start:end], y0[start:end], x1[start:end], y1[start:end], self.width, self.height)
+      pieceHeight = pieceHeight * edgeSign[start:end][pieceEdges]
+      pieceGeoms = geomIndex[start:end][pieceEdges]
+      # Row sums from the left edge of the grid, differences of consecutive table rows
+      rowTotals = self.table[rows + 1, -1] - self.table[rows, -1]
+      leftSums = self.interpTable(rows + 1, midX) - self.interpTable(rows, midX)
+      totals += np.bincount(pieceGeoms, weights=pieceHeight * (rowTotals - leftSums), minlength=len(geometries))
+      cellCounts += np.bincount(pieceGeoms, weights=pieceHeight * (self.width - midX), minlength=len(geometries))
+    return (totals, cellCounts)
+
+  def toResults(self, totals, cellCounts):
+    """Returns list of query result dicts with the total, mean per cell and share of the raster total of each zone"""
+    return [{
+      'total': float(total),
+      'mean': float(total / cellCount) if cellCount > 0 else 0,
+      'share': float(total / self.total) if self.total != 0 else 0,
+      'cellCount': float(cellCount)
+    } for total, cellCount in zip(totals, cellCounts)]
+
+  def query(self, zones):
+    """Returns the total, mean and share of SAP within each zone
+
+    Parameters:
+      zones: sequence of zones, each a [w, s, e, n] rectangle, a shapely geometry or a GeoJSON-like geometry, in raster coordinate system
+    Returns:
+      list of dicts, one per zone in the same order, with total SAP within the zone, mean SAP per cell covered,
+      share of the raster's total SAP, and cellCount, the number of cells covered (fractional)
+    """
+    isRectangle = [not (hasattr(zone, 'geom_type') or isinstance(zone, dict)) for zone in zones]
+    rectangleIndexes = [idx for idx, rectangle in enumerate(isRectangle) if rectangle]
+    polygonIndexes = [idx for idx, rectangle in enumerate(isRectangle) if not rectangle]
+
+    totals = np.zeros(len(zones), dtype='float64')
+    cellCounts = np.zeros(len(zones), dtype='float64')
+    if len(rectangleIndexes) > 0:
+      (totals[rectangleIndexes], cellCounts[rectangleIndexes]) = self.sumRectangles([zones[idx] for idx in rectangleIndexes])
+    if len(polygonIndexes) > 0:
+      geometries = np.empty(len(polygonIndexes), dtype=object)
+      geometries[:] = [zones[idx] if hasattr(zones[idx], 'geom_type') else shape(zones[idx]) for idx in polygonIndexes]
+      (totals[polygonIndexes], cellCounts[polygonIndexes]) = self.sumPolygons(geometries)
+    return self.toResults(totals, cellCounts)
+
+  def queryZoneFile(self, zonefile, idField=None):
+    """Returns the total, mean and share of SAP within each feature of a vector dataset of zones, see query
+
+    Zones are reprojected to the raster's coordinate system and queried in one batch.
+
+    Parameters:
+      zonefile: path+filename of vector dataset of polygon zones, format must be supported by fiona/gdal, or GeoParquet/Feather
+      idField: name of attribute identifying each zone, included in its result as id.  Defaults to None, using the feature index
+    Returns:
+      list of dicts, one per zone in input order, see query
+    """
+    with openShapes(zonefile, [idField]) as zones:
+      features = list(zones)
+      geometries = toShapeGeoms([feature['geometry'] for feature in features], zones.crs['init'], crsToString(self.crs))
+    results = self.toResults(*self.sumPolygons(geometries))
+    for idx, (feature, result) in enumerate(zip(features, results)):
+      result['id'] = feature['properties'][idField] if idField else idx
+    return results
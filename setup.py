@@ -45,7 +45,9 @@ setup(
     package_dir={'': 'lib'},
     packages=['sapmap'],
     long_description=read('README.md'),
+    python_requires='>=3.9',
     install_requires=read('requirements.txt').splitlines(),
+    extras_require={'parquet': ['pyarrow']},
     tests_require=read('requirements_dev.txt').splitlines(),
     cmdclass={'test': PyTest},
     classifiers=[
@@ -54,10 +56,10 @@ setup(
         'Intended Audience :: Science/Research',
         "License :: OSI Approved :: BSD License",
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
-        'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         "Topic :: Utilities",
         'Topic :: Scientific/Engineering :: GIS',
     ])
\ No newline at end of file
@@ -0,0 +1,86 @@
+from sapmap import genSapMap, genSapMaps
+from sapmap import batch
+import os
+import rasterio
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 100
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def readOutput(outPath):
+    with rasterio.open(os.path.join(outPath, 'simple-polygon.tif')) as reader:
+        return reader.read()
+
+def genRuns(tmp_path):
+    runs = [
+        {'importanceField': None, 'outResolution': resolution},
+        {'importanceField': 'importance', 'outResolution': resolution},
+        {'importanceField': 'importance', 'outResolution': 50},
+    ]
+    for idx, run in enumerate(runs):
+        run['outPath'] = os.path.join(tmp_path, str(idx))
+        os.mkdir(run['outPath'])
+    return runs
+
+def test_batch_matches_single(tmp_path):
+    """Runs sharing an infile produce the same heatmaps as running them one at a time
+    """
+    runs = genRuns(tmp_path)
+    default = {'infile': infile, 'areaFactor': pixelArea, 'overwrite': True}
+    expected = []
+    for run in runs:
+        genSapMap(**default, **run)
+        expected.append(readOutput(run['outPath']))
+
+    manifests = genSapMaps(runs, default)
+    assert(len(manifests) == 3)
+    for run, manifest, expectedArr in zip(runs, manifests, expected):
+        assert('loadTime' in manifest)
+        assert(manifest['params']['importanceField'] == run['importanceField'])
+        np.testing.assert_array_equal(readOutput(run['outPath']), expectedArr)
+
+def test_batch_workers(tmp_path):
+    """Runs in a group can be generated across a process pool
+    """
+    runs = genRuns(tmp_path)
+    default = {'infile': infile, 'areaFactor': pixelArea, 'overwrite': True}
+    expected = []
+    for run in runs:
+        genSapMap(**default, **run)
+        expected.append(readOutput(run['outPath']))
+
+    manifests = genSapMaps(runs, default, workers=2)
+    assert([manifest['params']['outResolution'] for manifest in manifests] == [100, 100, 50])
+    for run, expectedArr in zip(runs, expected):
+        np.testing.assert_array_equal(readOutput(run['outPath']), expectedArr)
+
+def test_batch_missing_infile(tmp_path):
+    manifests = genSapMaps([{'infile': os.path.join(tmp_path, 'missing.geojson')}])
+    assert(manifests == [None])
+
+def test_batch_loads_only_shared(tmp_path, monkeypatch):
+    """Features are only loaded up front for groups of two or more runs that will run and don't bound their memory
+    """
+    loaded = []
+    class CountedShapes(batch.LoadedShapes):
+        def __init__(self, *args, **kwargs):
+            loaded.append(args[0])
+            super().__init__(*args, **kwargs)
+    monkeypatch.setattr(batch, 'LoadedShapes', CountedShapes)
+
+    runs = genRuns(tmp_path)
+    default = {'infile': infile, 'areaFactor': pixelArea, 'overwrite': True}
+    genSapMaps(runs[:1], default)
+    genSapMaps([{**run, 'streaming': True} for run in runs], default)
+    assert(loaded == [])
+
+    # Existing outfiles are skipped without loading, leaving a single run
+    manifests = genSapMaps(runs, {**default, 'overwrite': False})
+    assert(manifests[0] is None and manifests[1] is None and manifests[2] is None)
+    os.remove(os.path.join(runs[1]['outPath'], 'simple-polygon.tif'))
+    os.remove(os.path.join(runs[2]['outPath'], 'simple-polygon.tif'))
+    manifests = genSapMaps(runs, {**default, 'overwrite': False})
+    assert(manifests[0] is None and manifests[1] is not None and manifests[2] is not None)
+    assert(loaded == [infile])
@@ -0,0 +1,47 @@
+from sapmap.benchmark import genSyntheticSurvey, runBenchmarks, compareResults
+import os.path
+import fiona
+from shapely.geometry import shape
+
+def test_synthetic_survey_reproducible(tmp_path):
+    """Same arguments produce the same valid polygons
+    """
+    options = {
+        'numShapes': 50,
+        'numVertices': 12,
+        'sizeDistribution': {'type': 'lognormal', 'mean': 0.1, 'sigma': 0.5},
+        'bounds': [-125, 45, -120, 50],
+        'crsString': 'epsg:4326',
+        'seed': 7
+    }
+    surveys = []
+    for name in ['a', 'b']:
+        outfile = genSyntheticSurvey(os.path.join(tmp_path, '{0}.geojson'.format(name)), **options)
+        with fiona.open(outfile) as src:
+            assert(src.crs['init'] == 'epsg:4326')
+            surveys.append([(shape(feature['geometry']), dict(feature['properties'])) for feature in src])
+
+    assert(len(surveys[0]) == 50)
+    assert(all(geometry.is_valid and len(geometry.exterior.coords) == 13 for geometry, properties in surveys[0]))
+    assert(all(1 <= properties['importance'] <= 100 for geometry, properties in surveys[0]))
+    assert([(geometry.wkb, properties) for geometry, properties in surveys[0]] == [(geometry.wkb, properties) for geometry, properties in surveys[1]])
+
+def test_run_benchmarks(tmp_path):
+    cases = [{
+        'name': 'tiny',
+        'survey': {'numShapes': 20, 'sizeDistribution': {'type': 'uniform', 'min': 10000, 'max': 50000}, 'seed': 1},
+        'run': {'outResolution': 20000, 'importanceField': 'importance'}
+    }]
+    results = runBenchmarks(cases, tmp_path)
+    metrics = results['cases']['tiny']
+    assert(metrics['includedCount'] == 20)
+    assert(metrics['totalTime'] >= metrics['loadTime'])
+    assert(metrics['peakTraced'] > 0 and metrics['peakRss'] > 0)
+
+def test_compare_results():
+    baseline = {'cases': {'a': {'totalTime': 1.0, 'peakRss': 1000}, 'b': {'totalTime': 1.0}}}
+    results = {'cases': {'a': {'totalTime': 1.2, 'peakRss': 1500}, 'b': {'totalTime': 0.5}, 'new': {'totalTime': 9}}}
+    regressions = compareResults(results, baseline, 0.25)
+    assert(len(regressions) == 1)
+    assert(regressions[0].startswith('a peakRss regressed from 1000 to 1500'))
+    assert(len(compareResults(results, baseline, 0.1)) == 2)
@@ -1,5 +1,7 @@
-from sapmap import calcSap
-from shapely.geometry import shape
+from sapmap import calcSap, calcSapArray
+from shapely.geometry import shape, box
+import shapely
+import numpy as np
 import json
 
 # geometry is a rectangle that is 100m x 200m = 20,000m^2 area
@@ -61,5 +63,26 @@ def test_calc_sap_importance_factor():
     )
     assert(sap1 == 3)
 
+def test_calc_sap_array():
+    # Batch calculation should match calcSap for each geometry
+    areas = [20000, 10000, 40000]
+    importances = [20, 10, 40]
+    importanceFactors = [1, 3000, 0.5]
+    saps = calcSapArray(areas, importances, 10000, importanceFactors)
+    assert(saps.dtype == np.float64)
+    for area, imp, impFactor, sap in zip(areas, importances, importanceFactors, saps):
+        rect = box(0, 0, area / 100, 100)
+        assert(sap == calcSap(rect, imp, 10000, impFactor))
+
+def test_calc_sap_array_max():
+    # maxArea and maxSap are applied element-wise
+    saps = calcSapArray([20000, 100], 20, maxArea=10000, maxSap=0.1)
+    np.testing.assert_array_equal(saps, [20 / 10000, 0.1])
+
+def test_calc_sap_array_shapely_area():
+    # Accepts vectorized shapely area output
+    saps = calcSapArray(shapely.area(np.array([geometry, geometry])), importance)
+    np.testing.assert_array_equal(saps, [.001, .001])
+
 if __name__ == "__main__":
     test_calc_sap()
\ No newline at end of file
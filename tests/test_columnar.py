@@ -0,0 +1,75 @@
+from sapmap import genSapMap, convertToGeoParquet, LoadedShapes
+from sapmap import columnar
+from sapmap.columnar import ColumnarFeatures
+from reprojectFeature import reprojectGeometries, reprojectPolygons
+from shapely.geometry import shape
+from rasterio.warp import transform_geom
+import os.path
+import json
+import rasterio
+import numpy as np
+import pytest
+
+if columnar.pyarrow is None:
+    pytest.skip('pyarrow is not installed', allow_module_level=True)
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 10
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def genIdInfile(tmp_path):
+    """Writes simple-polygon with an id on each feature, reprojected to 4326"""
+    with open(infile) as f:
+        collection = json.load(f)
+    del collection['crs']
+    for idx, feature in enumerate(collection['features']):
+        feature['properties']['id'] = 'feature-{0}'.format(idx)
+        feature['geometry'] = transform_geom('epsg:3857', 'epsg:4326', feature['geometry'])
+    infile4326 = os.path.join(tmp_path, 'simple-polygon-4326.geojson')
+    with open(infile4326, 'w') as f:
+        json.dump(collection, f)
+    return infile4326
+
+@pytest.mark.parametrize('extension', ['parquet', 'feather'])
+def test_columnar_matches_geojson(tmp_path, extension):
+    """Converted input produces the same heatmap and manifest as the GeoJSON it was converted from
+    """
+    geojsonInfile = genIdInfile(tmp_path)
+    columnarInfile = os.path.join(tmp_path, 'simple-polygon-columnar.{0}'.format(extension))
+    assert(convertToGeoParquet(geojsonInfile, columnarInfile) == 5)
+
+    options = {'outPath': tmp_path, 'outResolution': resolution, 'bounds': [-0.002, -0.002, 0.002, 0.002], 'boundsPrecision': 6, 'areaFactor': pixelArea, 'importanceField': 'importance', 'uniqueIdField': 'id', 'overwrite': True}
+    manifest = genSapMap(geojsonInfile, **options)
+    with rasterio.open(os.path.join(tmp_path, 'simple-polygon-4326.tif')) as reader:
+        expected = reader.read()
+
+    columnarManifest = genSapMap(columnarInfile, **options)
+    assert(columnarManifest['included'] == manifest['included'] == ['feature-{0}'.format(idx) for idx in range(5)])
+    with rasterio.open(os.path.join(tmp_path, 'simple-polygon-columnar.tif')) as reader:
+        np.testing.assert_allclose(reader.read(), expected, rtol=1e-6)
+
+def test_columnar_features(tmp_path):
+    """Only requested columns are read, and features support property and geo interface access
+    """
+    parquetInfile = os.path.join(tmp_path, 'simple-polygon.parquet')
+    convertToGeoParquet(infile, parquetInfile)
+    features = ColumnarFeatures(parquetInfile, ['importance', None])
+    assert(features.crs['init'] == 'epsg:3857')
+    assert(len(features) == 5)
+    assert(list(features.columns.keys()) == ['importance'])
+
+    feature = next(iter(features))
+    assert(feature['properties']['importance'] == 20)
+    assert(type(feature['properties']['importance']) == int)
+    assert(shape(feature.__geo_interface__['geometry']).area == 20000)
+
+    loadedShapes = LoadedShapes(parquetInfile)
+    assert(len(loadedShapes) == 5)
+    assert(loadedShapes.records[0][5] == 20000)
+
+def test_reproject_geometries():
+    polygon = {"type": "Polygon", "coordinates": [[[70, 1], [71, 1], [71, 2], [70, 1]]]}
+    result = reprojectGeometries(np.array([shape(polygon)], dtype=object))
+    assert(result[0].equals_exact(reprojectPolygons([polygon])[0], 1e-6))
+    assert(len(reprojectGeometries(np.empty(0, dtype=object))) == 0)
@@ -0,0 +1,62 @@
+from sapmap import genSapMap
+from sapmap.coverage import calcCoverage
+import os.path
+import fiona
+import rasterio
+import numpy as np
+from rasterio.transform import from_origin
+from shapely.geometry import box, Point
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 10
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def test_coverage_matches_intersection():
+    """Coverage of each cell should equal the area of the cell's intersection with the shapes, holes and all
+    """
+    transform = from_origin(0, 10, 1, 1)
+    donut = Point(5, 5).buffer(4).difference(Point(5, 5).buffer(2))
+    shapes = [(donut, 2), (box(-3, -3, 2.5, 2.5), 1), (Point(8.3, 1.6).buffer(0.2), 1)]
+    coverage = calcCoverage(shapes, transform, 10, 10)
+
+    expected = np.zeros((10, 10))
+    for row in range(10):
+        for col in range(10):
+            cell = box(col, 9 - row, col + 1, 10 - row)
+            expected[row, col] = sum(geometry.intersection(cell).area * value for geometry, value in shapes)
+    np.testing.assert_allclose(coverage, expected, atol=1e-12)
+
+def test_small_polygon_covered(tmp_path):
+    """Polygon smaller than a cell is burned in by the fraction of the cell it covers, instead of lost
+    """
+    outfile = os.path.join(tmp_path, 'off-center-polygon.tif')
+    genSapMap(
+        os.path.join(DATA, 'off-center-polygon.geojson'),
+        outPath=tmp_path,
+        outResolution=100,
+        bounds=[-100, -100, 100, 100],
+        areaFactor=100 * 100,
+        exactCoverage=True,
+        overwrite=True
+    )
+    with rasterio.open(outfile) as reader:
+        np.testing.assert_array_equal(reader.read(), np.array([[[0, 1], [0, 0]]], dtype=np.float32))
+
+def test_coverage_conserves_heat(tmp_path):
+    """Total heat should equal the sum of importance, whether rasterized whole, in tiles or sparse blocks
+    """
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    with fiona.open(infile) as src:
+        totalImportance = sum(feature['properties']['importance'] for feature in src)
+
+    outputs = []
+    for options in [{}, {'tileSize': 16}, {'accumulator': 'sparse'}]:
+        manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True, exactCoverage=True, **options)
+        assert(manifest['params']['exactCoverage'] == True)
+        with rasterio.open(outfile) as reader:
+            outputs.append(reader.read())
+
+    assert(abs(outputs[0].sum() - totalImportance) < 1e-3)
+    np.testing.assert_allclose(outputs[1], outputs[0], rtol=1e-6)
+    np.testing.assert_allclose(outputs[2], outputs[0], rtol=1e-6)
@@ -0,0 +1,52 @@
+from sapmap import genSapMap
+from sapmap.footprint_cache import FootprintCache, calcFootprint
+from shapely.geometry import box
+from rasterio.transform import from_bounds
+import os.path
+import rasterio
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 10
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def test_calc_footprint():
+    """Footprint of a 2x1 pixel box in a 4x4 grid
+    """
+    transform = from_bounds(0, 0, 40, 40, 4, 4)
+    (indices, coverage) = calcFootprint(box(10, 20, 30, 30), transform, 4, 4)
+    np.testing.assert_array_equal(indices, [5, 6])
+    np.testing.assert_array_equal(coverage, [1, 1])
+
+def test_cache_matches_rasterize(tmp_path):
+    """Runs using the cache match runs without, and re-runs with new weighting hit the cache
+    """
+    cachePath = os.path.join(tmp_path, 'footprints.sqlite')
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    for importanceField in [None, 'importance']:
+        genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField=importanceField, overwrite=True)
+        with rasterio.open(outfile) as reader:
+            expected = reader.read()
+
+        manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField=importanceField, overwrite=True, footprintCache=cachePath)
+        with rasterio.open(outfile) as reader:
+            np.testing.assert_allclose(reader.read(), expected)
+
+    # Second run only changed the weighting, all footprints came from the cache
+    assert(manifest['footprintCache'] == {'hits': 5, 'misses': 0})
+
+def test_cache_eviction(tmp_path):
+    """Least recently used footprints are evicted past maxBytes
+    """
+    transform = from_bounds(0, 0, 40, 40, 4, 4)
+    # Each 1 pixel footprint is 16 bytes
+    cache = FootprintCache(os.path.join(tmp_path, 'footprints.sqlite'), maxBytes=32)
+    first = box(0, 0, 10, 10)
+    cache.getFootprints([first, box(10, 0, 20, 10)], transform, 4, 4)
+    cache.getFootprints([box(20, 0, 30, 10)], transform, 4, 4)
+    assert(cache.db.execute('SELECT COUNT(*) FROM footprints').fetchone()[0] == 2)
+
+    cache.getFootprints([first], transform, 4, 4)
+    assert(cache.misses == 4)
+    cache.close()
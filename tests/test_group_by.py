@@ -0,0 +1,40 @@
+from sapmap import genSapMap
+import os.path
+import json
+import rasterio
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 100
+pixelArea = resolution * resolution
+
+def test_group_by_field(tmp_path):
+    """Each group is burned into its own band, and bands sum to the ungrouped heatmap
+    """
+    with open(os.path.join(DATA, 'simple-polygon.geojson')) as f:
+        collection = json.load(f)
+    for idx, feature in enumerate(collection['features']):
+        feature['properties']['gear'] = 'trap' if idx in [1, 3] else 'line'
+    infile = os.path.join(tmp_path, 'grouped.geojson')
+    with open(infile, 'w') as f:
+        json.dump(collection, f)
+    outfile = os.path.join(tmp_path, 'grouped.tif')
+
+    genSapMap(infile, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True)
+    with rasterio.open(outfile) as reader:
+        expected = reader.read(1)
+
+    manifest = genSapMap(infile, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True, groupByField='gear')
+    assert(manifest['groups'] == [
+        {'band': 1, 'value': 'line', 'includedCount': 3},
+        {'band': 2, 'value': 'trap', 'includedCount': 2}
+    ])
+
+    with rasterio.open(outfile) as reader:
+        assert(reader.count == 2)
+        assert(reader.descriptions == ('line', 'trap'))
+        arr = reader.read()
+
+    np.testing.assert_array_equal(arr.sum(axis=0), expected)
+    # Second feature, a trap, covers the top row
+    np.testing.assert_array_equal(arr[1][0], [10, 10, 0, 0])
@@ -0,0 +1,38 @@
+from sapmap import genSapMap
+from sapmap import scratch
+import os.path
+import tracemalloc
+import rasterio
+import numpy as np
+import pytest
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+# 1m resolution, 1000x1000 pixel grid, with every feature rasterized as small and then large
+options = {'outResolution': 1, 'bounds': [-200, -200, 800, 800], 'importanceField': 'importance', 'allTouchedSmall': True, 'overwrite': True}
+writeChunkBytes = 1024 * 1024
+
+@pytest.mark.parametrize('accumulatorDtype,itemsize', [('float64', 8), ('float32', 4)])
+def test_peak_memory(tmp_path, monkeypatch, accumulatorDtype, itemsize):
+    """Small and large shapes are rasterized in place into one grid, and written a block of rows at a time
+    """
+    monkeypatch.setattr(scratch, 'WRITE_CHUNK_BYTES', writeChunkBytes)
+    tracemalloc.start()
+    manifest = genSapMap(infile, outPath=tmp_path, allTouchedSmallFactor=1000, accumulatorDtype=accumulatorDtype, **options)
+    tracemalloc.stop()
+    assert(manifest['includedSmallCount'] == 5)
+
+    gridBytes = manifest['width'] * manifest['height'] * itemsize
+    assert(manifest['memory']['peakTraced'] < gridBytes + 2 * writeChunkBytes)
+
+def test_float32_matches_float64(tmp_path):
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    genSapMap(infile, outPath=tmp_path, **options)
+    with rasterio.open(outfile) as reader:
+        expected = reader.read()
+    genSapMap(infile, outPath=tmp_path, accumulatorDtype='float32', **options)
+    with rasterio.open(outfile) as reader:
+        np.testing.assert_allclose(reader.read(), expected, rtol=1e-6)
+
+    with pytest.raises(ValueError):
+        genSapMap(infile, outPath=tmp_path, accumulatorDtype='int32', **options)
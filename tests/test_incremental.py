@@ -0,0 +1,122 @@
+from sapmap import genSapMap
+import os.path
+import json
+import rasterio
+import numpy as np
+import pytest
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 100
+pixelArea = resolution * resolution
+runParams = {
+    'outResolution': resolution,
+    'areaFactor': pixelArea,
+    'importanceField': 'importance',
+    'uniqueIdField': 'id',
+    'bounds': [-200, -200, 200, 200],
+    'logToFile': True,
+    'overwrite': True
+}
+
+def writeSurvey(path, ids):
+    """Writes simple-polygon features with the given ids to a new file"""
+    with open(os.path.join(DATA, 'simple-polygon.geojson')) as f:
+        collection = json.load(f)
+    for idx, feature in enumerate(collection['features']):
+        feature['properties']['id'] = idx
+    collection['features'] = [collection['features'][i] for i in ids]
+    with open(path, 'w') as f:
+        json.dump(collection, f)
+
+def test_incremental_matches_rebuild(tmp_path):
+    """Adding and removing features incrementally gives the same result as a full rebuild
+    """
+    v1 = os.path.join(tmp_path, 'survey-v1.geojson')
+    v2 = os.path.join(tmp_path, 'survey-v2.geojson')
+    writeSurvey(v1, [0, 1, 2])
+    writeSurvey(v2, [0, 2, 3, 4])
+
+    genSapMap(v1, **runParams)
+    manifest = genSapMap(v2, incrementalFrom=os.path.join(tmp_path, 'survey-v1.tif'), **runParams)
+    assert(manifest['incremental']['addedCount'] == 2)
+    assert(manifest['incremental']['removedCount'] == 1)
+    with rasterio.open(os.path.join(tmp_path, 'survey-v2.tif')) as reader:
+        incrementalArr = reader.read()
+
+    rebuildManifest = genSapMap(v2, **runParams)
+    assert(manifest['included'] == rebuildManifest['included'] == [0, 2, 3, 4])
+    with rasterio.open(os.path.join(tmp_path, 'survey-v2.tif')) as reader:
+        rebuildArr = reader.read()
+
+    np.testing.assert_array_equal(incrementalArr, rebuildArr)
+
+def test_incremental_param_mismatch(tmp_path):
+    """Updating with different parameters requires a full rebuild
+    """
+    v1 = os.path.join(tmp_path, 'survey-v1.geojson')
+    writeSurvey(v1, [0, 1])
+    genSapMap(v1, **runParams)
+
+    with pytest.raises(ValueError):
+        genSapMap(v1, incrementalFrom=os.path.join(tmp_path, 'survey-v1.tif'), **{**runParams, 'importanceField': None})
+
+def test_incremental_coverage_mismatch(tmp_path):
+    """Exact coverage and cell center burns can't be mixed in one heatmap
+    """
+    v1 = os.path.join(tmp_path, 'survey-v1.geojson')
+    writeSurvey(v1, [0, 1])
+    genSapMap(v1, **runParams)
+    with pytest.raises(ValueError):
+        genSapMap(v1, incrementalFrom=os.path.join(tmp_path, 'survey-v1.tif'), exactCoverage=True, **runParams)
+
+    genSapMap(v1, exactCoverage=True, **runParams)
+    with pytest.raises(ValueError):
+        genSapMap(v1, incrementalFrom=os.path.join(tmp_path, 'survey-v1.tif'), **runParams)
+    manifest = genSapMap(v1, incrementalFrom=os.path.join(tmp_path, 'survey-v1.tif'), exactCoverage=True, **runParams)
+    assert(manifest['incremental']['addedCount'] == 0)
+
+def test_incremental_removed_not_found(tmp_path):
+    """Removed features must be found in previousInfile to subtract them
+    """
+    v1 = os.path.join(tmp_path, 'survey-v1.geojson')
+    v2 = os.path.join(tmp_path, 'survey-v2.geojson')
+    writeSurvey(v1, [0, 1])
+    writeSurvey(v2, [0])
+    genSapMap(v1, **runParams)
+
+    with pytest.raises(ValueError):
+        genSapMap(v2, incrementalFrom=os.path.join(tmp_path, 'survey-v1.tif'), previousInfile=v2, **runParams)
+
+def test_incremental_non_round(tmp_path):
+    """Non-round heat values are updated from the full precision accumulator, matching a rebuild exactly
+    """
+    v1 = os.path.join(tmp_path, 'survey-v1.geojson')
+    v2 = os.path.join(tmp_path, 'survey-v2.geojson')
+    for path, ids in [(v1, [0, 1, 2, 3]), (v2, [0, 2, 4])]:
+        writeSurvey(path, ids)
+        with open(path) as f:
+            collection = json.load(f)
+        for feature in collection['features']:
+            feature['properties']['importance'] = 1 / (3 + feature['properties']['id'])
+        with open(path, 'w') as f:
+            json.dump(collection, f)
+    params = {**runParams, 'areaFactor': 7.3, 'keepAccumulator': True}
+
+    v1Manifest = genSapMap(v1, **params)
+    assert(os.path.isfile(v1Manifest['accumulatorfile']))
+    manifest = genSapMap(v2, incrementalFrom=os.path.join(tmp_path, 'survey-v1.tif'), **params)
+    assert(manifest['incremental']['removedCount'] == 2)
+    with rasterio.open(os.path.join(tmp_path, 'survey-v2.tif')) as reader:
+        incrementalArr = reader.read()
+
+    genSapMap(v2, **params)
+    with rasterio.open(os.path.join(tmp_path, 'survey-v2.tif')) as reader:
+        rebuildArr = reader.read()
+    np.testing.assert_array_equal(incrementalArr, rebuildArr)
+    # Cells only removed features covered are nodata, not residue
+    assert(((incrementalArr == 0) == (rebuildArr == 0)).all())
+
+    # Only kept when asked for, and never for accumulators that can't be updated
+    assert('accumulatorfile' not in genSapMap(v1, **runParams))
+    with pytest.raises(ValueError):
+        genSapMap(v1, **{**params, 'accumulator': 'memmap'})
@@ -0,0 +1,52 @@
+from sapmap import genSapMap, LoadedShapes
+from sapmap import gen_sap_map
+from sapmap.benchmark import genSyntheticSurvey
+import os.path
+import json
+import rasterio
+import numpy as np
+
+bowtie = {"type": "Polygon", "coordinates": [[[0, 0], [20000, 20000], [20000, 0], [0, 20000], [0, 0]]]}
+flat = {"type": "Polygon", "coordinates": [[[0, 0], [10000, 0], [20000, 0], [0, 0]]]}
+
+def genInfile(tmp_path):
+    """Writes a synthetic survey with invalid and zero area features mixed in"""
+    infile = os.path.join(tmp_path, 'survey.geojson')
+    genSyntheticSurvey(infile, numShapes=300, bounds=[-100000, -100000, 100000, 100000], seed=4)
+    with open(infile) as f:
+        collection = json.load(f)
+    for idx, geometry in [(10, bowtie), (150, flat), (299, bowtie)]:
+        collection['features'][idx]['geometry'] = geometry
+    with open(infile, 'w') as f:
+        json.dump(collection, f)
+    return infile
+
+def test_parallel_ingest_matches_serial(tmp_path, monkeypatch):
+    """Chunks ingested in worker processes are merged back in input order, giving the same manifest and output
+    """
+    monkeypatch.setattr(gen_sap_map, 'INGEST_CHUNK_SIZE', 25)
+    infile = genInfile(tmp_path)
+    outfile = os.path.join(tmp_path, 'survey.tif')
+    # Reprojected in the workers
+    options = {'outPath': tmp_path, 'outCrsString': 'epsg:4326', 'outResolution': 0.01, 'importanceField': 'importance', 'uniqueIdField': 'id', 'fixGeom': True, 'overwrite': True}
+    serial = genSapMap(infile, **options)
+    with rasterio.open(outfile) as reader:
+        expected = reader.read()
+
+    parallel = genSapMap(infile, ingestWorkers=3, **options)
+    for key in ['included', 'excluded', 'fixed']:
+        assert(parallel[key] == serial[key])
+    assert(len(parallel['fixed']) == 2 and len(parallel['excluded']) == 1)
+    assert('ingest' in parallel['timings'])
+    with rasterio.open(outfile) as reader:
+        np.testing.assert_array_equal(reader.read(), expected)
+
+def test_parallel_loaded_shapes(tmp_path):
+    infile = genInfile(tmp_path)
+    serial = LoadedShapes(infile)
+    parallel = LoadedShapes(infile, ingestWorkers=2)
+    assert(len(parallel) == len(serial))
+    for serialRecord, parallelRecord in zip(serial.records, parallel.records):
+        assert(parallelRecord[0] == serialRecord[0])
+        assert(parallelRecord[2].equals_exact(serialRecord[2], 0))
+        assert(parallelRecord[3:] == serialRecord[3:])
@@ -0,0 +1,114 @@
+from sapmap import genSapMap, readManifest
+from sapmap.manifest import IdsWriter, readManifestIds
+from sapmap.benchmark import genSyntheticSurvey
+import os.path
+import json
+import rasterio
+import numpy as np
+
+bowtie = {"type": "Polygon", "coordinates": [[[0, 0], [20000, 20000], [20000, 0], [0, 20000], [0, 0]]]}
+flat = {"type": "Polygon", "coordinates": [[[0, 0], [10000, 0], [20000, 0], [0, 0]]]}
+runParams = {'outResolution': 5000, 'importanceField': 'importance', 'uniqueIdField': 'id', 'allTouchedSmall': True, 'fixGeom': True, 'logToFile': True, 'overwrite': True}
+
+def genInfile(path, numShapes):
+    """Writes a synthetic survey with a fixable and an unfixable feature mixed in"""
+    genSyntheticSurvey(path, numShapes=numShapes, bounds=[-100000, -100000, 100000, 100000], seed=5)
+    with open(path) as f:
+        collection = json.load(f)
+    collection['features'][3]['geometry'] = bowtie
+    collection['features'][7]['geometry'] = flat
+    with open(path, 'w') as f:
+        json.dump(collection, f)
+
+def test_compact_manifest(tmp_path):
+    """Compact manifest has only the summary, and reads back with the same id lists as the default format
+    """
+    infile = os.path.join(tmp_path, 'survey.geojson')
+    genInfile(infile, 200)
+    manifest = genSapMap(infile, outPath=tmp_path, **runParams)
+    compactPath = os.path.join(tmp_path, 'compact')
+    os.mkdir(compactPath)
+    compactManifest = genSapMap(infile, outPath=compactPath, compactManifest=True, **runParams)
+
+    assert(compactManifest['idsfile'] == os.path.join(compactPath, 'survey.manifest.ids.npz'))
+    with open(os.path.join(compactPath, 'survey.manifest.json')) as f:
+        written = json.load(f)
+    assert('included' not in written and 'fixed' not in written)
+    assert(written['includedCount'] == manifest['includedCount'] == 199)
+
+    readBack = readManifest(os.path.join(compactPath, 'survey.manifest.json'))
+    for name in ['included', 'includedSmall', 'excluded', 'fixed']:
+        assert(readBack[name] == manifest[name])
+    assert(len(readBack['fixed']) == 1 and len(readBack['excluded']) == 1)
+
+def test_incremental_from_compact(tmp_path):
+    """Incremental update reads the id lists of a compact manifest from its sidecar
+    """
+    infile = os.path.join(tmp_path, 'survey.geojson')
+    genInfile(infile, 150)
+    with open(infile) as f:
+        collection = json.load(f)
+    features = collection['features']
+    for version, versionFeatures in [('v1', features[:100]), ('v2', features[20:])]:
+        with open(os.path.join(tmp_path, 'survey-{0}.geojson'.format(version)), 'w') as f:
+            json.dump({**collection, 'features': versionFeatures}, f)
+    v1 = os.path.join(tmp_path, 'survey-v1.geojson')
+    v2 = os.path.join(tmp_path, 'survey-v2.geojson')
+    params = {**runParams, 'outPath': tmp_path, 'bounds': [-110000, -110000, 110000, 110000], 'keepAccumulator': True}
+
+    genSapMap(v1, compactManifest=True, **params)
+    manifest = genSapMap(v2, compactManifest=True, incrementalFrom=os.path.join(tmp_path, 'survey-v1.tif'), **params)
+    assert(manifest['incremental']['addedCount'] == 50)
+    # One of the removed features was excluded
+    assert(manifest['incremental']['removedCount'] == 19)
+    incrementalIncluded = readManifest(os.path.join(tmp_path, 'survey-v2.manifest.json'))['included']
+    with rasterio.open(os.path.join(tmp_path, 'survey-v2.tif')) as reader:
+        incrementalArr = reader.read()
+
+    rebuildManifest = genSapMap(v2, **params)
+    assert(incrementalIncluded == rebuildManifest['included'])
+    with rasterio.open(os.path.join(tmp_path, 'survey-v2.tif')) as reader:
+        np.testing.assert_array_equal(incrementalArr, reader.read())
+
+def test_incremental_in_place_compact(tmp_path):
+    """Updating a compact run in place reads its sidecar before replacing it
+    """
+    infile = os.path.join(tmp_path, 'survey.geojson')
+    genInfile(infile, 150)
+    with open(infile) as f:
+        collection = json.load(f)
+    features = collection['features']
+    params = {**runParams, 'outPath': tmp_path, 'bounds': [-110000, -110000, 110000, 110000], 'compactManifest': True, 'keepAccumulator': True}
+    outfile = os.path.join(tmp_path, 'survey.tif')
+
+    with open(infile, 'w') as f:
+        json.dump({**collection, 'features': features[:100]}, f)
+    genSapMap(infile, **params)
+    with open(infile, 'w') as f:
+        json.dump({**collection, 'features': features[20:]}, f)
+    previousInfile = os.path.join(tmp_path, 'survey-v1.geojson')
+    with open(previousInfile, 'w') as f:
+        json.dump({**collection, 'features': features[:100]}, f)
+    manifest = genSapMap(infile, incrementalFrom=outfile, previousInfile=previousInfile, **params)
+    assert(manifest['incremental']['addedCount'] == 50)
+    assert(manifest['incremental']['removedCount'] == 19)
+    incrementalIncluded = readManifest(os.path.join(tmp_path, 'survey.manifest.json'))['included']
+    with rasterio.open(outfile) as reader:
+        incrementalArr = reader.read()
+
+    rebuildManifest = genSapMap(infile, **{**params, 'compactManifest': False})
+    assert(incrementalIncluded == rebuildManifest['included'])
+    with rasterio.open(outfile) as reader:
+        np.testing.assert_array_equal(incrementalArr, reader.read())
+
+def test_ids_chunks(tmp_path):
+    path = os.path.join(tmp_path, 'ids.npz')
+    writer = IdsWriter(path, chunkSize=2)
+    for featureId in ['a', 'b', 'c', 'dd', 'e']:
+        writer.columns['included'].append(featureId)
+    writer.columns['excluded'].append(7)
+    writer.close()
+    ids = readManifestIds(path)
+    assert(ids['included'].tolist() == ['a', 'b', 'c', 'dd', 'e'])
+    assert(ids['excluded'].tolist() == [7])
+    assert(len(ids['fixed']) == 0)
@@ -0,0 +1,39 @@
+from sapmap import genSapMap
+from sapmap.output_profiles import calcOverviewFactors
+import os.path
+import rasterio
+import numpy as np
+import pytest
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 1
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def test_calc_overview_factors():
+    assert(calcOverviewFactors(100, 100, 256) == [])
+    assert(calcOverviewFactors(1000, 400, 256) == [2, 4])
+
+@pytest.mark.parametrize('outProfile', ['tiled', 'deflate', 'zstd', 'cog'])
+def test_out_profile(tmp_path, outProfile):
+    """Output profiles change the layout and compression, not the values
+    """
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, overwrite=True)
+    with rasterio.open(outfile) as reader:
+        expected = reader.read()
+
+    manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, overwrite=True, outProfile=outProfile)
+    assert(manifest['params']['outProfile'] == outProfile)
+    assert(not os.path.exists(os.path.join(tmp_path, 'simple-polygon.tmp.tif')))
+
+    with rasterio.open(outfile) as reader:
+        assert(reader.block_shapes[0] == (256, 256))
+        if outProfile != 'tiled':
+            assert(reader.compression.name.lower() == ('zstd' if outProfile == 'zstd' else 'deflate'))
+            assert(reader.overviews(1) == [2])
+        np.testing.assert_array_equal(reader.read(), expected)
+
+def test_invalid_out_profile():
+    with pytest.raises(ValueError):
+        genSapMap(infile, outResolution=resolution, overwrite=True, outProfile='jpeg')
@@ -0,0 +1,50 @@
+from sapmap import genSapMap
+from sapmap.pyramid import aggregateBlocks
+import os.path
+import rasterio
+import numpy as np
+import pytest
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 10
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def test_aggregate_blocks():
+    array = np.arange(35, dtype='float64').reshape(5, 7)
+    aggregated = aggregateBlocks(array, 3)
+    assert(aggregated.shape == (2, 3))
+    assert(aggregated[0, 0] == array[:3, :3].sum())
+    assert(aggregated[1, 2] == array[3:, 6:].sum())
+    assert(aggregated.sum() == array.sum())
+
+def test_pyramid(tmp_path):
+    """Each level is the block sum of the base heatmap, on the same grid as a direct run at its resolution
+    """
+    manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True, pyramidResolutions=[20, 50])
+    with rasterio.open(os.path.join(tmp_path, 'simple-polygon.tif')) as reader:
+        base = reader.read(1).astype('float64')
+    assert([level['factor'] for level in manifest['pyramid']] == [2, 5])
+    assert(manifest['pyramid'][1]['areaFactor'] == pixelArea * 25)
+    assert('writePyramid' in manifest['timings'])
+    os.mkdir(os.path.join(tmp_path, 'direct'))
+
+    for level in manifest['pyramid']:
+        assert(level['outfile'] == os.path.join(tmp_path, 'simple-polygon-{0}.tif'.format(level['resolution'])))
+        with rasterio.open(level['outfile']) as reader:
+            levelValues = reader.read(1)
+            levelTransform = reader.transform
+        np.testing.assert_allclose(levelValues, aggregateBlocks(base, level['factor']), rtol=1e-6)
+        assert(np.isclose(levelValues.sum(dtype='float64'), base.sum()))
+
+        directManifest = genSapMap(infile, outPath=os.path.join(tmp_path, 'direct'), outResolution=level['resolution'], areaFactor=level['areaFactor'], overwrite=True)
+        assert((directManifest['width'], directManifest['height']) == (level['width'], level['height']) == levelValues.shape[::-1])
+        assert(directManifest['outBounds'] == level['outBounds'])
+        with rasterio.open(os.path.join(tmp_path, 'direct', 'simple-polygon.tif')) as reader:
+            assert(reader.transform.almost_equals(levelTransform))
+
+def test_pyramid_alignment(tmp_path):
+    with pytest.raises(ValueError):
+        genSapMap(infile, outPath=tmp_path, outResolution=resolution, overwrite=True, pyramidResolutions=[25])
+    with pytest.raises(ValueError):
+        genSapMap(infile, outPath=tmp_path, outResolution=resolution, overwrite=True, pyramidResolutions=[20], tileSize=16)
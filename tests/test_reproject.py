@@ -0,0 +1,67 @@
+from sapmap import genSapMap
+from reprojectFeature import reprojectPolygon, reprojectPolygons
+from shapely.geometry import shape, mapping
+from rasterio.warp import transform_geom
+import os.path
+import json
+import rasterio
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+polygon = {"type": "Polygon", "coordinates": [
+    [[70, 1], [71, 1], [71, 2], [70, 1]],
+    [[70.5, 1.2], [70.6, 1.2], [70.6, 1.3], [70.5, 1.2]]
+]}
+multiPolygon = {"type": "MultiPolygon", "coordinates": [
+    [[[70, 1], [71, 1], [71, 2], [70, 1]]],
+    [[[72, 1], [73, 1], [73, 2], [72, 1]]]
+]}
+
+def test_reproject_polygons():
+    """Bulk reprojection matches reprojecting one polygon at a time
+    """
+    result = reprojectPolygons([polygon, {"type": "Feature", "properties": {}, "geometry": multiPolygon}])
+    assert(len(result) == 2)
+    assert(result[0].geom_type == 'Polygon')
+    assert(result[0].equals_exact(shape(next(reprojectPolygon(polygon))), 0))
+
+    # All parts of a MultiPolygon are kept
+    assert(result[1].geom_type == 'MultiPolygon')
+    assert(len(result[1].geoms) == 2)
+    for part, expected in zip(result[1].geoms, reprojectPolygon(multiPolygon)):
+        assert(part.equals_exact(shape(expected), 0))
+
+def test_reproject_polygons_empty():
+    result = reprojectPolygons([{"type": "Polygon", "coordinates": []}, polygon])
+    assert(result[0].is_empty)
+    assert(not result[1].is_empty)
+    assert(len(reprojectPolygons([])) == 0)
+
+    # An empty hole is dropped instead of failing the whole batch
+    result = reprojectPolygons([{"type": "Polygon", "coordinates": [polygon["coordinates"][0], []]}, polygon])
+    assert(len(result[0].interiors) == 0 and result[0].is_valid)
+    assert(len(result[1].interiors) == 1)
+
+def test_sap_map_4326(tmp_path):
+    """Input in 4326 is reprojected and produces the same map as the 3857 input
+    """
+    with open(os.path.join(DATA, 'simple-polygon.geojson')) as f:
+        collection = json.load(f)
+    del collection['crs']
+    for feature in collection['features']:
+        feature['geometry'] = transform_geom('epsg:3857', 'epsg:4326', feature['geometry'])
+    infile4326 = os.path.join(tmp_path, 'simple-polygon-4326.geojson')
+    with open(infile4326, 'w') as f:
+        json.dump(collection, f)
+
+    genSapMap(os.path.join(DATA, 'simple-polygon.geojson'), outPath=tmp_path, outResolution=100, bounds=[-200, -200, 200, 200], areaFactor=10000, overwrite=True)
+    with rasterio.open(os.path.join(tmp_path, 'simple-polygon.tif')) as reader:
+        expected = reader.read()
+
+    bounds4326 = transform_geom('epsg:3857', 'epsg:4326', mapping(shape({"type": "Polygon", "coordinates": [[[-200, -200], [200, -200], [200, 200], [-200, 200], [-200, -200]]]})))
+    lons, lats = zip(*bounds4326['coordinates'][0])
+    manifest = genSapMap(infile4326, outPath=tmp_path, outResolution=100, bounds=[min(lons), min(lats), max(lons), max(lats)], boundsPrecision=6, areaFactor=10000, overwrite=True)
+    assert(len(manifest['included']) == 5)
+    with rasterio.open(os.path.join(tmp_path, 'simple-polygon-4326.tif')) as reader:
+        np.testing.assert_allclose(reader.read(), expected, rtol=1e-6)
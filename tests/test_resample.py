@@ -0,0 +1,74 @@
+from sapmap import genSapMap, genUncertaintyMaps, LoadedShapes
+from sapmap import resample
+from sapmap.benchmark import genSyntheticSurvey
+import os.path
+import json
+import rasterio
+import numpy as np
+
+runParams = {'outResolution': 5000, 'areaFactor': 5000 * 5000, 'importanceField': 'importance', 'allTouchedSmall': True, 'overwrite': True}
+
+def genInfile(tmp_path):
+    """Writes a synthetic survey with a respondent on each feature"""
+    infile = os.path.join(tmp_path, 'survey.geojson')
+    genSyntheticSurvey(infile, numShapes=200, sizeDistribution={'type': 'uniform', 'min': 2000, 'max': 30000}, bounds=[-100000, -100000, 100000, 100000], seed=6)
+    with open(infile) as f:
+        collection = json.load(f)
+    for idx, feature in enumerate(collection['features']):
+        feature['properties']['respondent'] = idx % 20
+    with open(infile, 'w') as f:
+        json.dump(collection, f)
+    return infile
+
+def readBands(path):
+    with rasterio.open(path) as reader:
+        return (reader.read().astype('float64'), reader.descriptions)
+
+def test_replicates_without_resampling(tmp_path):
+    """With nothing resampled, every replicate equals the heatmap genSapMap burns in
+    """
+    infile = genInfile(tmp_path)
+    genSapMap(infile, outPath=tmp_path, **runParams)
+    with rasterio.open(os.path.join(tmp_path, 'survey.tif')) as reader:
+        expected = reader.read(1).astype('float64')
+
+    manifest = genUncertaintyMaps(infile, outPath=tmp_path, replicates=3, bootstrap=False, **runParams)
+    (bands, descriptions) = readBands(manifest['params']['outfile'])
+    assert(descriptions == ('mean', 'std', 'p5', 'p50', 'p95'))
+    for band in [0, 2, 3, 4]:
+        np.testing.assert_allclose(bands[band], expected, rtol=1e-6)
+    assert(np.abs(bands[1]).max() < 1e-6 * expected.max())
+
+def test_resampling(tmp_path, monkeypatch):
+    """Bootstrapped replicates spread around the heatmap, and chunking the product gives the same result
+    """
+    infile = genInfile(tmp_path)
+    loadedShapes = LoadedShapes(infile)
+    options = {'outPath': tmp_path, 'replicates': 200, 'respondentField': 'respondent', 'importanceJitter': 0.2, 'maxSapOptions': [None, 50], 'loadedShapes': loadedShapes, **runParams}
+    manifest = genUncertaintyMaps(infile, **options)
+    (bands, descriptions) = readBands(manifest['params']['outfile'])
+    occupied = bands[0] > 0
+    assert(occupied.sum() == manifest['matrix']['occupiedPixels'])
+    assert((bands[1][occupied] > 0).all())
+    assert((bands[2] <= bands[3]).all() and (bands[3] <= bands[4]).all())
+
+    monkeypatch.setattr(resample, 'PRODUCT_CHUNK_SIZE', 1000)
+    genUncertaintyMaps(infile, **options)
+    (chunkedBands, descriptions) = readBands(manifest['params']['outfile'])
+    np.testing.assert_allclose(chunkedBands, bands, rtol=1e-6)
+
+def test_footprint_matrix():
+    """Product with many weightings at once equals burning in each separately
+    """
+    from shapely.geometry import box
+    from rasterio.transform import from_origin
+    geometries = [box(0, 0, 5, 5), box(3, 3, 9, 7), box(2.2, 8.2, 2.4, 8.4)]
+    matrix = resample.FootprintMatrix(geometries, from_origin(0, 10, 1, 1), 10, 10, [False, False, True])
+    weights = np.array([[1, 2], [3, 0], [5, 1]], dtype='float64')
+    product = matrix.multiply(weights)
+    for column in range(2):
+        dense = matrix.toArray(weights[:, column])
+        np.testing.assert_array_equal(product[:, column], dense.reshape(-1)[matrix.pixels])
+    assert(matrix.toArray(weights[:, 0])[1, 2] == 5)
+    assert(matrix.toArray(weights[:, 0])[4, 4] == 3)
+    assert(matrix.toArray(weights[:, 0])[5, 4] == 4)
@@ -0,0 +1,55 @@
+from sapmap import genSapMap
+from sapmap import coverage
+from sapmap.coverage import burnCoverage, calcCoverage
+import os
+import os.path
+import rasterio
+import numpy as np
+from rasterio.transform import from_origin
+from shapely.geometry import box, Point
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 10
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+options = {'outResolution': resolution, 'areaFactor': pixelArea, 'importanceField': 'importance', 'overwrite': True}
+
+def readOutput(outPath):
+    with rasterio.open(os.path.join(outPath, 'simple-polygon.tif')) as reader:
+        return reader.read()
+
+def test_memmap_matches_dense(tmp_path):
+    """Memory-mapped accumulation produces the same output, and its scratch file is removed
+    """
+    genSapMap(infile, outPath=tmp_path, **options)
+    expected = readOutput(tmp_path)
+
+    scratchDir = os.path.join(tmp_path, 'scratch')
+    os.mkdir(scratchDir)
+    manifest = genSapMap(infile, outPath=tmp_path, accumulator='memmap', scratchDir=scratchDir, **options)
+    np.testing.assert_array_equal(readOutput(tmp_path), expected)
+    assert(manifest['scratch']['path'] is None)
+    assert(manifest['scratch']['bytes'] == manifest['width'] * manifest['height'] * 8)
+    assert(os.listdir(scratchDir) == [])
+
+def test_memmap_streaming_coverage(tmp_path):
+    genSapMap(infile, outPath=tmp_path, exactCoverage=True, **options)
+    expected = readOutput(tmp_path)
+    genSapMap(infile, outPath=tmp_path, accumulator='memmap', streaming=True, exactCoverage=True, **options)
+    np.testing.assert_array_equal(readOutput(tmp_path), expected)
+
+def test_keep_scratch(tmp_path):
+    manifest = genSapMap(infile, outPath=tmp_path, accumulator='memmap', scratchDir=tmp_path, keepScratch=True, **options)
+    scratch = np.memmap(manifest['scratch']['path'], dtype='float64', mode='r', shape=(manifest['height'], manifest['width']))
+    np.testing.assert_allclose(scratch, readOutput(tmp_path)[0], rtol=1e-6)
+
+def test_coverage_bands(monkeypatch):
+    """Coverage burned in bands of rows matches calculating it for the whole grid at once
+    """
+    transform = from_origin(0, 20, 1, 1)
+    shapes = [(Point(5, 5).buffer(4), 2), (box(-3, 12.5, 25, 13.5), 1), (box(3, -5, 4.5, 30), 1)]
+    expected = calcCoverage(shapes, transform, 20, 20)
+    monkeypatch.setattr(coverage, 'COVERAGE_CHUNK_BYTES', 3 * 22 * 8)
+    result = np.zeros((20, 20))
+    burnCoverage(result, shapes, transform)
+    np.testing.assert_allclose(result, expected, atol=1e-12)
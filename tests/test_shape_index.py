@@ -0,0 +1,30 @@
+from sapmap import ShapeIndex
+from shapely.geometry import box
+import numpy as np
+
+shapes = [
+    (box(0, 0, 10, 10).__geo_interface__, 1),
+    (box(20, 0, 30, 10), 2),
+    (box(0, 20, 10, 30), 3),
+]
+
+def test_query():
+    index = ShapeIndex(shapes)
+    assert(len(index) == 3)
+    np.testing.assert_array_equal(index.query([5, 5, 25, 8]), [0, 1])
+    np.testing.assert_array_equal(index.query([-10, -10, 100, 100]), [0, 1, 2])
+    assert(len(index.query([40, 40, 50, 50])) == 0)
+
+def test_query_touching():
+    """Bounding boxes that only share an edge still match"""
+    index = ShapeIndex(shapes)
+    np.testing.assert_array_equal(index.query([10, 0, 20, 10]), [0, 1])
+
+def test_shapes_in_bounds():
+    index = ShapeIndex(shapes)
+    assert([value for geometry, value in index.shapesInBounds([0, 0, 30, 10])] == [1, 2])
+
+def test_empty():
+    index = ShapeIndex([])
+    assert(len(index.query([0, 0, 1, 1])) == 0)
+    assert(index.shapesInBounds([0, 0, 1, 1]) == [])
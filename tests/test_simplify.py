@@ -0,0 +1,92 @@
+from sapmap import genSapMap
+from sapmap.simplify import ShapeSimplifier
+import shapely
+from shapely.geometry import Point, box, mapping, Polygon, MultiPolygon
+from rasterio.transform import xy
+import os.path
+import json
+import rasterio
+import numpy as np
+import pytest
+
+options = {'outResolution': 500, 'areaFactor': 500 * 500, 'importanceField': 'importance', 'allTouchedSmall': True, 'bounds': [0, 0, 20000, 20000], 'overwrite': True}
+
+def genGeometries():
+    """Returns circles with thousands of vertices, and one shape smaller than the simplify tolerance"""
+    rng = np.random.default_rng(4)
+    geometries = [Point(x, y).buffer(radius, quad_segs=1000) for x, y, radius in zip(rng.uniform(2000, 18000, 40), rng.uniform(2000, 18000, 40), rng.uniform(300, 2000, 40))]
+    geometries.append(box(10010, 10010, 10020, 10020))
+    return geometries
+
+def writeSurvey(path):
+    geometries = genGeometries()
+    with open(path, 'w') as f:
+        json.dump({
+            'type': 'FeatureCollection',
+            'crs': {'type': 'name', 'properties': {'name': 'urn:ogc:def:crs:EPSG::3857'}},
+            'features': [{'type': 'Feature', 'properties': {'id': idx, 'importance': idx % 5 + 1}, 'geometry': mapping(geometry)} for idx, geometry in enumerate(geometries)]
+        }, f)
+    return path
+
+def readOutput(path):
+    with rasterio.open(path) as reader:
+        return reader.read(1).astype('float64')
+
+def test_simplify(tmp_path):
+    """Simplified output is close to the unsimplified output, with far fewer vertices rasterized
+    """
+    infile = writeSurvey(os.path.join(tmp_path, 'circles.geojson'))
+    outfile = os.path.join(tmp_path, 'circles.tif')
+    manifest = genSapMap(infile, outPath=tmp_path, **options)
+    assert('simplify' not in manifest)
+    expected = readOutput(outfile)
+
+    manifest = genSapMap(infile, outPath=tmp_path, simplify=True, **options)
+    simplified = readOutput(outfile)
+    stats = manifest['simplify']
+    assert(manifest['includedCount'] == 41)
+    assert(stats['tolerance'] == 50)
+    assert(stats['verticesAfter'] < stats['verticesBefore'] / 10)
+    assert(stats['vertexReduction'] > 0.9)
+    assert(stats['toleranceBound'] == stats['tolerance'])
+    assert(stats['toleranceBoundPixels'] == 0.1)
+
+    # Boundaries move at most toleranceBound, so only cells with centers that close to an original boundary can change
+    changed = simplified != expected
+    assert(0 < changed.sum() <= 0.05 * (expected > 0).sum())
+    with rasterio.open(outfile) as reader:
+        (rows, cols) = np.nonzero(changed)
+        centers = shapely.points(np.column_stack(xy(reader.transform, rows, cols)))
+    boundaries = shapely.union_all(shapely.boundary(np.array(genGeometries(), dtype=object)))
+    assert(shapely.distance(centers, boundaries).max() <= stats['toleranceBound'])
+    # The shape smaller than the tolerance is kept
+    assert(simplified[19, 20] > 0)
+
+    with pytest.raises(ValueError):
+        genSapMap(infile, outPath=tmp_path, simplify=True, simplifyFactor=0, **options)
+
+def test_deviation_bound():
+    """Simplified shapes are valid, never empty, and deviate from their originals by at most the tolerance
+    """
+    geometries = np.array(genGeometries(), dtype=object)
+    simplifier = ShapeSimplifier(50)
+    simplified = simplifier.simplify(geometries)
+    assert(shapely.is_valid(simplified).all())
+    assert((shapely.area(simplified) > 0).all())
+    assert(shapely.hausdorff_distance(geometries, simplified).max() <= 50)
+    assert(simplifier.verticesAfter < simplifier.verticesBefore / 10)
+
+def test_keeps_holes_and_parts():
+    """Holes and parts smaller than the tolerance are kept, simplifying those shapes preserving topology
+    """
+    holed = box(0, 0, 1000, 1000).difference(box(500, 500, 530, 530))
+    multi = MultiPolygon([box(0, 0, 1000, 1000), box(2000, 2000, 2030, 2030)])
+    wiggly = Polygon([(x, 5 * (x % 2)) for x in range(0, 1001, 10)] + [(1000, 1000), (0, 1000)])
+    geometries = np.array([holed, multi, wiggly], dtype=object)
+    simplifier = ShapeSimplifier(50)
+    simplified = simplifier.simplify(geometries)
+    assert(len(simplified[0].interiors) == 1 and simplified[0].area < 1000 * 1000)
+    assert(len(simplified[1].geoms) == 2)
+    assert(shapely.get_num_coordinates(simplified[2]) < shapely.get_num_coordinates(wiggly))
+    assert(simplifier.numTopologyPreserved == 2)
+    assert(shapely.hausdorff_distance(geometries, simplified).max() <= 50)
@@ -0,0 +1,39 @@
+from sapmap import genSapMap
+import os.path
+import rasterio
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 10
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+# Features only cover the bottom left corner
+bounds = [-200, -200, 5000, 5000]
+
+def test_sparse_matches_dense(tmp_path):
+    """Sparse accumulation only allocates occupied blocks and produces the same output
+    """
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    genSapMap(infile, outPath=tmp_path, outResolution=resolution, bounds=bounds, areaFactor=pixelArea, importanceField='importance', overwrite=True)
+    with rasterio.open(outfile) as reader:
+        expected = reader.read()
+    denseSize = os.path.getsize(outfile)
+
+    manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, bounds=bounds, areaFactor=pixelArea, importanceField='importance', overwrite=True, accumulator='sparse')
+    assert(manifest['sparse'] == {'blockSize': 256, 'occupiedBlocks': 2, 'totalBlocks': 9})
+
+    with rasterio.open(outfile) as reader:
+        assert(reader.block_shapes[0] == (256, 256))
+        np.testing.assert_array_equal(reader.read(), expected)
+    # Empty blocks are not written
+    assert(os.path.getsize(outfile) < denseSize / 2)
+
+def test_sparse_streaming(tmp_path):
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    genSapMap(infile, outPath=tmp_path, outResolution=resolution, bounds=bounds, areaFactor=pixelArea, overwrite=True)
+    with rasterio.open(outfile) as reader:
+        expected = reader.read()
+
+    genSapMap(infile, outPath=tmp_path, outResolution=resolution, bounds=bounds, areaFactor=pixelArea, overwrite=True, accumulator='sparse', streaming=True)
+    with rasterio.open(outfile) as reader:
+        np.testing.assert_array_equal(reader.read(), expected)
@@ -0,0 +1,52 @@
+from sapmap import genSapMap
+import sapmap.gen_sap_map
+import os.path
+import json
+import rasterio
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 100
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def test_streaming_matches_default(tmp_path, monkeypatch):
+    """Burning in features chunk by chunk should produce the same output
+    """
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True)
+    with rasterio.open(outfile) as reader:
+        defaultArr = reader.read()
+
+    # Force multiple chunks
+    monkeypatch.setattr(sapmap.gen_sap_map, 'CHUNK_SIZE', 2)
+    manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True, streaming=True)
+    assert(len(manifest['included']) == 5)
+
+    with rasterio.open(outfile) as reader:
+        np.testing.assert_array_equal(reader.read(), defaultArr)
+
+def test_streaming_log_and_errors(tmp_path):
+    """Invalid features are streamed to the log and error files
+    """
+    with open(infile) as f:
+        collection = json.load(f)
+    # Self-intersecting bowtie polygon
+    collection['features'].append({"type": "Feature", "properties": {"importance": 10}, "geometry": {
+        "type": "Polygon", "coordinates": [[[0, 0], [100, 100], [100, 0], [0, 100], [0, 0]]]
+    }})
+    bowtieInfile = os.path.join(tmp_path, 'bowtie.geojson')
+    with open(bowtieInfile, 'w') as f:
+        json.dump(collection, f)
+
+    manifest = genSapMap(bowtieInfile, outResolution=resolution, areaFactor=pixelArea, overwrite=True, streaming=True, logToFile=True)
+    assert(manifest['includedCount'] == 5)
+    assert(manifest['excluded'] == [5])
+
+    with open(manifest['params']['errorfile']) as f:
+        errors = json.load(f)
+    assert(len(errors['features']) == 1)
+    assert(errors['features'][0]['properties']['importance'] == 10)
+
+    with open(manifest['params']['logfile']) as f:
+        assert(f.readline().strip() == 'Skipping feature: Geometry is invalid')
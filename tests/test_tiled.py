@@ -0,0 +1,71 @@
+from sapmap import genSapMap
+from sapmap.tiled import genWindows
+import os.path
+import rasterio
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 10
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def test_gen_windows():
+    """Windows cover the grid exactly once, clipping the last row and column
+    """
+    windows = list(genWindows(40, 35, 16))
+    assert(len(windows) == 9)
+    assert(sum(w.width * w.height for w in windows) == 40 * 35)
+    assert(windows[-1].col_off == 32 and windows[-1].width == 8)
+    assert(windows[-1].row_off == 32 and windows[-1].height == 3)
+
+def test_tiled_matches_untiled(tmp_path):
+    """Tiled output should be identical to rasterizing the whole grid at once
+    """
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True)
+    with rasterio.open(outfile) as reader:
+        untiledArr = reader.read()
+
+    manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True, tileSize=16)
+    assert(len(manifest['included']) == 5)
+    assert(manifest['params']['tileSize'] == 16)
+
+    with rasterio.open(outfile) as reader:
+        assert(reader.height == reader.width == 40)
+        assert(reader.block_shapes[0] == (16, 16))
+        tiledArr = reader.read()
+
+    assert(untiledArr.sum() > 0)
+    np.testing.assert_array_equal(tiledArr, untiledArr)
+
+def test_tiled_all_touched_small(tmp_path):
+    """Small shapes are still burned in with allTouched when tiled
+    """
+    infile = os.path.join(DATA, 'off-center-polygon.geojson')
+    outfile = os.path.join(tmp_path, 'off-center-polygon.tif')
+    genSapMap(infile, outPath=tmp_path, outResolution=100, bounds=[-100, -100, 100, 100], areaFactor=10000, allTouchedSmall=True, overwrite=True)
+    with rasterio.open(outfile) as reader:
+        untiledArr = reader.read()
+
+    genSapMap(infile, outPath=tmp_path, outResolution=100, bounds=[-100, -100, 100, 100], areaFactor=10000, allTouchedSmall=True, overwrite=True, tileSize=16)
+    with rasterio.open(outfile) as reader:
+        tiledArr = reader.read()
+
+    assert(untiledArr.sum() > 0)
+    np.testing.assert_array_equal(tiledArr, untiledArr)
+
+def test_workers_matches_untiled(tmp_path):
+    """Rasterizing tiles across a process pool should produce the same output
+    """
+    outfile = os.path.join(tmp_path, 'simple-polygon.tif')
+    genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True)
+    with rasterio.open(outfile) as reader:
+        untiledArr = reader.read()
+
+    manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', overwrite=True, tileSize=16, workers=2)
+    assert(manifest['params']['workers'] == 2)
+
+    with rasterio.open(outfile) as reader:
+        parallelArr = reader.read()
+
+    np.testing.assert_array_equal(parallelArr, untiledArr)
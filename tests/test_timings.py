@@ -0,0 +1,76 @@
+from sapmap import genSapMap, LoadedShapes
+from sapmap.timings import PhaseTimer, startTracing, getTracedPeak
+import numpy as np
+import os.path
+import time
+import tracemalloc
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+resolution = 10
+pixelArea = resolution * resolution
+infile = os.path.join(DATA, 'simple-polygon.geojson')
+
+def test_phase_timer():
+    """Repeated phases are summed, and generators are timed per item
+    """
+    timer = PhaseTimer()
+    for i in range(2):
+        timer.start('sleep')
+        time.sleep(0.01)
+        timer.stop('sleep')
+    assert(list(timer.genTimed('items', [1, 2, 3])) == [1, 2, 3])
+    timings = timer.getTimings()
+    assert(timings['sleep'] >= 0.02)
+    assert('items' in timings)
+    assert('phases' not in timer.getMemory())
+
+def test_phase_memory():
+    """Each phase reports the peak allocated while it ran, not the peak of the whole process
+    """
+    startTracing()
+    timer = PhaseTimer()
+    timer.start('large')
+    large = np.ones(10 * 1000 * 1000, dtype='uint8')
+    del large
+    timer.stop('large')
+    timer.start('small')
+    small = np.ones(1000 * 1000, dtype='uint8')
+    del small
+    timer.stop('small')
+    memory = timer.getMemory()
+    peak = getTracedPeak()
+    tracemalloc.stop()
+
+    assert(memory['phases']['large'] >= 10 * 1000 * 1000)
+    assert(1000 * 1000 <= memory['phases']['small'] < 10 * 1000 * 1000)
+    # Resetting the peak for each phase keeps the overall peak
+    assert(memory['peakTraced'] >= 10 * 1000 * 1000 and peak >= memory['peakTraced'])
+
+def test_manifest_timings(tmp_path):
+    """Manifest includes time and peak memory of each phase, and they're passed to metricsHook
+    """
+    metrics = []
+    startTracing()
+    manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, importanceField='importance', allTouchedSmall=True, overwrite=True, metricsHook=metrics.append)
+    tracemalloc.stop()
+
+    for phase in ['open', 'read', 'reproject', 'validate', 'calcSap', 'rasterizeLarge', 'writeLog', 'write']:
+        assert(phase in manifest['timings'])
+    assert(sum(manifest['timings'].values()) <= manifest['executionTime'] + 0.01)
+    assert(manifest['memory']['peakRss'] is None or manifest['memory']['peakRss'] > 0)
+    assert(manifest['memory']['peakTraced'] > 0)
+    assert(manifest['memory']['phases']['write'] > 0)
+
+    assert(len(metrics) == 1)
+    assert(metrics[0]['outfile'] == os.path.join(tmp_path, 'simple-polygon.tif'))
+    assert(metrics[0]['timings'] == manifest['timings'])
+
+def test_tiled_timings(tmp_path):
+    """Tiles rasterized as they're written are timed separately from writing, load phases are reported separately
+    """
+    loadedShapes = LoadedShapes(infile)
+    manifest = genSapMap(infile, outPath=tmp_path, outResolution=resolution, areaFactor=pixelArea, overwrite=True, tileSize=16, loadedShapes=loadedShapes)
+    for phase in ['buildIndex', 'rasterize', 'write']:
+        assert(phase in manifest['timings'])
+    assert('read' not in manifest['timings'])
+    assert('read' in manifest['loadTimings'] and 'reproject' in manifest['loadTimings'])
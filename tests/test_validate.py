@@ -0,0 +1,42 @@
+from sapmap.gen_sap_map import validateShapes, calcExteriorLengths, toPolygonal, ERROR_INVALID, ERROR_FIX_FAILED, ERROR_NO_COORDINATES
+import numpy as np
+from shapely import wkt
+from shapely.geometry import box, MultiPolygon, GeometryCollection, LineString, Point
+
+bowtie = wkt.loads('POLYGON ((0 0, 2 2, 2 0, 0 2, 0 0))')
+spike = wkt.loads('POLYGON ((0 0, 2 0, 2 2, 0 2, 0 0, -1 -1, 0 0))')
+flat = wkt.loads('POLYGON ((0 0, 1 0, 2 0, 0 0))')
+multi = MultiPolygon([box(0, 0, 1, 1), box(2, 0, 3, 2)])
+
+def test_validate_shapes():
+    """Errors are found in bulk, with no coordinates taking precedence, then invalid, then zero area
+    """
+    shapes = [box(0, 0, 1, 1), bowtie, flat, MultiPolygon(), multi]
+    (geoms, errors, fixed, areas, exteriorLengths) = validateShapes(shapes)
+    assert(list(errors) == [False, ERROR_INVALID, ERROR_INVALID, ERROR_NO_COORDINATES, False])
+    assert(not fixed.any())
+    assert(geoms[1].equals(bowtie))
+    np.testing.assert_array_equal(areas[[0, 4]], [1, 3])
+    np.testing.assert_array_equal(exteriorLengths, [4, bowtie.exterior.length, 4, 0, 10])
+
+def test_validate_shapes_fix():
+    """Invalid shapes are repaired keeping all their polygonal parts, and fail if nothing with area is left
+    """
+    (geoms, errors, fixed, areas, exteriorLengths) = validateShapes([bowtie, spike, flat, box(0, 0, 1, 1)], fixGeom=True)
+    assert(list(fixed) == [True, True, False, False])
+    assert(list(errors) == [False, False, ERROR_FIX_FAILED, False])
+    # Both halves of the bowtie are kept
+    assert(geoms[0].geom_type == 'MultiPolygon' and areas[0] == 2)
+    assert(geoms[1].equals(box(0, 0, 2, 2)) and areas[1] == 4)
+
+def test_to_polygonal():
+    collection = GeometryCollection([multi, LineString([(0, 0), (5, 5)]), box(5, 5, 6, 6)])
+    result = toPolygonal(np.array([box(0, 0, 1, 1), collection, GeometryCollection([Point(0, 0)]), multi], dtype=object))
+    assert(result[0].equals(box(0, 0, 1, 1)))
+    assert(result[1].geom_type == 'MultiPolygon' and len(result[1].geoms) == 3 and result[1].area == 4)
+    assert(result[2].is_empty and result[2].geom_type == 'Polygon')
+    assert(result[3].equals(multi))
+
+def test_exterior_lengths():
+    lengths = calcExteriorLengths(np.array([multi, box(0, 0, 2, 2).difference(box(0.5, 0.5, 1, 1))], dtype=object))
+    np.testing.assert_array_equal(lengths, [10, 8])
@@ -0,0 +1,96 @@
+from sapmap import genSapMap, ZonalIndex
+import os.path
+import json
+import rasterio
+import numpy as np
+from rasterio.transform import from_origin
+from shapely.geometry import box, Point, mapping
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+transform = from_origin(100, 200, 2, 2)
+cellArea = 4
+
+def genRaster(tmp_path):
+    """Writes a raster of random values, returning its path and values"""
+    values = np.random.default_rng(0).random((15, 20)).astype('float32')
+    rasterPath = os.path.join(tmp_path, 'random.tif')
+    with rasterio.open(rasterPath, 'w', driver='GTiff', height=15, width=20, count=1, dtype='float32', crs='epsg:3857', transform=transform) as out:
+        out.write(values, indexes=1)
+    return (rasterPath, values)
+
+def calcExpected(values, zone):
+    """Sums the value of each cell times the area of its intersection with zone, cell by cell"""
+    (height, width) = values.shape
+    total = 0
+    cellCount = 0
+    for row in range(height):
+        for col in range(width):
+            (x, y) = transform * (col, row)
+            covered = zone.intersection(box(x, y - 2, x + 2, y)).area / cellArea
+            total += values[row, col] * covered
+            cellCount += covered
+    return (total, cellCount)
+
+def test_zonal_query(tmp_path):
+    """Rectangles and polygons, including holes, multiple parts and parts outside the raster, match cell by cell intersection
+    """
+    (rasterPath, values) = genRaster(tmp_path)
+    index = ZonalIndex(rasterPath)
+    assert(np.isclose(index.total, values.sum(dtype='float64')))
+
+    donut = Point(130, 180).buffer(9).difference(Point(131, 181).buffer(3))
+    zones = [
+        [103.5, 181.2, 121, 197],
+        [90, 150, 200, 210],
+        donut,
+        Point(100, 172).buffer(5).union(box(135.3, 160, 180, 171.7)),
+        mapping(box(110, 175, 111, 176)),
+        [0, 0, 10, 10]
+    ]
+    results = index.query(zones)
+    for zone, result in zip(zones, results):
+        geometry = box(*zone) if isinstance(zone, list) else zone if hasattr(zone, 'geom_type') else box(110, 175, 111, 176)
+        (total, cellCount) = calcExpected(values, geometry)
+        assert(np.isclose(result['total'], total))
+        assert(np.isclose(result['cellCount'], cellCount))
+        if cellCount > 0:
+            assert(np.isclose(result['mean'], total / cellCount))
+        assert(np.isclose(result['share'], total / index.total))
+    # Whole raster
+    assert(np.isclose(results[1]['share'], 1))
+    assert(results[5] == {'total': 0, 'mean': 0, 'share': 0, 'cellCount': 0})
+
+def test_zone_file(tmp_path):
+    """Zones are reprojected to the raster coordinate system and identified by idField
+    """
+    manifest = genSapMap(os.path.join(DATA, 'simple-polygon.geojson'), outPath=tmp_path, outResolution=10, areaFactor=100, importanceField='importance', overwrite=True)
+    index = ZonalIndex(os.path.join(tmp_path, 'simple-polygon.tif'))
+
+    with open(os.path.join(DATA, 'simple-polygon.geojson')) as f:
+        collection = json.load(f)
+    for idx, feature in enumerate(collection['features']):
+        feature['properties'] = {'name': 'zone-{0}'.format(idx)}
+    # The whole grid and its left half, along cell edges
+    (w, s, e, n) = manifest['outBounds']
+    halfWidth = manifest['width'] // 2
+    halfE = w + halfWidth * 10
+    for name, bounds in [('whole', (w, s, e, n)), ('left', (w, s, halfE, n))]:
+        collection['features'].append({'type': 'Feature', 'properties': {'name': name}, 'geometry': mapping(box(*bounds))})
+    zonefile = os.path.join(tmp_path, 'zones.geojson')
+    with open(zonefile, 'w') as f:
+        json.dump(collection, f)
+
+    results = index.queryZoneFile(zonefile, 'name')
+    expected = index.query([feature['geometry'] for feature in collection['features']])
+    assert([result['id'] for result in results] == ['zone-{0}'.format(idx) for idx in range(5)] + ['whole', 'left'])
+    for result, expectedResult in zip(results, expected):
+        assert(np.isclose(result['total'], expectedResult['total']))
+
+    with rasterio.open(os.path.join(tmp_path, 'simple-polygon.tif')) as reader:
+        values = reader.read(1).astype('float64')
+    assert(values.shape == (manifest['height'], manifest['width']))
+    assert(np.isclose(results[5]['total'], values.sum()) and np.isclose(results[5]['share'], 1))
+    assert(results[5]['cellCount'] == manifest['width'] * manifest['height'])
+    assert(np.isclose(results[6]['total'], values[:, :halfWidth].sum()))
+    assert(np.isclose(results[6]['share'], values[:, :halfWidth].sum() / values.sum()))
+    assert(0 < results[6]['share'] < 1)